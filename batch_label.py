@@ -0,0 +1,237 @@
+"""Labels an unlabeled .raw pair file in sharded, resumable batches.
+
+usage: python batch_label.py [--model relext_model.npz] [--output labels]
+                             [--chunk-pairs 5000] [--workers N] pair_file
+
+The pair file (rel-*.raw format, read from data/) is cut into chunks of
+whole documents of about chunk_pairs pairs, read as the job goes, so only
+the chunks in flight are in memory. Each chunk is featurized and
+classified with a numpy backend model (see relation_service) on a pool of
+worker processes, with the pair filter the service applies (see
+relation_service.load_pair_filter), and written to its own shard,
+
+    <output>/shard-00000.tsv    label, probability, then the pair's .raw fields
+
+atomically, so a shard file exists only once it is complete.
+<output>/manifest.json records the pair file, model and pair filter (each
+with its size and mtime) and the chunk size; a job rerun with the same
+settings skips the shards already written, so a model retrained in place
+or an edited pair file makes it refuse to resume instead of mixing shards
+of two runs. The manifest is marked complete after the last one. Progress and throughput in
+pairs per second are printed as shards finish.
+"""
+
+import argparse
+import collections
+import hashlib
+import json
+import multiprocessing
+import os
+import time
+
+from corpus_reader import CorpusReader
+from pair_filter import PairFilter
+from relation_extractor import PAIR_FILTER_FILE
+
+MANIFEST = 'manifest.json'
+
+# set in each worker by init_worker: the RelationService and output directory
+SHARED = {}
+
+
+def shard_path(output_dir, shard):
+    return os.path.join(output_dir, 'shard-{:05d}.tsv'.format(shard))
+
+
+def file_stamp(path):
+    """[absolute path, size, mtime] of a file the labels depend on"""
+    st = os.stat(path)
+    return [os.path.abspath(path), st.st_size, st.st_mtime]
+
+
+def pair_filter_stamp(pair_filter):
+    """What the manifest records of the pair filter RelationService will
+    apply (see relation_service.load_pair_filter)"""
+    if pair_filter is None:
+        pair_filter = PAIR_FILTER_FILE if os.path.exists(PAIR_FILTER_FILE) else False
+    if pair_filter is False:
+        return None
+    if isinstance(pair_filter, PairFilter):
+        values = json.dumps(pair_filter.to_dict(), sort_keys=True)
+        return hashlib.sha1(values.encode('utf-8')).hexdigest()
+    return file_stamp(pair_filter)
+
+
+def iter_chunks(pair_file, chunk_pairs):
+    """Lists of pair line fields, whole documents of about chunk_pairs pairs each"""
+    reader = CorpusReader(pair_file, False, streaming=True)
+    chunk = []
+    title = None
+    for line_split in reader.iter_pair_lines():
+        if not line_split:
+            continue
+        if line_split[0] != title:
+            if len(chunk) >= chunk_pairs:
+                yield chunk
+                chunk = []
+            title = line_split[0]
+        chunk.append(line_split)
+    if chunk:
+        yield chunk
+
+
+def init_worker(model_file, features, output_dir, pair_filter=None):
+    from relation_service import RelationService
+    SHARED['service'] = RelationService(model_file, features=features, pair_filter=pair_filter)
+    SHARED['output_dir'] = output_dir
+
+
+def label_chunk(args):
+    """Classifies one chunk and writes its shard; returns the pair count"""
+    shard, chunk = args
+    service = SHARED['service']
+    docs = []
+    for line_split in chunk:
+        if not docs or docs[-1].title != line_split[0]:
+            docs.append(service.reader.create_document(line_split[0]))
+        service.reader.add_two_tokens(docs[-1], line_split)
+    fe, probabilities = service.classify(docs)
+    labels = service.model.labels
+    path = shard_path(SHARED['output_dir'], shard)
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    with open(tmp_path, 'w') as f:
+        pairs = (tt for doc in docs for tt in doc.two_tokens)
+        for tt, row in zip(pairs, probabilities):
+            best = row.argmax()
+            f.write('{}\t{:.6f}\t{}\n'.format(labels[best], row[best], '\t'.join(tt.split_line)))
+    os.rename(tmp_path, path)
+    return len(chunk)
+
+
+def open_manifest(output_dir, settings):
+    """Creates output_dir and its manifest, or checks that an existing
+    manifest was written with the same settings"""
+    path = os.path.join(output_dir, MANIFEST)
+    if os.path.exists(path):
+        with open(path) as f:
+            manifest = json.load(f)
+        if dict((key, manifest.get(key)) for key in settings) != settings:
+            raise ValueError("{} holds a job with other settings ({}); use another output "
+                             "directory".format(output_dir, path))
+        return manifest
+    if not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+    manifest = dict(settings, complete=False)
+    write_manifest(output_dir, manifest)
+    return manifest
+
+
+def write_manifest(output_dir, manifest):
+    path = os.path.join(output_dir, MANIFEST)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.rename(path + '.tmp', path)
+
+
+def label_pair_file(pair_file, output_dir, model_file='relext_model.npz', features=None,
+                    chunk_pairs=5000, workers=1, pair_filter=None):
+    """Labels pair_file into shards under output_dir, skipping shards an
+    earlier run of the same job finished; returns the job summary.
+    pair_filter is passed to RelationService."""
+    settings = {'pair_file': file_stamp('data/' + pair_file), 'model': file_stamp(model_file),
+                'pair_filter': pair_filter_stamp(pair_filter), 'features': features,
+                'chunk_pairs': chunk_pairs}
+    manifest = open_manifest(output_dir, settings)
+    start = time.time()
+    pairs = skipped_pairs = shards = skipped_shards = 0
+
+    def report(shard, n_pairs):
+        elapsed = time.time() - start
+        print("shard {}: {} pairs, {} labeled in {:.1f}s ({:.0f} pairs/s)".format(
+            shard, n_pairs, pairs, elapsed, pairs / elapsed if elapsed else 0.0))
+
+    def todo():
+        # the chunks still to label, read from the pair file as the pool takes them
+        for shard, chunk in enumerate(iter_chunks(pair_file, chunk_pairs)):
+            if os.path.exists(shard_path(output_dir, shard)):
+                yield shard, None, len(chunk)
+            else:
+                yield shard, chunk, len(chunk)
+
+    if workers > 1:
+        pool = multiprocessing.Pool(workers, initializer=init_worker,
+                                    initargs=(model_file, features, output_dir, pair_filter))
+        # at most two chunks per worker queued, so memory stays bounded
+        pending = collections.deque()
+        try:
+            for shard, chunk, n_pairs in todo():
+                if chunk is None:
+                    skipped_shards += 1
+                    skipped_pairs += n_pairs
+                    continue
+                pending.append((shard, pool.apply_async(label_chunk, ((shard, chunk),))))
+                while len(pending) >= 2 * workers or (pending and pending[0][1].ready()):
+                    done_shard, result = pending.popleft()
+                    n_done = result.get()
+                    pairs += n_done
+                    shards += 1
+                    report(done_shard, n_done)
+            while pending:
+                done_shard, result = pending.popleft()
+                n_done = result.get()
+                pairs += n_done
+                shards += 1
+                report(done_shard, n_done)
+        finally:
+            pool.terminate()
+            pool.join()
+    else:
+        init_worker(model_file, features, output_dir, pair_filter)
+        for shard, chunk, n_pairs in todo():
+            if chunk is None:
+                skipped_shards += 1
+                skipped_pairs += n_pairs
+                continue
+            pairs += label_chunk((shard, chunk))
+            shards += 1
+            report(shard, n_pairs)
+
+    seconds = time.time() - start
+    manifest.update(complete=True, shards=shards + skipped_shards, pairs=pairs + skipped_pairs)
+    write_manifest(output_dir, manifest)
+    summary = {'shards': shards, 'pairs': pairs, 'skipped_shards': skipped_shards,
+               'skipped_pairs': skipped_pairs, 'seconds': seconds,
+               'pairs_per_second': pairs / seconds if seconds else 0.0}
+    print("Labeled {} pairs in {} shards in {:.1f}s ({:.0f} pairs/s); {} shards ({} pairs) "
+          "were already done".format(pairs, shards, seconds, summary['pairs_per_second'],
+                                     skipped_shards, skipped_pairs))
+    return summary
+
+
+def iter_labeled(output_dir):
+    """(label, probability, .raw fields) of every labeled pair, in pair file order"""
+    shard = 0
+    while os.path.exists(shard_path(output_dir, shard)):
+        with open(shard_path(output_dir, shard)) as f:
+            for line in f:
+                fields = line.rstrip('\n').split('\t')
+                yield fields[0], float(fields[1]), fields[2:]
+        shard += 1
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Label an unlabeled pair file in sharded batches")
+    parser.add_argument('pair_file')
+    parser.add_argument('--model', default='relext_model.npz')
+    parser.add_argument('--features', default=None,
+                        help="comma separated feature names (default: those saved with the model)")
+    parser.add_argument('--pair-filter', default=None,
+                        help="pair filter file (default: the one training saved, if any)")
+    parser.add_argument('--no-pair-filter', action='store_true',
+                        help="classify every pair, even with a saved pair filter")
+    parser.add_argument('--output', default='labels')
+    parser.add_argument('--chunk-pairs', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count())
+    args = parser.parse_args()
+    label_pair_file(args.pair_file, args.output, args.model, args.features, args.chunk_pairs,
+                    args.workers, False if args.no_pair_filter else args.pair_filter)
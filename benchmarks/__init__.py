@@ -0,0 +1,2 @@
+"""Benchmarks; run from the project directory, e.g.
+python -m benchmarks.parse_reader"""
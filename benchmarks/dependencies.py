@@ -0,0 +1,104 @@
+"""Dependency parse reading and relation lookups: word-keyed dicts vs graphs.
+
+usage: python -m benchmarks.dependencies [pair_file]
+
+The word-keyed reader is the one CorpusReader used before dependency_graph:
+re.split on every line into a lowercased 'word1_word2' -> relation dict per
+sentence, looked up by the pair's words in both orders. The graph reader
+builds SentenceDependencies and looks relations up by the entities' head
+token indices (aligning sentences and tokens on first use, which is timed
+separately).
+"""
+
+import re
+import sys
+import time
+
+from corpus_reader import CorpusReader, get_document_paths, get_document_titles
+from dependency_graph import NO_NODE, align_sentences, read_dependency_graphs
+from parse_reader import LabelTable
+
+PATTERN = re.compile(r"(.+)\((.+)-(\d+)(\'*), (.+)-(\d+)(\'*)\)")
+
+
+def read_word_keyed(lines):
+    sents = []
+    sent = {}
+    for line in lines:
+        line = line.strip()
+        if len(line) == 0:
+            sents.append(sent)
+            sent = {}
+            continue
+        groups = re.split(PATTERN, line)
+        sent["{}_{}".format(groups[2].lower(), groups[5].lower())] = groups[1]
+    return sents
+
+
+def word_keyed_relation(sents, sent, token1, token2):
+    if sent < len(sents):
+        relations = sents[sent]
+        key = "{}_{}".format(token1.lower(), token2.lower())
+        if key in relations:
+            return relations[key]
+        key = "{}_{}".format(token2.lower(), token1.lower())
+        if key in relations:
+            return relations[key]
+    return ""
+
+
+def best_of(repeats, func, *args):
+    best = None
+    for _ in range(repeats):
+        start = time.time()
+        result = func(*args)
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+if __name__ == '__main__':
+    pair_file = sys.argv[1] if len(sys.argv) > 1 else 'rel-trainset.gold'
+    reading_gold_file = pair_file.endswith('.gold')
+    reader = CorpusReader(pair_file, reading_gold_file)
+    docs = list(reader.corpus.values())
+    lines = dict((doc.title, reader.get_file_lines(get_document_paths(doc.title)[2])) for doc in docs)
+    pairs = [(doc, tt) for doc in docs for tt in doc.two_tokens]
+
+    word_keyed_time, word_keyed = best_of(3, lambda: dict(
+        (title, read_word_keyed(doc_lines)) for title, doc_lines in lines.items()))
+    graph_time, graphs = best_of(3, lambda: dict(
+        (title, read_dependency_graphs(doc_lines, LabelTable())) for title, doc_lines in lines.items()))
+    align_time, aligned = best_of(1, lambda: dict(
+        (doc.title, align_sentences(doc.pos_tagged_sents, graphs[doc.title])) for doc in docs))
+
+    def word_keyed_lookups():
+        return [word_keyed_relation(word_keyed[doc.title], tt.sent_offset1, tt.token1, tt.token2)
+                for doc, tt in pairs]
+
+    def graph_lookups():
+        relations = []
+        for doc, tt in pairs:
+            graph = aligned[doc.title][tt.sent_offset1]
+            node1 = graph.node_of_token(tt.end_token1-1) if graph is not None else NO_NODE
+            node2 = graph.node_of_token(tt.end_token2-1) if graph is not None else NO_NODE
+            relations.append(graph.relation(node1, node2) if node2 != NO_NODE else '')
+        return relations
+
+    word_lookup_time, word_relations = best_of(5, word_keyed_lookups)
+    graph_lookup_time, graph_relations = best_of(5, graph_lookups)
+    path_time, _ = best_of(1, lambda: [
+        aligned[doc.title][tt.sent_offset1].path(
+            aligned[doc.title][tt.sent_offset1].node_of_token(tt.end_token1-1),
+            aligned[doc.title][tt.sent_offset1].node_of_token(tt.end_token2-1))
+        for doc, tt in pairs if aligned[doc.title][tt.sent_offset1] is not None])
+
+    n_lines = sum(len(doc_lines) for doc_lines in lines.values())
+    print('{} documents, {} dependency lines, {} pairs'.format(len(docs), n_lines, len(pairs)))
+    print('{:<12} {:>10} {:>14} {:>10}'.format('reader', 'read (s)', 'lookups/s', 'related'))
+    print('{:<12} {:>10.3f} {:>14.0f} {:>10}'.format('word-keyed', word_keyed_time,
+          len(pairs) / word_lookup_time, sum(1 for r in word_relations if r)))
+    print('{:<12} {:>10.3f} {:>14.0f} {:>10}'.format('graph', graph_time,
+          len(pairs) / graph_lookup_time, sum(1 for r in graph_relations if r)))
+    print('sentence and token alignment {:.3f}s, shortest paths for all pairs {:.3f}s'.format(
+        align_time, path_time))
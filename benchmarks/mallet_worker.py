@@ -0,0 +1,110 @@
+"""Per-call bin/mallet spawns versus the resident MalletWorker.
+
+usage: python -m benchmarks.mallet_worker [--batches 10] [--java java]
+
+Featurizes rel-trainset.gold and rel-devset.gold once, then trains MaxEnt
+on the training lines and classifies the dev lines in --batches batches,
+both through bin/mallet (import-file, train-classifier and one
+classify-file per batch, over files in a scratch directory) and through one
+MalletWorker; reports the seconds of each step, the mean seconds per batch
+and whether both give every dev pair the same label.
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+from mallet_worker import MalletWorker
+from relation_extractor import MALLET, RelExtractor
+
+
+def batches(lines, n):
+    size = max(1, (len(lines) + n - 1) // n)
+    return [lines[i:i + size] for i in range(0, len(lines), size)]
+
+
+def write_lines(path, lines):
+    with open(path, 'w') as f:
+        for line in lines:
+            f.write(line + '\n')
+
+
+def run_spawn(training_lines, test_batches):
+    """(train seconds, classify seconds per batch, labeled lines)"""
+    workspace = tempfile.mkdtemp(prefix='relext-mallet-')
+    path = lambda name: os.path.join(workspace, name)
+    try:
+        with open(os.devnull, 'w') as devnull:
+            start = time.time()
+            write_lines(path('train'), training_lines)
+            subprocess.check_call([MALLET, 'import-file', '--input', path('train'),
+                                   '--line-regex', r'^(\S*)[\s]*(\S*)[\s]*(.*)$',
+                                   '--output', path('train.mallet')], stdout=devnull, stderr=devnull)
+            subprocess.check_call([MALLET, 'train-classifier', '--input', path('train.mallet'),
+                                   '--output-classifier', path('model'), '--trainer', 'MaxEnt'],
+                                  stdout=devnull, stderr=devnull)
+            train_seconds = time.time() - start
+            batch_seconds = []
+            labeled = []
+            for lines in test_batches:
+                start = time.time()
+                write_lines(path('test'), lines)
+                subprocess.check_call([MALLET, 'classify-file', '--input', path('test'),
+                                       '--output', path('labeled'), '--classifier', path('model')],
+                                      stdout=devnull, stderr=devnull)
+                with open(path('labeled')) as f:
+                    labeled.extend(line.rstrip('\n') for line in f if line.strip())
+                batch_seconds.append(time.time() - start)
+        return train_seconds, batch_seconds, labeled
+    finally:
+        shutil.rmtree(workspace)
+
+
+def run_worker(training_lines, test_batches, java):
+    """(start seconds, train seconds, classify seconds per batch, labeled lines)"""
+    with MalletWorker(java=java) as worker:
+        start = time.time()
+        worker.request('PING')
+        start_seconds = time.time() - start
+        start = time.time()
+        worker.train(training_lines)
+        train_seconds = time.time() - start
+        batch_seconds = []
+        labeled = []
+        for lines in test_batches:
+            start = time.time()
+            labeled.extend(worker.classify(lines))
+            batch_seconds.append(time.time() - start)
+    return start_seconds, train_seconds, batch_seconds, labeled
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare bin/mallet spawns with the Mallet worker")
+    parser.add_argument('--batches', type=int, default=10)
+    parser.add_argument('--java', default='java')
+    args = parser.parse_args()
+
+    extractor = RelExtractor()
+    training_lines = list(extractor.training_lines(
+        extractor.featurize('rel-trainset.gold', [], True)))
+    test_batches = batches(list(extractor.test_lines(
+        extractor.featurize('rel-devset.gold', [], True))), args.batches)
+
+    spawn_train, spawn_batches, spawn_labeled = run_spawn(training_lines, test_batches)
+    worker_start, worker_train, worker_batches, worker_labeled = run_worker(
+        training_lines, test_batches, args.java)
+
+    print('{:<8}{:>10}{:>10}{:>14}{:>16}'.format('', 'start (s)', 'train (s)', 'classify (s)',
+                                                 'per batch (s)'))
+    print('{:<8}{:>10}{:>10.2f}{:>14.2f}{:>16.3f}'.format(
+        'spawn', '-', spawn_train, sum(spawn_batches), sum(spawn_batches) / len(spawn_batches)))
+    print('{:<8}{:>10.2f}{:>10.2f}{:>14.2f}{:>16.3f}'.format(
+        'worker', worker_start, worker_train, sum(worker_batches),
+        sum(worker_batches) / len(worker_batches)))
+    same = [extractor.get_highest_probability_label(a) == extractor.get_highest_probability_label(b)
+            for a, b in zip(spawn_labeled, worker_labeled)]
+    print('{} dev pairs in {} batches, same label for {}'.format(
+        len(worker_labeled), len(test_batches), sum(same)))
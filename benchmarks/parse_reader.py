@@ -0,0 +1,87 @@
+"""Parse time and memory of FlatTree vs nltk.tree.Tree on a pair file's documents.
+
+usage: python -m benchmarks.parse_reader [pair_file]
+
+Each reader runs in its own subprocess so resident memory is not shared.
+"""
+
+import json
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import nltk.tree
+
+from corpus_reader import get_document_paths
+from parse_reader import LabelTable, read_bracketed_parse
+
+
+def document_titles(pair_file):
+    titles = []
+    doc_filename_index = 1 if pair_file.endswith('.gold') else 0
+    with open('data/'+pair_file) as f:
+        for line in f:
+            title = line.split()[doc_filename_index]
+            if not titles or titles[-1] != title:
+                titles.append(title)
+    return titles
+
+
+def read_trees(titles, fast_parses):
+    label_table = LabelTable()
+    parses = []
+    for title in titles:
+        with open(get_document_paths(title)[0]) as f:
+            lines = [line for line in f if line not in [' ', '', '\n']]
+        if fast_parses:
+            parses.append([read_bracketed_parse(line, label_table).root() for line in lines])
+        else:
+            parses.append([nltk.tree.Tree.fromstring(line) for line in lines])
+    return parses
+
+
+def measure(pair_file, fast_parses):
+    titles = document_titles(pair_file)
+    # warm the page cache so both readers see the same I/O cost
+    read_trees(titles[:1], fast_parses)
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    tracemalloc.start()
+    start = time.time()
+    parses = read_trees(titles, fast_parses)
+    elapsed = time.time() - start
+    traced, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # time again without tracemalloc, which slows allocation down
+    start = time.time()
+    read_trees(titles, fast_parses)
+    untraced_elapsed = time.time() - start
+    return {
+        'reader': 'flat' if fast_parses else 'nltk',
+        'documents': len(titles),
+        'trees': sum(len(p) for p in parses),
+        'parse_seconds': untraced_elapsed,
+        'traced_parse_seconds': elapsed,
+        'retained_bytes': traced,
+        'max_rss_growth_kb': rss_after - rss_before,
+    }
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 2 and sys.argv[1] == '--child':
+        print(json.dumps(measure(sys.argv[2], sys.argv[3] == 'flat')))
+        sys.exit(0)
+    pair_file = sys.argv[1] if len(sys.argv) > 1 else 'rel-trainset.gold'
+    results = []
+    for reader in ('nltk', 'flat'):
+        out = subprocess.check_output([sys.executable, '-m', 'benchmarks.parse_reader',
+                                       '--child', pair_file, reader])
+        results.append(json.loads(out.decode('utf-8').strip().splitlines()[-1]))
+    print('{:<6} {:>6} {:>10} {:>14} {:>14}'.format(
+        'reader', 'trees', 'parse (s)', 'retained (MB)', 'rss growth (MB)'))
+    for r in results:
+        print('{:<6} {:>6} {:>10.3f} {:>14.1f} {:>14.1f}'.format(
+            r['reader'], r['trees'], r['parse_seconds'],
+            r['retained_bytes'] / 1e6, r['max_rss_growth_kb'] / 1e3))
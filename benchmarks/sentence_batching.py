@@ -0,0 +1,88 @@
+"""Per-pair versus sentence-batched featurization by sentence density.
+
+usage: python -m benchmarks.sentence_batching [pair_file]
+
+Groups the pairs of the gold file by how many pairs their sentence has and
+times, per group, the in-between words, bigrams, target pos and border
+words features computed pair by pair from the pos sentence (the
+get_in_between_words_and_pos/get_border_words/get_target_pos path) and
+sliced from one SentenceContext per sentence.
+"""
+
+import sys
+import time
+
+from corpus_reader import CorpusReader
+from feature_registry import get_features
+from relation_feature_extractor import FeatureExtractor
+
+FEATURES = ['in_between_words', 'bigrams', 'target_pos', 'border_words']
+# sentences with up to this many pairs go in the group
+GROUPS = [1, 5, 20, 50, 100000]
+
+
+def per_pair_features(extractor, document, tt):
+    words, pos = extractor.get_in_between_words_and_pos(document, tt)
+    features = ["inbetweenpos__"+p for p in pos] + ["inbetweenwords__"+word for word in words]
+    all_words = [tt.token1] + words + [tt.token2]
+    features.extend('bigram__'+all_words[i]+'_'+all_words[i+1] for i in range(len(all_words)-1))
+    pos1, pos2 = extractor.get_target_pos(document, tt)
+    features.extend(['targetpos_{}'.format(pos1), 'targetpos_{}'.format(pos2)])
+    before_word, after_word, _, _ = extractor.get_border_words(document, tt)
+    features.extend(['BEFOREWORD__{}'.format(before_word), 'AFTERWORD__{}'.format(after_word)])
+    return features
+
+
+def batched_features(extractor, features, document, tt):
+    context = {'sentence': extractor.get_sentence_context(document, tt.sent_offset1)}
+    pair_features = []
+    for feature in features:
+        pair_features.extend(feature.func(tt, context))
+    return pair_features
+
+
+def best_time(func, repeats=5):
+    best = None
+    for _ in range(repeats):
+        start = time.time()
+        func()
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+if __name__ == '__main__':
+    pair_file = sys.argv[1] if len(sys.argv) > 1 else 'rel-trainset.gold'
+    docs = list(CorpusReader(pair_file, True).corpus.values())
+    sentences = {}
+    for doc in docs:
+        for tt in doc.two_tokens:
+            sentences.setdefault((doc.title, tt.sent_offset1), (doc, []))[1].append(tt)
+    features = get_features(FEATURES)
+    print('{:<14}{:>10}{:>8}{:>16}{:>16}{:>9}'.format(
+        'pairs/sentence', 'sentences', 'pairs', 'per pair (us)', 'batched (us)', 'speedup'))
+    low = 1
+    for high in GROUPS:
+        group = [pairs for pairs in sentences.values() if low <= len(pairs[1]) <= high]
+        n_pairs = sum(len(tts) for doc, tts in group)
+        label = '{}-{}'.format(low, high) if high != GROUPS[-1] else '{}+'.format(low)
+        low = high + 1
+        if not n_pairs:
+            continue
+
+        def run_per_pair():
+            extractor = FeatureExtractor(None, True, docs=[])
+            for doc, tts in group:
+                for tt in tts:
+                    per_pair_features(extractor, doc, tt)
+
+        def run_batched():
+            extractor = FeatureExtractor(None, True, docs=[])
+            for doc, tts in group:
+                for tt in tts:
+                    batched_features(extractor, features, doc, tt)
+
+        per_pair = best_time(run_per_pair) / n_pairs * 1e6
+        batched = best_time(run_batched) / n_pairs * 1e6
+        print('{:<14}{:>10}{:>8}{:>16.2f}{:>16.2f}{:>8.2f}x'.format(
+            label, len(group), n_pairs, per_pair, batched, per_pair / batched))
@@ -0,0 +1,61 @@
+"""Per-document latency of RelationService.predict with a resident model.
+
+usage: python -m benchmarks.service_latency [pair_file] [model_file]
+
+Needs a numpy backend model (python relation_extractor.py numpy). Each
+document of the .raw pair file becomes one request built from its parse,
+tag and dparse file contents, as a client would send it; the time covers
+reading those lines into a Document, featurizing and classifying.
+"""
+
+import sys
+import time
+
+from corpus_reader import get_document_paths
+from relation_service import RelationService
+
+
+def document_requests(pair_file):
+    """(document dict, pair lines) per document, in pair file order"""
+    requests = []
+    with open('data/'+pair_file) as f:
+        for line in f:
+            title = line.split()[0]
+            if not requests or requests[-1][0]['title'] != title:
+                document = {'title': title}
+                for view, path in zip(('parse', 'pos', 'dparse'), get_document_paths(title)):
+                    with open(path) as view_file:
+                        document[view] = view_file.read()
+                requests.append((document, []))
+            requests[-1][1].append(line)
+    return requests
+
+
+def percentile(sorted_values, p):
+    index = min(len(sorted_values) - 1, int(round(p / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+if __name__ == '__main__':
+    pair_file = sys.argv[1] if len(sys.argv) > 1 else 'rel-devset.raw'
+    model_file = sys.argv[2] if len(sys.argv) > 2 else 'relext_model.npz'
+    start = time.time()
+    service = RelationService(model_file)
+    print('model loaded in {:.3f}s'.format(time.time() - start))
+    requests = document_requests(pair_file)
+    # warm up once so the first request does not pay for imports and caches
+    service.predict(*requests[0])
+    latencies = []
+    pairs = 0
+    for document, pair_lines in requests:
+        start = time.time()
+        service.predict(document, pair_lines)
+        latencies.append(time.time() - start)
+        pairs += len(pair_lines)
+    latencies.sort()
+    total = sum(latencies)
+    print('{} documents, {} pairs, {:.0f} pairs/s'.format(len(requests), pairs, pairs / total))
+    print('{:>10} {:>10} {:>10} {:>10}'.format('p50 (ms)', 'p90 (ms)', 'p99 (ms)', 'max (ms)'))
+    print('{:>10.1f} {:>10.1f} {:>10.1f} {:>10.1f}'.format(
+        percentile(latencies, 50) * 1e3, percentile(latencies, 90) * 1e3,
+        percentile(latencies, 99) * 1e3, latencies[-1] * 1e3))
@@ -0,0 +1,302 @@
+"""Wall time, CPU time and peak RSS of every pipeline stage.
+
+usage: python -m benchmarks.stages [--scales 1,2,4] [--backend numpy|mallet]
+                                   [--history benchmark_history.json]
+                                   [--threshold 0.25] [--min-seconds 0.05]
+                                   [--baseline-runs 5] [--no-record]
+
+Stages run on the train, dev and test gold files: reading the document
+files, parsing trees, pos tags and dependencies, building documents, each
+registered feature on its own (the featurize_* methods) and all of them in
+one pass, writing the featurized file and building the matrix; then
+training on train, classifying dev and test and scoring them with
+evaluation.py.
+
+Each scale runs in its own subprocess inside a scratch directory whose
+data/ holds the gold files with every document replicated N times (the
+copies are symlinks to the real document files), so nothing is written
+to the project directory except the history file.
+
+Every run is appended to the JSON history. A stage regresses when it is
+slower than the median of the last --baseline-runs runs at the same scale
+by more than --threshold (relative) and --min-seconds (absolute); the
+benchmark then exits with status 1.
+"""
+
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from corpus_reader import CorpusReader, Document, get_document_paths, get_document_titles
+import evaluation
+from feature_index import FeatureVocabulary, feature_lists_to_matrix
+import relation_extractor
+import relation_feature_extractor
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GOLD_FILES = [('train', 'rel-trainset.gold'), ('dev', 'rel-devset.gold'),
+              ('test', 'rel-testset.gold')]
+
+
+def peak_rss_mb():
+    # ru_maxrss is kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3
+
+
+def cpu_seconds():
+    times = os.times()
+    return times[0] + times[1]
+
+
+class StageTimer:
+    def __init__(self):
+        self.stages = []
+
+    def run(self, name, func, *args):
+        start_wall = time.time()
+        start_cpu = cpu_seconds()
+        result = func(*args)
+        self.stages.append({
+            'stage': name,
+            'seconds': time.time() - start_wall,
+            'cpu_seconds': cpu_seconds() - start_cpu,
+            'peak_rss_mb': peak_rss_mb(),
+        })
+        return result
+
+
+def make_workspace(scale):
+    """Scratch directory whose data/ has each gold file's documents scale times"""
+    workspace = tempfile.mkdtemp(prefix='relext-bench-')
+    os.symlink(os.path.join(PROJECT_DIR, 'Mallet1'), os.path.join(workspace, 'Mallet1'))
+    for path in get_document_paths(''):
+        os.makedirs(os.path.join(workspace, os.path.dirname(path)))
+    for _, pair_file in GOLD_FILES:
+        with open(os.path.join(PROJECT_DIR, 'data', pair_file)) as f:
+            lines = [line.split('\t') for line in f if line.strip()]
+        linked = set()
+        with open(os.path.join(workspace, 'data', pair_file), 'w') as out:
+            for copy in range(scale):
+                for fields in lines:
+                    title = fields[1] if copy == 0 else '{}.x{}'.format(fields[1], copy)
+                    out.write('\t'.join(fields[:1] + [title] + fields[2:]))
+                    if title in linked:
+                        continue
+                    linked.add(title)
+                    for source, target in zip(get_document_paths(fields[1]),
+                                              get_document_paths(title)):
+                        os.symlink(os.path.join(PROJECT_DIR, source),
+                                   os.path.join(workspace, target))
+    return workspace
+
+
+def read_documents(timer, split, pair_file):
+    reader = CorpusReader(pair_file, True, streaming=True)
+    titles = get_document_titles(pair_file, True)
+    files = timer.run(split + '/read_files', lambda: [
+        [reader.get_file_lines(path) for path in get_document_paths(title)] for title in titles])
+    parses = timer.run(split + '/parse_trees', lambda: [
+        reader.read_parse_lines(lines[0]) for lines in files])
+    pos_tagged_sents = timer.run(split + '/parse_pos_tags', lambda: [
+        reader.read_pos_tagged_lines(lines[1]) for lines in files])
+    dparses = timer.run(split + '/parse_dependencies', lambda: [
+        reader.read_dependency_lines(lines[2]) for lines in files])
+
+    def build_documents():
+        docs = dict((title, Document(title, parses=p, pos_tagged_sents=s, dparses=d,
+                                     reading_gold_file=True))
+                    for title, p, s, d in zip(titles, parses, pos_tagged_sents, dparses))
+        for line in reader.get_file_lines(reader.filename):
+            line_split = line.split()
+            reader.add_two_tokens(docs[line_split[1]], line_split, True)
+        return [docs[title] for title in titles]
+    return timer.run(split + '/build_documents', build_documents)
+
+
+def featurize(timer, split, docs):
+    for name in relation_feature_extractor.DEFAULT_FEATURES:
+        # a fresh extractor each time so no feature reuses another's caches
+        fe = relation_feature_extractor.FeatureExtractor(None, True, docs=docs)
+        timer.run('{}/featurize_{}'.format(split, name), fe.featurize, [name])
+    fe = relation_feature_extractor.FeatureExtractor(None, True, docs=docs)
+    timer.run(split + '/featurize_all', fe.featurize)
+    return [instance for doc_list in fe.rel_inst_list for instance in doc_list]
+
+
+def run_stages(scale, backend):
+    timer = StageTimer()
+    extractor = relation_extractor.RelExtractor(backend=backend)
+    instances = {}
+    for split, pair_file in GOLD_FILES:
+        docs = read_documents(timer, split, pair_file)
+        instances[split] = featurize(timer, split, docs)
+    vocabulary = FeatureVocabulary()
+    matrices = {}
+    for split, _ in GOLD_FILES:
+        if split == 'train':
+            timer.run('train/write_features', extractor.write_training_file, instances[split])
+        else:
+            timer.run(split + '/write_features', extractor.write_test_file, instances[split])
+            vocabulary.freeze()
+        matrices[split] = timer.run(split + '/build_matrix', feature_lists_to_matrix,
+                                    [instance.features for instance in instances[split]],
+                                    vocabulary)
+    labels = dict((split, [instance.relType.split('.')[0] for instance in instances[split]])
+                  for split in instances)
+
+    if backend == 'numpy':
+        from maxent import MaxEntModel
+        model = timer.run('train/train', MaxEntModel().train, matrices['train'], labels['train'])
+    else:
+        extractor.write_training_file(instances['train'])
+        timer.run('train/train', extractor.train_mallet)
+
+    for split in ('dev', 'test'):
+        extractor.test_gold_labels = labels[split]
+        if backend == 'numpy':
+            extractor.test_predictions = timer.run(split + '/classify', model.predict,
+                                                   matrices[split])
+        else:
+            extractor.write_test_file(instances[split])
+            timer.run(split + '/classify', extractor.test_mallet)
+        timer.run(split + '/evaluate', evaluate, extractor)
+    return timer.stages
+
+
+def evaluate(extractor):
+    """RelExtractor.evaluate without printing the scores"""
+    with open('gold_test', 'w') as gold_file:
+        for rel_type in extractor.test_gold_labels:
+            gold_file.write('{}\n'.format(rel_type))
+    with open('output_test', 'w') as output_file:
+        if extractor.test_predictions is not None:
+            for label in extractor.test_predictions:
+                output_file.write('{}\n'.format(label))
+        else:
+            with open('labeled_test') as labeled_file:
+                for line in labeled_file:
+                    output_file.write('{}\n'.format(extractor.get_highest_probability_label(line)))
+    evaluation.write_reports(evaluation.evaluate_files('gold_test', 'output_test'))
+
+
+def run_scale(scale, backend):
+    """Runs one scale in a subprocess and scratch directory; returns its stages"""
+    workspace = make_workspace(scale)
+    try:
+        out = subprocess.check_output([sys.executable, '-m', 'benchmarks.stages', '--child',
+                                       str(scale), '--backend', backend, '--workspace', workspace],
+                                      cwd=PROJECT_DIR)
+    finally:
+        shutil.rmtree(workspace)
+    return json.loads(out.decode('utf-8').strip().splitlines()[-1])
+
+
+def load_history(path):
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return json.load(f)
+
+
+def git_commit():
+    try:
+        with open(os.devnull, 'w') as devnull:
+            out = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                          cwd=PROJECT_DIR, stderr=devnull)
+        return out.decode('utf-8').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def median(values):
+    values = sorted(values)
+    middle = len(values) // 2
+    if len(values) % 2:
+        return values[middle]
+    return (values[middle - 1] + values[middle]) / 2.0
+
+
+def find_regressions(run, history, threshold, min_seconds, baseline_runs):
+    """(stage, seconds, baseline seconds) for stages slower than their baseline"""
+    previous = [r for r in history if r['scale'] == run['scale'] and r['backend'] == run['backend']]
+    previous = previous[-baseline_runs:]
+    regressions = []
+    for stage in run['stages']:
+        past = [s['seconds'] for r in previous for s in r['stages'] if s['stage'] == stage['stage']]
+        if not past:
+            continue
+        baseline = median(past)
+        if stage['seconds'] > baseline * (1 + threshold) and \
+                stage['seconds'] - baseline > min_seconds:
+            regressions.append((stage['stage'], stage['seconds'], baseline))
+    return regressions
+
+
+def print_scaling(runs):
+    scales = [run['scale'] for run in runs]
+    print('{:<42}'.format('stage') + ''.join('{:>10}'.format('x{} (s)'.format(s)) for s in scales)
+          + '{:>10}'.format('cpu (s)') + '{:>10}'.format('rss (MB)'))
+    for i, stage in enumerate(runs[0]['stages']):
+        row = '{:<42}'.format(stage['stage'])
+        row += ''.join('{:>10.3f}'.format(run['stages'][i]['seconds']) for run in runs)
+        last = runs[-1]['stages'][i]
+        row += '{:>10.3f}{:>10.1f}'.format(last['cpu_seconds'], last['peak_rss_mb'])
+        print(row)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Time every pipeline stage")
+    parser.add_argument('--scales', default='1',
+                        help="comma separated replication factors of the corpora")
+    parser.add_argument('--backend', default='numpy', choices=('numpy', 'mallet'))
+    parser.add_argument('--history', default=os.path.join(PROJECT_DIR, 'benchmark_history.json'))
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help="relative slowdown over the baseline that counts as a regression")
+    parser.add_argument('--min-seconds', type=float, default=0.05,
+                        help="ignore slowdowns smaller than this many seconds")
+    parser.add_argument('--baseline-runs', type=int, default=5)
+    parser.add_argument('--no-record', action='store_true',
+                        help="compare against the history without appending to it")
+    parser.add_argument('--child', type=int, default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--workspace', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        os.chdir(args.workspace)
+        with open(os.devnull, 'w') as devnull:
+            # keep the pipeline's progress prints off the result line
+            stdout = sys.stdout
+            sys.stdout = devnull
+            stages = run_stages(args.child, args.backend)
+            sys.stdout = stdout
+        print(json.dumps(stages))
+        sys.exit(0)
+
+    history = load_history(args.history)
+    runs = []
+    regressions = []
+    for scale in [int(s) for s in args.scales.split(',')]:
+        run = {'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'commit': git_commit(),
+               'scale': scale, 'backend': args.backend,
+               'stages': run_scale(scale, args.backend)}
+        run['peak_rss_mb'] = max(stage['peak_rss_mb'] for stage in run['stages'])
+        regressions.extend((scale,) + r for r in find_regressions(
+            run, history, args.threshold, args.min_seconds, args.baseline_runs))
+        runs.append(run)
+    print_scaling(runs)
+
+    if not args.no_record:
+        with open(args.history, 'w') as f:
+            json.dump(history + runs, f, indent=1)
+    if regressions:
+        print('\nRegressions (more than {:.0%} and {}s over the median of the last {} runs):'.format(
+            args.threshold, args.min_seconds, args.baseline_runs))
+        for scale, stage, seconds, baseline in regressions:
+            print('  x{} {}: {:.3f}s vs {:.3f}s'.format(scale, stage, seconds, baseline))
+        sys.exit(1)
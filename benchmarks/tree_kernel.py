@@ -0,0 +1,84 @@
+"""Tree kernel evaluations per second, naive versus indexed and memoized.
+
+usage: python -m benchmarks.tree_kernel [--pairs 300] [--workers 1,2,4] [pair_file]
+
+Builds the path-enclosed tree of every pair of the gold file and times the
+SST kernel between --pairs random trees and --pairs others, first the
+textbook way (every node pair compared, delta recomputed recursively) and
+then with tree_kernel's production index and delta memo, checking both
+agree. Then times a Gram block of all trees against --pairs landmarks on
+each worker count, and once more read back from a GramCache.
+"""
+
+import argparse
+import random
+import shutil
+import tempfile
+import time
+
+from relation_feature_extractor import FeatureExtractor
+import tree_kernel
+
+
+def expand(table, tree):
+    """subtree id of every node of a KernelTree"""
+    nodes = []
+    for nodes_of_production in tree.fragments.values():
+        for subtree, count in nodes_of_production:
+            nodes.extend([subtree] * count)
+    return nodes
+
+
+def naive_delta(table, s1, s2):
+    if table.productions[s1] != table.productions[s2]:
+        return 0.0
+    value = table.lam
+    for c1, c2 in zip(table.children[s1], table.children[s2]):
+        value *= 1.0 + naive_delta(table, c1, c2)
+    return value
+
+
+def naive_kernel(table, nodes1, nodes2):
+    return sum(naive_delta(table, s1, s2) for s1 in nodes1 for s2 in nodes2)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Time tree kernel evaluation")
+    parser.add_argument('pair_file', nargs='?', default='rel-trainset.gold')
+    parser.add_argument('--pairs', type=int, default=300)
+    parser.add_argument('--workers', default='1')
+    args = parser.parse_args()
+
+    fe = FeatureExtractor(args.pair_file, True)
+    table = tree_kernel.SubtreeTable()
+    start = time.time()
+    trees = tree_kernel.extractor_trees(table, fe)
+    print('{} trees, {} distinct subtrees, {} productions in {:.1f}s'.format(
+        len(trees), len(table), len(table.production_keys), time.time() - start))
+
+    rng = random.Random(0)
+    rows = rng.sample(trees, args.pairs)
+    cols = rng.sample(trees, args.pairs)
+    expanded = dict((id(tree), expand(table, tree)) for tree in rows + cols)
+    start = time.time()
+    naive = [naive_kernel(table, expanded[id(a)], expanded[id(b)]) for a in rows for b in cols]
+    naive_seconds = time.time() - start
+    table.memo.clear()
+    start = time.time()
+    fast = [tree_kernel.kernel(table, a, b) for a in rows for b in cols]
+    fast_seconds = time.time() - start
+    worst = max(abs(x - y) / max(abs(x), 1e-12) for x, y in zip(naive, fast))
+    print('{} evaluations: naive {:.0f}/s, indexed {:.0f}/s ({:.1f}x), max relative '
+          'difference {:.1e}'.format(len(fast), len(fast) / naive_seconds,
+                                     len(fast) / fast_seconds, naive_seconds / fast_seconds, worst))
+
+    for workers in [int(w) for w in args.workers.split(',')]:
+        table.memo.clear()
+        tree_kernel.gram_matrix(table, trees, cols, workers=workers)
+    cache_dir = tempfile.mkdtemp(prefix='relext-gram-')
+    try:
+        cache = tree_kernel.GramCache(cache_dir)
+        tree_kernel.gram_matrix(table, trees, cols, cache=cache)
+        tree_kernel.gram_matrix(table, trees, cols, cache=cache)
+    finally:
+        shutil.rmtree(cache_dir)
@@ -0,0 +1,81 @@
+"""On-disk snapshots of parsed corpora.
+
+A snapshot holds everything CorpusReader.read_corpus builds (documents,
+trees, pos tagged sentences, dependency maps and two_tokens) and is keyed by
+the paths, mtimes and sizes of every file the corpus was read from, so any
+change under data/ produces a new key and the old snapshot is dropped.
+"""
+
+import gc
+import hashlib
+import os
+import pickle
+
+# bump whenever CorpusReader changes what it builds from the source files
+CACHE_VERSION = 6
+
+
+class CorpusCache:
+    def __init__(self, cache_dir='.corpus_cache', hash_contents=False):
+        # hash_contents=True hashes file bytes instead of trusting mtime/size
+        self.cache_dir = cache_dir
+        self.hash_contents = hash_contents
+
+    def make_key(self, source_files, variant=''):
+        # variant covers reader options that change what gets built
+        h = hashlib.sha1()
+        h.update("{}|{}".format(CACHE_VERSION, variant).encode('utf-8'))
+        for path in source_files:
+            h.update(path.encode('utf-8'))
+            if not os.path.exists(path):
+                h.update(b'|missing')
+            elif self.hash_contents:
+                with open(path, 'rb') as f:
+                    h.update(hashlib.sha1(f.read()).digest())
+            else:
+                st = os.stat(path)
+                h.update("|{}|{}".format(st.st_mtime, st.st_size).encode('utf-8'))
+        return h.hexdigest()
+
+    def snapshot_path(self, corpus_filename, key):
+        name = os.path.basename(corpus_filename)
+        return os.path.join(self.cache_dir, "{}-{}.pickle".format(name, key))
+
+    def load(self, corpus_filename, key):
+        """Returns the cached corpus, or None on a miss"""
+        path = self.snapshot_path(corpus_filename, key)
+        if not os.path.exists(path):
+            return None
+        # every object unpickled stays alive as part of the corpus (the
+        # TwoTokens -> Document back-references are cycles the corpus itself
+        # holds), so collections triggered while loading free nothing and only
+        # slow it down
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            with open(path, 'rb') as f:
+                return pickle.load(f)
+        except (EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+            # truncated or written by an incompatible version; rebuild it
+            return None
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+
+    def store(self, corpus_filename, key, corpus):
+        if not os.path.isdir(self.cache_dir):
+            os.makedirs(self.cache_dir)
+        path = self.snapshot_path(corpus_filename, key)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(corpus, f, pickle.HIGHEST_PROTOCOL)
+        os.rename(tmp_path, path)
+        self.remove_stale(corpus_filename, key)
+
+    def remove_stale(self, corpus_filename, key):
+        """Deletes older snapshots of the same corpus file"""
+        prefix = os.path.basename(corpus_filename) + '-'
+        keep = os.path.basename(self.snapshot_path(corpus_filename, key))
+        for name in os.listdir(self.cache_dir):
+            if name.startswith(prefix) and name.endswith('.pickle') and name != keep:
+                os.remove(os.path.join(self.cache_dir, name))
@@ -1,12 +1,113 @@
 import nltk.tree
 import os,re
+try:
+    from sys import intern
+except ImportError:
+    pass # builtin on Python 2
+from collections import OrderedDict
+from corpus_cache import CorpusCache
+from parse_reader import LabelTable, read_bracketed_parse
+from dependency_graph import NO_NODE, align_sentences, read_dependency_graphs
+from lazy_corpus import LazyCorpus, PairFileIndex
+import instrumentation
+
+def intern_string(s):
+    """intern() of a pair field; Python 2's intern() only takes byte strings,
+    so unicode (e.g. from a JSON request) is interned as utf-8"""
+    if not isinstance(s, str):
+        s = s.encode('utf-8')
+    return intern(s)
 
 class CorpusReader:
-    def __init__(self, filename, reading_gold_file=False):
+    def __init__(self, filename, reading_gold_file=False, cache_dir=None, fast_parses=True,
+                 doc_filenames=None, streaming=False, lazy=False, max_loaded_documents=None,
+                 pair_store=None):
         # filename is the name of the rel-[whatever]set.[postfix] file
-        self.filename = 'data/'+filename
+        # cache_dir turns on the on-disk corpus snapshot (off by default);
+        # lazy readers keep their pair file index there instead
+        # fast_parses=False builds nltk.tree.Tree objects instead of FlatTrees
+        # doc_filenames restricts the corpus to those documents' pairs
+        # streaming=True reads nothing up front (corpus is None); use iter_documents()
+        # lazy=True indexes the pair file and reads each document's pairs and
+        # views only when used, keeping views for at most max_loaded_documents
+        # pair_store reads the pairs from a pair_store.PairStore (True loads,
+        # compiling if needed, the store of filename) instead of the text file
+        # filename=None makes a reader for documents built from in-memory
+        # lines (document_from_lines) with no pair file behind it
+        self.filename = 'data/'+filename if filename is not None else None
         self.reading_gold_file = reading_gold_file
-        self.corpus = self.read_corpus(reading_gold_file)
+        self.fast_parses = fast_parses
+        self.doc_filenames = set(doc_filenames) if doc_filenames is not None else None
+        self.label_table = LabelTable()
+        self.dependency_labels = LabelTable()
+        self.cache = CorpusCache(cache_dir) if cache_dir else None
+        # 'hit' or 'miss' once the cache has been consulted, None when disabled
+        self.cache_status = None
+        self.lazy = lazy
+        if pair_store is True:
+            from pair_store import load_pair_store
+            pair_store = load_pair_store(filename, reading_gold_file)
+        if pair_store is not None:
+            if lazy:
+                raise ValueError("a lazy reader indexes the pair file itself; pass pair_store=None")
+            if self.doc_filenames is not None:
+                pair_store = pair_store.select(doc_num=sorted(self.doc_filenames))
+        self.pair_store = pair_store
+        if streaming or filename is None:
+            self.corpus = None
+        elif lazy:
+            self.corpus = self.read_corpus_lazily(reading_gold_file, cache_dir, max_loaded_documents)
+        else:
+            self.corpus = self.read_corpus_cached(reading_gold_file)
+
+    def read_corpus_cached(self, reading_gold_file=False):
+        if self.cache is None:
+            return self.read_corpus(reading_gold_file)
+        variant = "gold={} fast_parses={}".format(reading_gold_file, self.fast_parses)
+        if self.doc_filenames is not None:
+            variant += " docs=" + ",".join(sorted(self.doc_filenames))
+        if self.pair_store is not None:
+            variant += " store=" + self.pair_store.description
+        key = self.cache.make_key(self.get_source_files(reading_gold_file), variant)
+        corpus = self.cache.load(self.filename, key)
+        if corpus is not None:
+            self.cache_status = 'hit'
+            print("Corpus cache hit for " + self.filename)
+            return corpus
+        self.cache_status = 'miss'
+        print("Corpus cache miss for " + self.filename)
+        corpus = self.read_corpus(reading_gold_file)
+        self.cache.store(self.filename, key, corpus)
+        return corpus
+
+    def read_corpus_lazily(self, reading_gold_file, index_dir, max_loaded_documents):
+        index = PairFileIndex(self.filename, reading_gold_file, index_dir=index_dir)
+        titles = index.titles()
+        if self.doc_filenames is not None:
+            titles = [title for title in titles if title in self.doc_filenames]
+        print("Indexed {} documents in {}".format(len(titles), self.filename))
+        return LazyCorpus(self, index, titles, max_loaded=max_loaded_documents)
+
+    def document_accessed(self, doc):
+        if self.lazy:
+            self.corpus.document_accessed(doc)
+
+    def get_source_files(self, reading_gold_file=False):
+        """The pair file followed by every document file it points to"""
+        doc_filename_index = 1 if reading_gold_file else 0
+        source_files = [self.filename]
+        seen = set()
+        for line in self.get_file_lines(self.filename):
+            line_split = line.split()
+            if not line_split:
+                continue
+            doc_filename = line_split[doc_filename_index]
+            if self.doc_filenames is not None and doc_filename not in self.doc_filenames:
+                continue
+            if doc_filename not in seen:
+                seen.add(doc_filename)
+                source_files.extend(get_document_paths(doc_filename))
+        return source_files
 
     def read_corpus(self, reading_gold_file=False):
         print("Creating corpus from " + self.filename + "...")
@@ -17,64 +118,113 @@ class CorpusReader:
 
         # hashes {document_id : document object}
         # documents contain lists of parses and 'twotoken's
-        corpus = {}
-        relation_lines = self.get_file_lines(self.filename)
-        for line in relation_lines:
-            line_split = line.split()
-            doc_filename = line_split[doc_filename_index]
-            # Create document as necessary
-            if doc_filename not in corpus:
-                corpus[doc_filename] = Document(
-                                            title=doc_filename,
-                                            parses=self.get_document_parses(doc_filename),
-                                            pos_tagged_sents=self.get_pos_tagged_sents(doc_filename),
-                                            dparses=self.get_dependency_relations(doc_filename),
-                                            reading_gold_file=reading_gold_file
-                                        )
-            # now we are sure document is in corpus. Add the two_tokens line
-            corpus[doc_filename].two_tokens.append(TwoTokens(
-                                                    split_line=line_split,
-                                                    reading_gold_file=reading_gold_file,
-                                                    dp=corpus[doc_filename].dparses
-                                                    ))
+        corpus = OrderedDict()
+        with instrumentation.stage('corpus/read_corpus') as stage:
+            for line_split in self.iter_pair_lines():
+                doc_filename = line_split[doc_filename_index]
+                if self.doc_filenames is not None and doc_filename not in self.doc_filenames:
+                    continue
+                # Create document as necessary
+                if doc_filename not in corpus:
+                    corpus[doc_filename] = self.create_document(doc_filename, reading_gold_file)
+                # now we are sure document is in corpus. Add the two_tokens line
+                self.add_two_tokens(corpus[doc_filename], line_split, reading_gold_file)
+            stage.add(len(corpus))
         return corpus
 
+    def iter_documents(self, reading_gold_file=None):
+        """Yields one Document at a time, reading the pair file line by line.
+        A document is complete once the next one starts, so pair files must
+        keep each document's lines together (the rel-* files do)."""
+        if reading_gold_file is None:
+            reading_gold_file = self.reading_gold_file
+        doc_filename_index = 1 if reading_gold_file else 0
+        doc = None
+        for line_split in self.iter_pair_lines():
+            if not line_split:
+                continue
+            doc_filename = line_split[doc_filename_index]
+            if self.doc_filenames is not None and doc_filename not in self.doc_filenames:
+                continue
+            if doc is None or doc.title != doc_filename:
+                if doc is not None:
+                    yield doc
+                doc = self.create_document(doc_filename, reading_gold_file)
+            self.add_two_tokens(doc, line_split, reading_gold_file)
+        if doc is not None:
+            yield doc
+
+    def iter_pair_lines(self):
+        """line.split() of each pair, from the pair store or the pair file"""
+        if self.pair_store is not None:
+            for line_split in self.pair_store.iter_split_lines():
+                yield line_split
+            return
+        for line in self.get_file_lines(self.filename):
+            yield line.split()
+
+    def create_document(self, doc_filename, reading_gold_file=False, lazy=False):
+        if lazy:
+            return Document(title=doc_filename, reading_gold_file=reading_gold_file, loader=self)
+        return Document(
+                    title=doc_filename,
+                    parses=self.get_document_parses(doc_filename),
+                    pos_tagged_sents=self.get_pos_tagged_sents(doc_filename),
+                    dparses=self.get_dependency_relations(doc_filename),
+                    reading_gold_file=reading_gold_file
+                )
+
+    def add_two_tokens(self, doc, line_split, reading_gold_file=False):
+        doc.two_tokens.append(TwoTokens(
+                                split_line=line_split,
+                                reading_gold_file=reading_gold_file,
+                                document=doc
+                                ))
+
+
+    def document_from_lines(self, title, parse_lines, pos_lines, dparse_lines,
+                            reading_gold_file=False):
+        """Document from the contents of its .parse, .tag and .dparse files"""
+        return Document(
+                    title=title,
+                    parses=self.read_parse_lines(parse_lines),
+                    pos_tagged_sents=self.read_pos_tagged_lines(pos_lines),
+                    dparses=self.read_dependency_lines(dparse_lines),
+                    reading_gold_file=reading_gold_file
+                )
 
     def get_document_parses(self, doc_filename):
-        lines = self.get_file_lines('data/parsed-files/'+doc_filename+'.head.rel.tokenized.raw.parse')
-        no_empty_lines = [line for line in lines if line not in [' ', '', '\n']]
-        tree_lines = []
-        for line in no_empty_lines:
-            tree_lines.append(nltk.tree.Tree.fromstring(line))
-        return tree_lines
+        return self.read_parse_lines(self.get_file_lines(get_document_paths(doc_filename)[0]))
 
     def get_pos_tagged_sents(self, doc_filename):
-        lines = self.get_file_lines('data/postagged-files/'+doc_filename+'.head.rel.tokenized.raw.tag')
-        no_empty_lines = [line for line in lines if line not in [' ', '', '\n']]
-        pos_tagged_sents = []
-        for line in no_empty_lines:
-            sent = [tok.split("_") for tok in line.split()]
-            pos_tagged_sents.append(sent)
-        return pos_tagged_sents
+        return self.read_pos_tagged_lines(self.get_file_lines(get_document_paths(doc_filename)[1]))
 
     def get_dependency_relations(self, doc_filename):
-        lines = self.get_file_lines('data/dependency-parsed-files/'+doc_filename+'.head.rel.tokenized.raw.dparse')
-        ind = 0
-        dependency_relation_sents = []
-        pattern = re.compile(r"(.+)\((.+)-(\d+)(\'*), (.+)-(\d+)(\'*)\)")
-        sent = {}
-        for line in lines:
-            line = line.strip()
-            if len(line) == 0:
-                dependency_relation_sents.append(sent)
-                ind += 1
-                sent = {}
-                continue
-            groups = re.split(pattern,line) #In format relation(word1, word2)
-            # groups = ['', 'acl', 'Ruffles', '1', '', 'peeping', '2', "'", '']
-            key = get_key_for_dparse(groups[2],groups[5],groups[3],groups[6])
-            sent[key] = groups[1]
-        return dependency_relation_sents
+        return self.read_dependency_lines(self.get_file_lines(get_document_paths(doc_filename)[2]))
+
+    def read_parse_lines(self, lines):
+        with instrumentation.stage('corpus/parse_trees', instances=1):
+            no_empty_lines = [line for line in lines if line not in [' ', '', '\n']]
+            tree_lines = []
+            for line in no_empty_lines:
+                if self.fast_parses:
+                    tree_lines.append(read_bracketed_parse(line, self.label_table).root())
+                else:
+                    tree_lines.append(nltk.tree.Tree.fromstring(line))
+            return tree_lines
+
+    def read_pos_tagged_lines(self, lines):
+        with instrumentation.stage('corpus/parse_pos_tags', instances=1):
+            no_empty_lines = [line for line in lines if line not in [' ', '', '\n']]
+            pos_tagged_sents = []
+            for line in no_empty_lines:
+                sent = [tok.split("_") for tok in line.split()]
+                pos_tagged_sents.append(sent)
+            return pos_tagged_sents
+
+    def read_dependency_lines(self, lines):
+        with instrumentation.stage('corpus/parse_dependencies', instances=1):
+            return read_dependency_graphs(lines, self.dependency_labels)
 
     def get_plaintext(self, doc_filename):
         lines = self.get_file_lines('data/text-files/'+doc_filename+'.head.rel.tokenized.raw')
@@ -87,65 +237,173 @@ class CorpusReader:
 
     def get_file_lines(self, filepath):
         #filepath is relative to being in the project directory
-        f = open(filepath, 'r')
-        lines = f.readlines()
-        f.close
+        with instrumentation.stage('corpus/read_files', instances=1):
+            with open(filepath, 'r') as f:
+                lines = f.readlines()
         return lines
 
-def get_key_for_dparse(token1,token2,ind1,ind2):
-    key = "{}_{}".format(token1.lower(),token2.lower())
-    #print key
-    return key
-
-def get_dependency_relation(dependency_relation_sents,sent,token1,token2,offset1,offset2):
-    if int(sent) < len(dependency_relation_sents):
-        d_r_sent = dependency_relation_sents[int(sent)]
-        #key = "{}-{}, {}-{}".format(token1,offset1,token2,offset2)
-        key = get_key_for_dparse(token1,token2,offset1,offset2)
-        key2 = get_key_for_dparse(token2,token1,offset2,offset1)
-        if key in d_r_sent:
-            # print d_r_sent.get(key),key
-            return d_r_sent.get(key)
-        elif key2 in d_r_sent:
-            # print d_r_sent.get(key2),key2
-            return d_r_sent.get(key2)
-    return ""
-
-class Document:
-    def __init__(self, title, parses, pos_tagged_sents, dparses, reading_gold_file=False):
+def get_document_titles(filename, reading_gold_file=False):
+    """Documents of a rel-[whatever]set.[postfix] file in order of first appearance"""
+    doc_filename_index = 1 if reading_gold_file else 0
+    titles = []
+    seen = set()
+    with open('data/'+filename) as f:
+        for line in f:
+            line_split = line.split()
+            if line_split and line_split[doc_filename_index] not in seen:
+                seen.add(line_split[doc_filename_index])
+                titles.append(line_split[doc_filename_index])
+    return titles
+
+def get_document_paths(doc_filename):
+    """parse, pos tag and dependency parse files for a document"""
+    base = doc_filename+'.head.rel.tokenized.raw'
+    return ['data/parsed-files/'+base+'.parse',
+            'data/postagged-files/'+base+'.tag',
+            'data/dependency-parsed-files/'+base+'.dparse']
+
+class Document(object):
+    __slots__ = ('title', 'reading_gold_file', 'loader', '_parses', '_pos_tagged_sents',
+                 '_dparses', '_aligned_dparses', 'two_tokens')
+
+    def __init__(self, title, parses=None, pos_tagged_sents=None, dparses=None,
+                 reading_gold_file=False, loader=None):
+        # loader is the CorpusReader of a lazy corpus: views passed as None
+        # are read from it on first access and can be dropped again by unload()
         self.title = title
         self.reading_gold_file = reading_gold_file
-        self.parses = parses
-        self.pos_tagged_sents = pos_tagged_sents
-        self.dparses = dparses
+        self.loader = loader
+        self._parses = parses
+        self._pos_tagged_sents = pos_tagged_sents
+        self._dparses = dparses
+        # dparses lined up with pos_tagged_sents, see sentence_dependencies
+        self._aligned_dparses = None
         self.two_tokens = []
-        if len(dparses) != len(pos_tagged_sents):
-            # print title,len(dparses),len(pos_tagged_sents)
-            dparses = []
 
+    def get_view(self, name, read_method):
+        value = getattr(self, name)
+        if value is None and self.loader is not None:
+            value = getattr(self.loader, read_method)(self.title)
+            setattr(self, name, value)
+        if self.loader is not None:
+            self.loader.document_accessed(self)
+        return value
+
+    @property
+    def parses(self):
+        return self.get_view('_parses', 'get_document_parses')
+
+    @parses.setter
+    def parses(self, value):
+        self._parses = value
+
+    @property
+    def pos_tagged_sents(self):
+        return self.get_view('_pos_tagged_sents', 'get_pos_tagged_sents')
 
-class TwoTokens:
-    def __init__(self, split_line, reading_gold_file=False, dp=[]):
-        self.split_line = split_line
+    @pos_tagged_sents.setter
+    def pos_tagged_sents(self, value):
+        self._pos_tagged_sents = value
+
+    @property
+    def dparses(self):
+        return self.get_view('_dparses', 'get_dependency_relations')
+
+    @dparses.setter
+    def dparses(self, value):
+        self._dparses = value
+
+    def sentence_dependencies(self, sent_offset):
+        """SentenceDependencies of pos sentence sent_offset, or None when the
+        dependency parse has no matching sentence. The dependency parser
+        sometimes splits sentences differently, so sentences are aligned on
+        their words rather than by position."""
+        if self._aligned_dparses is None:
+            self._aligned_dparses = align_sentences(self.pos_tagged_sents, self.dparses)
+        if 0 <= sent_offset < len(self._aligned_dparses):
+            return self._aligned_dparses[sent_offset]
+        return None
+
+    def is_loaded(self):
+        return any(view is not None for view in
+                   (self._parses, self._pos_tagged_sents, self._dparses))
+
+    def unload(self):
+        """Drops the views read by the loader; they are read again when needed"""
+        if self.loader is not None:
+            self._parses = None
+            self._pos_tagged_sents = None
+            self._dparses = None
+            self._aligned_dparses = None
+
+
+class TwoTokens(object):
+    __slots__ = ('full_tag', 'tag', 'doc_num', 'sent_offset1', 'begin_token1', 'end_token1',
+                 'entity_type1', 'entity_id1', 'token1', 'sent_offset2', 'begin_token2',
+                 'end_token2', 'entity_type2', 'entity_id2', 'token2', 'document',
+                 '_in_dependency_relation')
+
+    def __init__(self, split_line, reading_gold_file=False, document=None):
+        # the dependency relation is looked up in document's dependency
+        # parse when it is first asked for
+        # repeated strings (tags, document and entity ids, entity types, words) are
+        # interned so every pair shares one copy
         #gold files have the tag at the beginning--grab and remove it
         if reading_gold_file:
-            self.tag = split_line[0].split('.')[0]
-            split_line = self.split_line[1:]
-        self.doc_num = split_line[0]
+            self.full_tag = intern_string(split_line[0])
+            self.tag = intern_string(self.full_tag.split('.')[0])
+            split_line = split_line[1:]
+        else:
+            self.full_tag = None
+        self.doc_num = intern_string(split_line[0])
         self.sent_offset1 = int(split_line[1])
         self.begin_token1 = int(split_line[2])
         self.end_token1 = int(split_line[3])
-        self.entity_type1 = split_line[4]
-        self.entity_id1 = split_line[5]
-        self.token1 = split_line[6]
+        self.entity_type1 = intern_string(split_line[4])
+        self.entity_id1 = intern_string(split_line[5])
+        self.token1 = intern_string(split_line[6])
         self.sent_offset2 = int(split_line[7])
         self.begin_token2 = int(split_line[8])
         self.end_token2 = int(split_line[9])
-        self.entity_type2 = split_line[10]
-        self.entity_id2 = split_line[11]
-        self.token2 = split_line[12]
-        self.in_dependency_relation = get_dependency_relation(dp,self.sent_offset1,
-            self.token1,self.token2,self.begin_token1,self.begin_token2)
+        self.entity_type2 = intern_string(split_line[10])
+        self.entity_id2 = intern_string(split_line[11])
+        self.token2 = intern_string(split_line[12])
+        self.document = document
+        self._in_dependency_relation = None
+
+    @property
+    def split_line(self):
+        """The fields of the pair file line, rebuilt from the attributes"""
+        fields = [self.doc_num,
+                  str(self.sent_offset1), str(self.begin_token1), str(self.end_token1),
+                  self.entity_type1, self.entity_id1, self.token1,
+                  str(self.sent_offset2), str(self.begin_token2), str(self.end_token2),
+                  self.entity_type2, self.entity_id2, self.token2]
+        if self.full_tag is not None:
+            fields.insert(0, self.full_tag)
+        return fields
+
+    def dependency_nodes(self):
+        """(SentenceDependencies, head node of entity 1, head node of entity 2)
+        for the pair's sentence; the graph is None when there is none"""
+        if self.document is None or self.sent_offset1 != self.sent_offset2:
+            return None, NO_NODE, NO_NODE
+        graph = self.document.sentence_dependencies(self.sent_offset1)
+        if graph is None:
+            return None, NO_NODE, NO_NODE
+        # an entity's head is its last token
+        return graph, graph.node_of_token(self.end_token1-1), graph.node_of_token(self.end_token2-1)
+
+    @property
+    def in_dependency_relation(self):
+        """Label of the dependency between the entities' head words, '' if none"""
+        if self._in_dependency_relation is None:
+            graph, node1, node2 = self.dependency_nodes()
+            if graph is None or node1 == NO_NODE or node2 == NO_NODE:
+                self._in_dependency_relation = ''
+            else:
+                self._in_dependency_relation = graph.relation(node1, node2)
+        return self._in_dependency_relation
 
 if __name__ == '__main__':
     # Example Usage
@@ -153,6 +411,7 @@ if __name__ == '__main__':
     # c = CorpusReader('rel-trainset.gold', reading_gold_file=True)
     # c = CorpusReader('rel-devset.gold', reading_gold_file=True)
     c = CorpusReader('rel-testset.gold', reading_gold_file=True)
+    # c = CorpusReader('rel-testset.gold', reading_gold_file=True, cache_dir='.corpus_cache')
     # corpus = c.corpus
 
     # print (corpus[c.corpus.keys()[0]].title)
@@ -0,0 +1,141 @@
+"""Document-level k-fold cross-validation.
+
+usage: python cross_validation.py [--folds 5] [--no-stratify] [--workers N]
+                                  [--seed 0] [--variance 1.0] [--iterations 500]
+                                  [--features a,b,...] [pair_file ...]
+
+Pairs of one document share sentences and entities, so every fold is made
+of whole documents. Stratified folds are filled greedily, documents with
+the most relations first, each going to the fold that so far has the
+smallest share of that document's relation types; unstratified folds just
+balance pair counts over shuffled documents.
+
+RelExtractor.cross_validate featurizes the pair files (rel-trainset.gold
+and rel-devset.gold by default) once into one matrix; each fold then
+trains maxent.MaxEntModel on the rows of the other folds and classifies
+its own, with the folds spread over a pool of worker processes.
+"""
+
+import argparse
+import multiprocessing
+import random
+import time
+
+import numpy as np
+
+from evaluation import score
+
+# set in each worker by init_worker: the featurized corpus and fold of every row
+SHARED = {}
+
+
+def document_folds(doc_label_counts, k, stratify=True, seed=0):
+    """Fold number of each document; doc_label_counts holds one
+    {relation type: pairs} dict per document"""
+    if k < 2 or k > len(doc_label_counts):
+        raise ValueError("need between 2 and {} folds, got {}".format(len(doc_label_counts), k))
+    order = list(range(len(doc_label_counts)))
+    random.Random(seed).shuffle(order)
+    totals = {}
+    for counts in doc_label_counts:
+        for label, count in counts.items():
+            totals[label] = totals.get(label, 0) + count
+    if stratify:
+        # stable, so documents with as many relations stay shuffled
+        order.sort(key=lambda doc: -sum(count for label, count in doc_label_counts[doc].items()
+                                        if label != 'no_rel'))
+    fold_counts = [{} for _ in range(k)]
+    fold_sizes = [0] * k
+    folds = [None] * len(doc_label_counts)
+    for doc in order:
+        counts = doc_label_counts[doc]
+        def cost(fold):
+            if not stratify:
+                return fold_sizes[fold]
+            return sum(count * fold_counts[fold].get(label, 0) / float(totals[label])
+                       for label, count in counts.items())
+        fold = min(range(k), key=lambda f: (cost(f), fold_sizes[f], f))
+        folds[doc] = fold
+        for label, count in counts.items():
+            fold_counts[fold][label] = fold_counts[fold].get(label, 0) + count
+        fold_sizes[fold] += sum(counts.values())
+    return folds
+
+
+def init_worker(shared):
+    SHARED.update(shared)
+
+
+def run_fold(fold):
+    from maxent import MaxEntModel
+    start = time.time()
+    test = SHARED['row_folds'] == fold
+    train = ~test
+    y = SHARED['labels']
+    model = MaxEntModel(gaussian_prior_variance=SHARED['variance'],
+                        max_iterations=SHARED['iterations'])
+    model.train(SHARED['X'][train], list(y[train]))
+    predictions = model.predict(SHARED['X'][test])
+    precision, recall, f1 = score(y[test], predictions)
+    return {'fold': fold, 'pairs': int(test.sum()), 'precision': precision, 'recall': recall,
+            'f1': f1, 'predictions': predictions, 'seconds': time.time() - start}
+
+
+def cross_validate(X, labels, doc_sizes, doc_label_counts, k=5, stratify=True, workers=1,
+                   seed=0, variance=1.0, iterations=500):
+    """Per-fold scores plus their mean and standard deviation and the score
+    of all out-of-fold predictions pooled; rows of X are grouped by document
+    in doc_sizes order"""
+    folds = document_folds(doc_label_counts, k, stratify, seed)
+    labels = np.array(labels)
+    shared = {'X': X, 'labels': labels, 'row_folds': np.repeat(folds, doc_sizes),
+              'variance': variance, 'iterations': iterations}
+    workers = max(1, min(workers, k))
+    if workers > 1:
+        pool = multiprocessing.Pool(workers, initializer=init_worker, initargs=(shared,))
+        try:
+            fold_results = pool.map(run_fold, range(k), 1)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        init_worker(shared)
+        fold_results = [run_fold(fold) for fold in range(k)]
+    predictions = np.empty(len(labels), dtype=object)
+    for result in fold_results:
+        predictions[shared['row_folds'] == result['fold']] = result.pop('predictions')
+    scores = np.array([[r['precision'], r['recall'], r['f1']] for r in fold_results])
+    return {'folds': fold_results, 'mean': scores.mean(axis=0).tolist(),
+            'std': scores.std(axis=0, ddof=1).tolist(),
+            'pooled': list(score(labels, list(predictions)))}
+
+
+def print_report(results):
+    print('{:>5} {:>7} {:>8} {:>8} {:>8} {:>9}'.format(
+        'fold', 'pairs', 'P', 'R', 'F1', 'time (s)'))
+    for r in results['folds']:
+        print('{:>5} {:>7} {:>8.4f} {:>8.4f} {:>8.4f} {:>9.1f}'.format(
+            r['fold'], r['pairs'], r['precision'], r['recall'], r['f1'], r['seconds']))
+    print('{:>5} {:>7} {:>8.4f} {:>8.4f} {:>8.4f}'.format('mean', '', *results['mean']))
+    print('{:>5} {:>7} {:>8.4f} {:>8.4f} {:>8.4f}'.format('std', '', *results['std']))
+    print('{:>5} {:>7} {:>8.4f} {:>8.4f} {:>8.4f}'.format('pool', '', *results['pooled']))
+
+
+if __name__ == '__main__':
+    import relation_extractor
+    parser = argparse.ArgumentParser(description="Document-level k-fold cross-validation")
+    parser.add_argument('pair_files', nargs='*', default=['rel-trainset.gold', 'rel-devset.gold'])
+    parser.add_argument('--folds', type=int, default=5)
+    parser.add_argument('--no-stratify', action='store_true')
+    parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count())
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--variance', type=float, default=1.0)
+    parser.add_argument('--iterations', type=int, default=500)
+    parser.add_argument('--features', default=None)
+    args = parser.parse_args()
+    extractor = relation_extractor.RelExtractor(backend='numpy', features=args.features)
+    results = extractor.cross_validate(args.pair_files, folds=args.folds,
+                                       stratify=not args.no_stratify, workers=args.workers,
+                                       seed=args.seed, variance=args.variance,
+                                       iterations=args.iterations)
+    print_report(results)
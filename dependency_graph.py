@@ -0,0 +1,216 @@
+"""Offset-indexed dependency graphs read from data/dependency-parsed-files.
+
+Each sentence of a .dparse file (relation(head-i, dependent-j) lines, one
+blank line after every sentence) becomes one SentenceDependencies: the word
+of every token index, the first head and relation label id of each
+dependent as int arrays, and a (lower index, higher index) -> (label id,
+head) table of all edges, so whether two tokens are directly related is one
+dict lookup. Shortest paths run a breadth first search from one token and
+keep its parent array, so every later path from that token is a walk up
+the array.
+
+The dependency parser's sentences and tokens do not always line up with the
+pos tagged sentences the pair offsets refer to: the tagger keeps empty
+tokens and trailing periods, and some documents have an extra sentence.
+align_sentences pairs each pos sentence with the dependency sentence
+sharing most of its words (None when none does), and
+SentenceDependencies.align_tokens maps pos tokens to dependency token
+indices, matching words in order.
+"""
+
+from array import array
+from collections import deque
+
+ROOT = 0
+NO_NODE = -1
+# how many dependency words a pos token may skip over to find its match
+ALIGN_LOOKAHEAD = 4
+
+
+class SentenceDependencies(object):
+    __slots__ = ('label_table', 'words', 'heads', 'label_ids', 'edges', 'token_nodes',
+                 '_neighbours', '_parents')
+
+    def __init__(self, label_table):
+        self.label_table = label_table
+        self.words = ['ROOT'] # by token index, '' for tokens in no relation
+        self.heads = array('i', [NO_NODE])
+        self.label_ids = array('i', [NO_NODE])
+        self.edges = {} # (lower index, higher index) -> (label id, head), last one wins
+        self.token_nodes = None # pos token -> token index, set by align_tokens
+        self._neighbours = None
+        self._parents = {}
+
+    def __len__(self):
+        return len(self.words)
+
+    def relation(self, node1, node2):
+        """Label of the edge between two token indices, '' when there is none"""
+        key = (node1, node2) if node1 < node2 else (node2, node1)
+        edge = self.edges.get(key)
+        if edge is None:
+            return ''
+        return self.label_table.names[edge[0]]
+
+    def build_neighbours(self):
+        neighbours = [[] for _ in self.words]
+        for low, high in self.edges:
+            neighbours[low].append(high)
+            neighbours[high].append(low)
+        self._neighbours = neighbours
+
+    def path(self, node1, node2):
+        """Labels on the shortest path from node1 to node2, each marked '<'
+        when it climbs from a dependent to its head and '>' when it descends;
+        None when the nodes are not connected"""
+        if node1 == node2:
+            return []
+        parents = self._parents.get(node1)
+        if parents is None:
+            parents = self.search_from(node1)
+        if parents[node2] == NO_NODE:
+            return None
+        steps = []
+        node = node2
+        while node != node1:
+            parent = parents[node]
+            label_id, head = self.edges[(parent, node) if parent < node else (node, parent)]
+            # walking back from node2: parent -> node climbs when node is the head
+            steps.append(self.label_table.names[label_id] + ('<' if head == node else '>'))
+            node = parent
+        steps.reverse()
+        return steps
+
+    def search_from(self, source):
+        if self._neighbours is None:
+            self.build_neighbours()
+        parents = array('i', [NO_NODE]) * len(self.words)
+        parents[source] = source
+        queue = deque([source])
+        while queue:
+            node = queue.popleft()
+            for neighbour in self._neighbours[node]:
+                if parents[neighbour] == NO_NODE:
+                    parents[neighbour] = node
+                    queue.append(neighbour)
+        self._parents[source] = parents
+        return parents
+
+    def align_tokens(self, pos_tagged_sent):
+        """Sets token_nodes: the token index of the word each pos token is,
+        NO_NODE for tokens the dependency parse left out (mostly punctuation
+        and the tagger's empty tokens). Both tokenize the same text, so words
+        are matched in order, looking a few words ahead past gaps."""
+        words = self.words
+        token_nodes = [NO_NODE] * len(pos_tagged_sent)
+        node = 1
+        for i, token in enumerate(pos_tagged_sent):
+            word = pos_word(token)
+            for candidate in range(node, min(node + ALIGN_LOOKAHEAD, len(words))):
+                if words[candidate] == word:
+                    token_nodes[i] = candidate
+                    node = candidate + 1
+                    break
+        self.token_nodes = token_nodes
+
+    def node_of_token(self, token):
+        if 0 <= token < len(self.token_nodes):
+            return self.token_nodes[token]
+        return NO_NODE
+
+
+def read_dependency_graphs(lines, label_table):
+    """One SentenceDependencies per blank-line terminated block of lines"""
+    # parsed with str methods rather than a regex: this runs once per line
+    # of every .dparse file
+    sentences = []
+    label_ids = label_table.ids
+    get_label_id = label_table.get_id
+    words = ['ROOT']
+    heads = [NO_NODE]
+    dependent_labels = [NO_NODE]
+    edges = {}
+    for line in lines:
+        line = line.strip()
+        if not line:
+            sentence = SentenceDependencies(label_table)
+            sentence.words = words
+            sentence.heads = array('i', heads)
+            sentence.label_ids = array('i', dependent_labels)
+            sentence.edges = edges
+            sentences.append(sentence)
+            words = ['ROOT']
+            heads = [NO_NODE]
+            dependent_labels = [NO_NODE]
+            edges = {}
+            continue
+        open_paren = line.index('(')
+        label = line[:open_paren]
+        head, _, dependent = line[open_paren+1:-1].partition(', ')
+        head_word, _, head_index = head.rpartition('-')
+        dependent_word, _, dependent_index = dependent.rpartition('-')
+        # copied nodes are written word-5' and share the index of word-5
+        if head_index[-1] == "'":
+            head_index = head_index.rstrip("'")
+        if dependent_index[-1] == "'":
+            dependent_index = dependent_index.rstrip("'")
+        head = int(head_index)
+        dependent = int(dependent_index)
+        size = (head if head > dependent else dependent) + 1
+        if size > len(words):
+            grow = size - len(words)
+            words.extend([''] * grow)
+            heads.extend([NO_NODE] * grow)
+            dependent_labels.extend([NO_NODE] * grow)
+        words[head] = head_word
+        words[dependent] = dependent_word
+        label_id = label_ids.get(label)
+        if label_id is None:
+            label_id = get_label_id(label)
+        if heads[dependent] == NO_NODE:
+            heads[dependent] = head
+            dependent_labels[dependent] = label_id
+        edges[(head, dependent) if head < dependent else (dependent, head)] = (label_id, head)
+    return sentences
+
+
+def pos_word(pos_token):
+    """Word of a pos_tagged_sents entry as the dependency parse writes it"""
+    if len(pos_token) > 1:
+        return '_'.join(pos_token[:-1])
+    return pos_token[0]
+
+
+def sentence_words(sentence):
+    return set(word for word in sentence.words[1:] if word)
+
+
+def align_sentences(pos_tagged_sents, sentences, window=3):
+    """The dependency sentence of each pos sentence, in order, or None.
+    Each pos sentence is matched against the next few unmatched dependency
+    sentences and takes the one containing most of its tokens (at least
+    half of them)."""
+    aligned = [None] * len(pos_tagged_sents)
+    next_sentence = 0
+    for i, pos_tagged_sent in enumerate(pos_tagged_sents):
+        tokens = [pos_word(token) for token in pos_tagged_sent]
+        tokens = [token for token in tokens if token]
+        if not tokens:
+            continue
+        best = None
+        best_score = 0.5
+        for j in range(next_sentence, min(next_sentence + window, len(sentences))):
+            words = sentence_words(sentences[j])
+            score = sum(1 for token in tokens if token in words) / float(len(tokens))
+            if score > best_score or (best is None and score == best_score):
+                best = j
+                best_score = score
+            if score == 1.0:
+                break
+        if best is not None:
+            sentence = sentences[best]
+            if sentence.token_nodes is None:
+                sentence.align_tokens(pos_tagged_sent)
+            aligned[i] = sentence
+            next_sentence = best + 1
+    return aligned
@@ -0,0 +1,328 @@
+"""Relation extraction scores and significance tests over label arrays.
+
+usage: python evaluation.py [--reports] [--bootstrap N] [--randomization N]
+                            [--workers N] [--seed 0] gold_file output_file [output_file_b]
+
+Scores count relation labels only, as relation-evaluator.py always has:
+a pair is correct when its predicted label is its gold label and that
+label is not no_rel. evaluate() gets the counts, overall and per relation
+type P/R/F1 and the full confusion matrix from one count of (gold,
+predicted) label pairs; evaluate_files() streams two label files (the
+first field of each non-blank line) through the same counts in chunks, so
+neither file is held in memory. Scoring is plain Python; numpy is only
+imported by the significance tests.
+
+Two systems' predictions for the same gold labels are compared on F1
+with
+
+    paired_bootstrap           resamples the pairs with replacement; p is
+                               the share of resamples where the F1
+                               difference is at least twice the observed
+                               one (Berg-Kirkpatrick et al., 2012), with a
+                               95% interval of the difference
+    approximate_randomization  swaps the two systems' labels of each pair
+                               with probability 1/2; p is the share of
+                               shuffles with an absolute F1 difference at
+                               least the observed one (Noreen, 1989)
+
+Neither test looks at single pairs: each pair is one of at most 32 count
+patterns (correct and predicted for either system, gold), so a resample
+is drawn as how many pairs of each pattern it takes, multinomial for the
+bootstrap and binomial for the swaps. Resamples are drawn in vectorized
+batches of BATCH, each from its own seed, and the batches are spread over
+worker processes; results depend on seed and resamples only, not on the
+number of workers.
+"""
+
+import argparse
+from collections import Counter
+import multiprocessing
+
+NO_REL = 'no_rel'
+# resamples drawn per vectorized batch (and per worker task)
+BATCH = 500
+# labels evaluate_files reads from each file before adding the chunk's
+# (gold, predicted) pairs to its Counter: large enough that the per-chunk
+# overhead vanishes, small enough (about 100 MB of label strings) that
+# memory stays flat however long the files are
+CHUNK_LINES = 1000000
+
+# set in each worker by init_worker: the count patterns and how many pairs have each
+SHARED = {}
+
+
+def prf(correct, predicted_total, gold_total):
+    precision = float(correct) / predicted_total if predicted_total else 0.0
+    recall = float(correct) / gold_total if gold_total else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return precision, recall, f1
+
+
+def score(gold_labels, predicted_labels):
+    """(precision, recall, f1) over the relation labels"""
+    gold = list(gold_labels)
+    predicted = list(predicted_labels)
+    if len(gold) != len(predicted):
+        raise ValueError("{} gold labels but {} predictions".format(len(gold), len(predicted)))
+    correct = sum(1 for g, p in zip(gold, predicted) if g == p and g != NO_REL)
+    return prf(correct, sum(1 for p in predicted if p != NO_REL),
+               sum(1 for g in gold if g != NO_REL))
+
+
+class ConfusionCounts:
+    """Confusion matrix (gold label x predicted label) grown chunk by chunk"""
+
+    def __init__(self):
+        # (gold, predicted) -> number of pairs
+        self.counts = Counter()
+
+    def add(self, gold_labels, predicted_labels):
+        if len(gold_labels) != len(predicted_labels):
+            raise ValueError("{} gold labels but {} predictions".format(
+                len(gold_labels), len(predicted_labels)))
+        self.counts.update(zip(gold_labels, predicted_labels))
+        return self
+
+    def result(self):
+        """Counts and scores, overall and per relation type, with the
+        confusion matrix (a list of rows) in sorted label order"""
+        labels = sorted(set(label for pair in self.counts for label in pair))
+        matrix = [[self.counts[(gold, predicted)] for predicted in labels] for gold in labels]
+        correct_type = [matrix[i][i] for i in range(len(labels))]
+        gold_type = [sum(row) for row in matrix]
+        predicted_type = [sum(column) for column in zip(*matrix)]
+        related = [i for i, label in enumerate(labels) if label != NO_REL]
+        correct = sum(correct_type[i] for i in related)
+        gold_total = sum(gold_type[i] for i in related)
+        predicted_total = sum(predicted_type[i] for i in related)
+        precision, recall, f1 = prf(correct, predicted_total, gold_total)
+        by_type = {}
+        for i in related:
+            by_type[labels[i]] = dict(zip(
+                ('precision', 'recall', 'f1'),
+                prf(correct_type[i], predicted_type[i], gold_type[i])),
+                correct=correct_type[i], gold=gold_type[i], predicted=predicted_type[i])
+        return {'correct': correct, 'gold_total': gold_total, 'predicted_total': predicted_total,
+                'precision': precision, 'recall': recall, 'f1': f1, 'by_type': by_type,
+                'labels': labels, 'confusion': matrix, 'pairs': sum(gold_type)}
+
+
+def evaluate(gold_labels, predicted_labels):
+    return ConfusionCounts().add(list(gold_labels), list(predicted_labels)).result()
+
+
+def read_labels(path):
+    """First field of every non-blank line"""
+    with open(path) as f:
+        for line in f:
+            parts = line.split()
+            if parts:
+                yield parts[0]
+
+
+def evaluate_files(gold_file, output_file, chunk_lines=CHUNK_LINES):
+    counts = ConfusionCounts()
+    gold = read_labels(gold_file)
+    predicted = read_labels(output_file)
+    while True:
+        gold_chunk = [label for _, label in zip(range(chunk_lines), gold)]
+        predicted_chunk = [label for _, label in zip(range(len(gold_chunk)), predicted)]
+        if len(predicted_chunk) < len(gold_chunk):
+            raise ValueError("{} has fewer labels than {}".format(output_file, gold_file))
+        if not gold_chunk:
+            break
+        counts.add(gold_chunk, predicted_chunk)
+    if next(predicted, None) is not None:
+        raise ValueError("{} has more labels than {}".format(output_file, gold_file))
+    return counts.result()
+
+
+def write_reports(result, confusion_path='confusion_matrix.txt', prf_path='prf_by_reltype.txt'):
+    """The confusion_matrix.txt and prf_by_reltype.txt relation-evaluator.py wrote"""
+    labels = result['labels']
+    matrix = result['confusion']
+    with open(confusion_path, 'w') as confusion_file:
+        for i, gold_type in enumerate(labels):
+            for j, test_type in enumerate(labels):
+                if i != j and matrix[i][j]:
+                    confusion_file.write('GOLD_{}\tTEST_{}:\t{}\n'.format(
+                        gold_type, test_type, matrix[i][j]))
+    with open(prf_path, 'w') as prf_file:
+        for reltype, scores in sorted(result['by_type'].items()):
+            if scores['correct']:
+                prf_file.write('Reltype: {} P: {} R: {} F1: {}\n'.format(
+                    reltype, scores['precision'], scores['recall'], scores['f1']))
+        prf_file.write('Overall P: {} R: {} F1: {}'.format(
+            result['precision'], result['recall'], result['f1']))
+
+
+def print_scores(result):
+    """The three lines relation-evaluator.py prints"""
+    print('{} {} {}'.format(result['correct'], result['gold_total'], result['predicted_total']))
+    print('precision = {} recall = {} f1 = {}'.format(result['precision'], result['recall'],
+                                                      result['f1']))
+    print('{} {} {}'.format(result['precision'], result['recall'], result['f1']))
+
+
+def pair_counts(gold_labels, predicted_a, predicted_b):
+    """Per pair: (correct, predicted) of system a, of system b, and gold as
+    0/1 columns"""
+    import numpy as np
+    gold = np.asarray(gold_labels)
+    columns = []
+    for predicted in (np.asarray(predicted_a), np.asarray(predicted_b)):
+        if predicted.shape != gold.shape:
+            raise ValueError("{} gold labels but {} predictions".format(len(gold), len(predicted)))
+        columns.append((gold == predicted) & (gold != NO_REL))
+        columns.append(predicted != NO_REL)
+    columns.append(gold != NO_REL)
+    return np.column_stack(columns).astype(np.int64)
+
+
+def count_patterns(counts):
+    """The distinct rows of pair_counts (at most 32) and how many pairs have each"""
+    import numpy as np
+    if not len(counts):
+        return np.zeros((0, 5), dtype=np.int64), np.zeros(0, dtype=np.int64)
+    patterns, frequencies = np.unique(counts, axis=0, return_counts=True)
+    return patterns, frequencies
+
+
+def f1_arrays(correct, predicted_total, gold_total):
+    """Vectorized F1 of count arrays"""
+    import numpy as np
+    with np.errstate(divide='ignore', invalid='ignore'):
+        precision = np.where(predicted_total > 0, correct / np.maximum(predicted_total, 1), 0.0)
+        recall = np.where(gold_total > 0, correct / np.maximum(gold_total, 1), 0.0)
+        return np.where(precision + recall > 0,
+                        2 * precision * recall / np.maximum(precision + recall, 1e-300), 0.0)
+
+
+def f1_difference(sums):
+    """F1 of system a minus F1 of system b, per row of summed pair counts"""
+    import numpy as np
+    sums = sums.astype(np.float64)
+    return f1_arrays(sums[:, 0], sums[:, 1], sums[:, 4]) - f1_arrays(sums[:, 2], sums[:, 3],
+                                                                     sums[:, 4])
+
+
+def init_worker(shared):
+    SHARED.update(shared)
+
+
+def bootstrap_batch(args):
+    """F1 differences of one batch of bootstrap resamples. A resample's
+    sums only depend on how many of its draws hit each count pattern, which
+    is multinomial, so no per-pair index is drawn."""
+    import numpy as np
+    seed, size = args
+    patterns = SHARED['patterns']
+    frequencies = SHARED['frequencies']
+    rng = np.random.RandomState(seed)
+    n = int(frequencies.sum())
+    hits = rng.multinomial(n, frequencies / float(n), size=size)
+    return f1_difference(hits.dot(patterns))
+
+
+def randomization_batch(args):
+    """F1 differences of one batch of label swaps. Only pairs the two systems
+    count differently change the sums, and only by how many of each count
+    pattern were swapped, which is binomial."""
+    import numpy as np
+    seed, size = args
+    patterns = SHARED['patterns']
+    frequencies = SHARED['frequencies']
+    rng = np.random.RandomState(seed)
+    base = frequencies.dot(patterns)
+    # swapping a pair moves (b - a) of its counts from b to a
+    change = patterns[:, 2:4] - patterns[:, 0:2]
+    swapped = rng.binomial(frequencies, 0.5, size=(size, len(frequencies)))
+    moved = swapped.dot(change)
+    sums = np.empty((size, 5), dtype=np.int64)
+    sums[:, 0:2] = base[0:2] + moved
+    sums[:, 2:4] = base[2:4] - moved
+    sums[:, 4] = base[4]
+    return f1_difference(sums)
+
+
+def resample(batch_func, counts, resamples, seed, workers):
+    """F1 differences of resamples drawn in seeded batches"""
+    import numpy as np
+    tasks = []
+    for batch, start in enumerate(range(0, resamples, BATCH)):
+        tasks.append((seed * 100003 + batch, min(BATCH, resamples - start)))
+    patterns, frequencies = count_patterns(counts)
+    shared = {'patterns': patterns, 'frequencies': frequencies}
+    workers = max(1, min(workers, len(tasks)))
+    if workers > 1:
+        pool = multiprocessing.Pool(workers, initializer=init_worker, initargs=(shared,))
+        try:
+            differences = pool.map(batch_func, tasks, 1)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        init_worker(shared)
+        differences = [batch_func(task) for task in tasks]
+    return np.concatenate(differences) if differences else np.zeros(0)
+
+
+def paired_bootstrap(gold_labels, predicted_a, predicted_b, resamples=10000, seed=0, workers=1):
+    """F1 of a minus F1 of b, its bootstrap p-value and 95% interval"""
+    import numpy as np
+    counts = pair_counts(gold_labels, predicted_a, predicted_b)
+    delta = float(f1_difference(counts.sum(axis=0)[None, :])[0])
+    differences = resample(bootstrap_batch, counts, resamples, seed, workers)
+    # resampled differences center on delta; how often do they exceed it by as much again
+    if delta >= 0:
+        p_value = float(np.mean(differences >= 2 * delta)) if delta > 0 else 1.0
+    else:
+        p_value = float(np.mean(differences <= 2 * delta))
+    low, high = np.percentile(differences, [2.5, 97.5])
+    return {'delta': delta, 'p_value': p_value, 'interval': (float(low), float(high)),
+            'resamples': resamples}
+
+
+def approximate_randomization(gold_labels, predicted_a, predicted_b, resamples=10000, seed=0,
+                              workers=1):
+    """F1 of a minus F1 of b and its approximate randomization p-value"""
+    import numpy as np
+    counts = pair_counts(gold_labels, predicted_a, predicted_b)
+    delta = float(f1_difference(counts.sum(axis=0)[None, :])[0])
+    differences = resample(randomization_batch, counts, resamples, seed, workers)
+    at_least = int(np.sum(np.abs(differences) >= abs(delta) - 1e-12))
+    return {'delta': delta, 'p_value': (at_least + 1.0) / (resamples + 1),
+            'resamples': resamples}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Score relation labels against gold labels")
+    parser.add_argument('gold_file')
+    parser.add_argument('output_file')
+    parser.add_argument('output_file_b', nargs='?', default=None,
+                        help="a second system's labels to compare with")
+    parser.add_argument('--reports', action='store_true',
+                        help="also write confusion_matrix.txt and prf_by_reltype.txt")
+    parser.add_argument('--bootstrap', type=int, default=10000)
+    parser.add_argument('--randomization', type=int, default=10000)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    result = evaluate_files(args.gold_file, args.output_file)
+    print_scores(result)
+    if args.reports:
+        write_reports(result)
+    if args.output_file_b is not None:
+        gold = list(read_labels(args.gold_file))
+        predicted_a = list(read_labels(args.output_file))
+        predicted_b = list(read_labels(args.output_file_b))
+        print('b: precision = {} recall = {} f1 = {}'.format(*score(gold, predicted_b)))
+        bootstrap = paired_bootstrap(gold, predicted_a, predicted_b, args.bootstrap, args.seed,
+                                     args.workers)
+        print('F1 a - b = {:.4f}; paired bootstrap p = {:.4f} ({} resamples, 95% interval '
+              '{:.4f} to {:.4f})'.format(bootstrap['delta'], bootstrap['p_value'],
+                                         bootstrap['resamples'], *bootstrap['interval']))
+        randomization = approximate_randomization(gold, predicted_a, predicted_b,
+                                                  args.randomization, args.seed, args.workers)
+        print('approximate randomization p = {:.4f} ({} shuffles)'.format(
+            randomization['p_value'], randomization['resamples']))
@@ -0,0 +1,184 @@
+"""On-disk cache of computed features per (document, feature family).
+
+An entry holds the feature strings one registered feature produced for
+each pair of one document (None for pairs a pair filter pruned so far),
+and is keyed by
+
+    the sha1 of the document's parse, tag and dparse files and pair lines
+    the sha1 of the featurizer's source: the feature function, the context
+    builders it needs, and the FeatureExtractor methods and the functions
+    and classes of the same module (SentenceContext) those call
+
+so editing one featurize_* function, or one document, only misses the
+entries it affects; every other family is read back instead of recomputed.
+Entries are files under cache_dir/<feature name>/. A hit touches its file,
+and evict() deletes the least recently used files once the cache is larger
+than max_bytes.
+
+Code a featurizer reaches only indirectly (corpus_reader, tree_index,
+dependency_graph) is not hashed: the corpus CACHE_VERSION is part of every
+key, and FEATURE_CACHE_VERSION covers anything else.
+"""
+
+import hashlib
+import inspect
+import os
+import pickle
+import re
+import sys
+
+from corpus_cache import CACHE_VERSION
+from corpus_reader import get_document_paths
+from feature_registry import CONTEXT_BUILDERS
+
+FEATURE_CACHE_VERSION = 1
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# extractor methods named in a featurizer's source
+METHOD_CALL = re.compile(r'\b(?:extractor|self)\.(\w+)')
+# plain function or class calls
+NAME_CALL = re.compile(r'(?<![\w.])([A-Za-z_]\w*)\(')
+
+
+def function_source(func):
+    try:
+        return inspect.getsource(func)
+    except (IOError, TypeError):
+        # no source file (defined interactively); fall back to the bytecode
+        code = getattr(func, '__code__', None)
+        return repr(code.co_code) if code is not None else func.__name__
+
+
+def featurizer_source_hash(feature, extractor_class):
+    """sha1 of the source of everything the feature computes with"""
+    funcs = [feature.func] + [CONTEXT_BUILDERS[name] for name in feature.needs]
+    seen = set()
+    sources = []
+    while funcs:
+        func = funcs.pop(0)
+        if func in seen:
+            continue
+        seen.add(func)
+        source = function_source(func)
+        sources.append(source)
+        for name in METHOD_CALL.findall(source):
+            method = getattr(extractor_class, name, None)
+            method = getattr(method, '__func__', method)
+            if inspect.isfunction(method):
+                funcs.append(method)
+        module = sys.modules.get(func.__module__)
+        for name in NAME_CALL.findall(source):
+            value = getattr(module, name, None)
+            if (inspect.isfunction(value) or inspect.isclass(value)) \
+                    and value.__module__ == func.__module__:
+                funcs.append(value)
+    h = hashlib.sha1()
+    for source in sources:
+        h.update(source.encode('utf-8'))
+    return h.hexdigest()
+
+
+class FeatureCache:
+    def __init__(self, cache_dir='.feature_cache', max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.source_hashes = {} # feature name -> featurizer_source_hash
+        self.hits = 0
+        self.misses = 0
+        # entries written since the last evict()
+        self.stored = 0
+
+    def document_key(self, document):
+        """sha1 of the document's source files and pairs, or None for
+        documents not read from data/ (which are not cached)"""
+        h = hashlib.sha1()
+        h.update('{}|{}|{}'.format(FEATURE_CACHE_VERSION, CACHE_VERSION, document.title).encode('utf-8'))
+        for path in get_document_paths(document.title):
+            if not os.path.exists(path):
+                return None
+            with open(path, 'rb') as f:
+                h.update(hashlib.sha1(f.read()).digest())
+        for tt in document.two_tokens:
+            h.update(' '.join(tt.split_line).encode('utf-8'))
+            h.update(b'\n')
+        return h.hexdigest()
+
+    def entry_path(self, document_key, feature, extractor_class):
+        source_hash = self.source_hashes.get(feature.name)
+        if source_hash is None:
+            source_hash = featurizer_source_hash(feature, extractor_class)
+            self.source_hashes[feature.name] = source_hash
+        key = hashlib.sha1((document_key + source_hash).encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, feature.name, key + '.pickle')
+
+    def load(self, path):
+        """Per-pair feature lists stored at path, or None on a miss"""
+        if not os.path.exists(path):
+            self.misses += 1
+            return None
+        try:
+            with open(path, 'rb') as f:
+                pair_features = pickle.load(f)
+        except (EOFError, IOError, OSError, pickle.UnpicklingError):
+            # evicted meanwhile or truncated; recompute it
+            self.misses += 1
+            return None
+        # mark it recently used for evict()
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        self.hits += 1
+        return pair_features
+
+    def store(self, path, pair_features):
+        directory = os.path.dirname(path)
+        if not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                pass # made by another worker
+        tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(pair_features, f, pickle.HIGHEST_PROTOCOL)
+        os.rename(tmp_path, path)
+        self.stored += 1
+
+    def entries(self):
+        """(mtime, size, path) of every entry"""
+        entries = []
+        if not os.path.isdir(self.cache_dir):
+            return entries
+        for family in os.listdir(self.cache_dir):
+            directory = os.path.join(self.cache_dir, family)
+            if not os.path.isdir(directory):
+                continue
+            for name in os.listdir(directory):
+                if name.endswith('.pickle'):
+                    path = os.path.join(directory, name)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue # evicted by another process meanwhile
+                    entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def evict(self):
+        """Deletes least recently used entries until the cache fits max_bytes;
+        returns how many were deleted. Only looks when entries were stored."""
+        if not self.stored:
+            return 0
+        self.stored = 0
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for mtime, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+            removed += 1
+        return removed
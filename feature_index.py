@@ -0,0 +1,160 @@
+"""Maps feature strings to integer columns and builds sparse matrices.
+
+Two indexers share one interface (index(feature) -> column or None):
+
+    FeatureVocabulary  stable string -> id table, grown on training data
+                       and then frozen so dev/test features it never saw
+                       are dropped
+    FeatureHasher      hashing trick into a fixed number of columns; needs
+                       no fitting and is safe to use from several processes
+
+Featurized corpora are saved as a CSR matrix plus a label vector in .npz
+files; export_mallet_text writes the same data in the line format Mallet's
+import-file reads. Indexers save into model files with to_arrays()
+(compact=True keeps a vocabulary's names as one utf-8 string) and are
+rebuilt with indexer_from_arrays().
+"""
+
+from array import array
+import zlib
+
+import numpy as np
+import scipy.sparse
+
+
+class FeatureVocabulary:
+    def __init__(self, names=None):
+        self.names = list(names) if names is not None else []
+        self.ids = dict((name, i) for i, name in enumerate(self.names))
+        self.frozen = names is not None
+
+    def __len__(self):
+        return len(self.names)
+
+    @property
+    def n_columns(self):
+        return len(self.names)
+
+    def index(self, feature):
+        column = self.ids.get(feature)
+        if column is None and not self.frozen:
+            column = len(self.names)
+            self.ids[feature] = column
+            self.names.append(feature)
+        return column
+
+    def freeze(self):
+        self.frozen = True
+        return self
+
+    def name(self, column):
+        return self.names[column]
+
+    def to_arrays(self, compact=False):
+        if compact:
+            # one utf-8 string instead of a fixed width unicode array
+            text = '\n'.join(self.names).encode('utf-8')
+            return {'feature_text': np.frombuffer(text, dtype=np.uint8)}
+        return {'features': np.array(self.names)}
+
+
+class FeatureHasher:
+    def __init__(self, dimension=2**20):
+        self.dimension = dimension
+        self.frozen = True
+
+    def __len__(self):
+        return self.dimension
+
+    @property
+    def n_columns(self):
+        return self.dimension
+
+    def index(self, feature):
+        # crc32 rather than hash(), which is salted per process
+        return zlib.crc32(feature.encode('utf-8')) % self.dimension
+
+    def freeze(self):
+        return self
+
+    def name(self, column):
+        return 'hash{}'.format(column)
+
+    def to_arrays(self, compact=False):
+        return {'hashing_dimension': np.array(self.dimension)}
+
+
+def indexer_from_arrays(arrays):
+    """Rebuilds the indexer saved by to_arrays() (e.g. from a model .npz)"""
+    if 'hashing_dimension' in arrays:
+        return FeatureHasher(int(arrays['hashing_dimension']))
+    if 'feature_text' in arrays:
+        text = arrays['feature_text'].tobytes().decode('utf-8')
+        return FeatureVocabulary(text.split('\n') if text else [])
+    return FeatureVocabulary([str(name) for name in arrays['features']])
+
+
+class MatrixBuilder:
+    """Accumulates rows of column ids into CSR arrays"""
+    def __init__(self):
+        self.indptr = array('i', [0])
+        self.indices = array('i')
+
+    def add_row(self, columns):
+        self.indices.extend(columns)
+        self.indptr.append(len(self.indices))
+
+    def add_features(self, features, indexer):
+        for feature in features:
+            column = indexer.index(feature)
+            if column is not None:
+                self.indices.append(column)
+        self.indptr.append(len(self.indices))
+
+    def to_csr(self, n_columns):
+        indices = np.array(self.indices, dtype=np.int32)
+        indptr = np.array(self.indptr, dtype=np.int32)
+        data = np.ones(len(indices), dtype=np.float64)
+        matrix = scipy.sparse.csr_matrix((data, indices, indptr),
+                                         shape=(len(indptr) - 1, n_columns))
+        # repeated features count more than once, as in Mallet's feature vectors
+        matrix.sum_duplicates()
+        return matrix
+
+
+def feature_lists_to_matrix(feature_lists, indexer):
+    builder = MatrixBuilder()
+    for features in feature_lists:
+        builder.add_features(features, indexer)
+    return builder.to_csr(indexer.n_columns)
+
+
+def save_npz(path, X, labels, names=None):
+    """Saves a featurized corpus: CSR matrix, label vector and pair names"""
+    X = scipy.sparse.csr_matrix(X)
+    np.savez_compressed(path, data=X.data, indices=X.indices, indptr=X.indptr,
+                        shape=np.array(X.shape), labels=np.array(labels),
+                        names=np.array(names if names is not None else []))
+
+
+def load_npz(path):
+    """(X, labels, names) as written by save_npz"""
+    archive = np.load(path)
+    X = scipy.sparse.csr_matrix((archive['data'], archive['indices'], archive['indptr']),
+                                shape=tuple(archive['shape']))
+    return X, [str(l) for l in archive['labels']], [str(n) for n in archive['names']]
+
+
+def export_mallet_text(path, X, indexer, names, labels=None):
+    """Writes 'name [label] feature ...' lines, repeating counted features"""
+    X = scipy.sparse.csr_matrix(X)
+    with open(path, 'w') as f:
+        for row in range(X.shape[0]):
+            start, end = X.indptr[row], X.indptr[row+1]
+            features = []
+            for column, count in zip(X.indices[start:end], X.data[start:end]):
+                features.extend([indexer.name(column)] * int(count))
+            if labels is not None:
+                f.write('{} {} {}\n'.format(names[row], labels[row], ' '.join(features)))
+            else:
+                f.write('{} {}\n'.format(names[row], ' '.join(features)))
@@ -0,0 +1,67 @@
+"""Registry of pair feature functions.
+
+A feature function takes (two_tokens, context) and returns the list of
+feature strings for that pair. It is registered under a name together with
+the shared per-pair context it reads, e.g.
+
+    @register_feature('bigrams', needs=('in_between',))
+    def bigrams(tt, context): ...
+
+FeatureExtractor.featurize builds each needed context value once per pair
+(CONTEXT_BUILDERS) and runs every selected feature over it in one pass.
+"""
+
+from collections import OrderedDict
+
+# name -> Feature, in registration order
+FEATURES = OrderedDict()
+
+# context name -> function(extractor, document, two_tokens) computing it
+CONTEXT_BUILDERS = OrderedDict()
+
+
+class Feature:
+    def __init__(self, name, func, needs):
+        self.name = name
+        self.func = func
+        self.needs = needs
+
+    def __repr__(self):
+        return 'Feature({!r}, needs={!r})'.format(self.name, self.needs)
+
+
+def register_feature(name, needs=()):
+    def decorator(func):
+        for context_name in needs:
+            if context_name not in CONTEXT_BUILDERS:
+                raise ValueError("feature {} needs unknown context {}".format(name, context_name))
+        FEATURES[name] = Feature(name, func, tuple(needs))
+        return func
+    return decorator
+
+
+def register_context(name):
+    def decorator(func):
+        CONTEXT_BUILDERS[name] = func
+        return func
+    return decorator
+
+
+def get_features(names):
+    """Features for a list of names or a comma separated string of them"""
+    if isinstance(names, str):
+        names = [name.strip() for name in names.split(',') if name.strip()]
+    unknown = [name for name in names if name not in FEATURES]
+    if unknown:
+        raise ValueError("unknown features: {} (known: {})".format(
+            ', '.join(unknown), ', '.join(FEATURES)))
+    return [FEATURES[name] for name in names]
+
+
+def needed_contexts(features):
+    needs = []
+    for feature in features:
+        for context_name in feature.needs:
+            if context_name not in needs:
+                needs.append(context_name)
+    return needs
@@ -0,0 +1,266 @@
+"""Frequency and relevance based feature selection for the training matrix.
+
+usage: python feature_selection.py [--train rel-trainset.gold] [--test rel-devset.gold]
+                                   [--min-counts 1,2,3,5] [--top-k 20000,50000]
+                                   [--family-top-k 2000] [--scores count,chi2,ig]
+                                   [--iterations 500] [--json out.json]
+
+Feature families like both_token__, bigram__ and inbetweenwords__ emit a long
+tail of features seen in one training pair only, each a column of the
+vocabulary and a row of the model's weights. FeatureSelector sits between
+featurizing the training file and fitting the model:
+
+    selector = FeatureSelector(min_count=2, top_k=50000, score='chi2')
+    columns = selector.fit(X, y, vocabulary)
+    X, vocabulary = X[:, columns], selector.vocabulary
+
+Training pairs per feature come from one bincount over the training matrix's
+column ids (the matrix is built a pair at a time), so no second pass over the
+feature strings is made. Features seen in fewer than min_count pairs are
+dropped, then the rest are ranked by score
+
+    count  pairs the feature occurs in
+    chi2   largest chi-square statistic of feature presence against any one
+           relation type (one vs rest 2x2 table)
+    ig     information gain of feature presence about the relation type
+
+and the best top_k are kept, or the best family_top_k of every feature family
+(the prefix up to '__', see instrumentation.feature_family). The selected
+vocabulary is frozen, so dev and test pairs featurized through it never get
+the dropped columns.
+
+Run as a script, it featurizes train and dev once, then for every setting
+trains a MaxEntModel on the selected columns and prints vocabulary size,
+training time, model bytes (full and compact, see MaxEntModel.save) and dev
+F1, the unselected vocabulary first.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import scipy.sparse
+
+from evaluation import score
+from feature_index import FeatureVocabulary
+from instrumentation import feature_family
+
+SCORES = ('count', 'chi2', 'ig')
+
+
+def presence(X):
+    """X with every stored count set to 1"""
+    X = scipy.sparse.csr_matrix(X, copy=True)
+    X.data[:] = 1.0
+    return X
+
+
+def column_counts(X):
+    """Training pairs each column occurs in"""
+    X = scipy.sparse.csr_matrix(X)
+    X.sum_duplicates()
+    return np.bincount(X.indices, minlength=X.shape[1])
+
+
+def label_counts(X, y):
+    """(pairs with the feature per label (n_features, n_labels), pairs per label)"""
+    labels = sorted(set(y))
+    label_ids = dict((label, i) for i, label in enumerate(labels))
+    rows = np.array([label_ids[label] for label in y])
+    Y = scipy.sparse.csr_matrix((np.ones(len(rows)), (np.arange(len(rows)), rows)),
+                                shape=(len(rows), len(labels)))
+    A = np.asarray(presence(X).T.dot(Y).todense())
+    return A, np.bincount(rows, minlength=len(labels)).astype(np.float64)
+
+
+def chi_square(X, y):
+    """Per column: the largest one vs rest chi-square over the labels"""
+    A, class_totals = label_counts(X, y)
+    n = float(X.shape[0])
+    with_feature = A.sum(axis=1, keepdims=True)
+    B = with_feature - A # feature, other label
+    C = class_totals - A # label, no feature
+    D = n - with_feature - C # neither
+    denominator = with_feature * (n - with_feature) * class_totals * (n - class_totals)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        chi2 = np.where(denominator > 0, n * (A * D - B * C) ** 2 / denominator, 0.0)
+    return chi2.max(axis=1) if chi2.shape[1] else np.zeros(X.shape[1])
+
+
+def entropy(counts):
+    """Entropy in bits of every row of label counts"""
+    totals = counts.sum(axis=1, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        p = np.where(totals > 0, counts / np.maximum(totals, 1e-300), 0.0)
+        return -np.where(p > 0, p * np.log2(np.where(p > 0, p, 1.0)), 0.0).sum(axis=1)
+
+
+def information_gain(X, y):
+    """Per column: H(label) - H(label | feature present or not)"""
+    A, class_totals = label_counts(X, y)
+    n = float(X.shape[0])
+    with_feature = A.sum(axis=1)
+    conditional = (with_feature * entropy(A) +
+                   (n - with_feature) * entropy(class_totals - A)) / n
+    return entropy(class_totals[None, :])[0] - conditional
+
+
+class FeatureSelector:
+    def __init__(self, min_count=1, top_k=None, family_top_k=None, score='count'):
+        if score not in SCORES:
+            raise ValueError("unknown feature score: " + score)
+        self.min_count = min_count
+        self.top_k = top_k
+        self.family_top_k = family_top_k
+        self.score = score
+        self.columns = None # selected columns of the training matrix, ascending
+        self.vocabulary = None # frozen FeatureVocabulary of the selected features
+
+    def describe(self):
+        parts = ['min_count={}'.format(self.min_count)]
+        if self.top_k:
+            parts.append('top_k={}'.format(self.top_k))
+        if self.family_top_k:
+            parts.append('family_top_k={}'.format(self.family_top_k))
+        if self.top_k or self.family_top_k:
+            parts.append(self.score)
+        return ' '.join(parts)
+
+    def scores(self, X, y, counts):
+        if self.score == 'chi2':
+            return chi_square(X, y)
+        if self.score == 'ig':
+            return information_gain(X, y)
+        return counts.astype(np.float64)
+
+    def fit(self, X, y, vocabulary):
+        """Selects columns of the training matrix X (labels y) whose names
+        are in vocabulary; returns the selected columns"""
+        if not isinstance(vocabulary, FeatureVocabulary):
+            raise ValueError("feature selection needs a FeatureVocabulary, not hashed features")
+        counts = column_counts(X)
+        candidates = np.flatnonzero(counts >= self.min_count)
+        if self.top_k or self.family_top_k:
+            scores = self.scores(X, y, counts)[candidates]
+            # best first, ties broken by the more frequent then the earlier feature
+            order = np.lexsort((candidates, -counts[candidates], -scores))
+            ranked = candidates[order]
+            if self.family_top_k:
+                kept_per_family = {}
+                keep = []
+                for column in ranked:
+                    family = feature_family(vocabulary.name(column), '')
+                    kept = kept_per_family.get(family, 0)
+                    if kept < self.family_top_k:
+                        kept_per_family[family] = kept + 1
+                        keep.append(column)
+                ranked = np.array(keep, dtype=np.int64)
+            if self.top_k:
+                ranked = ranked[:self.top_k]
+            candidates = np.sort(ranked)
+        self.columns = candidates
+        self.vocabulary = FeatureVocabulary([vocabulary.name(column) for column in candidates])
+        return self.columns
+
+    def transform(self, X):
+        """The selected columns of a matrix built with the fit vocabulary"""
+        return scipy.sparse.csr_matrix(X)[:, self.columns]
+
+    def select_instances(self, instances):
+        """Drops the unselected features from the feature lists of RelInstances"""
+        ids = self.vocabulary.ids
+        for instance in instances:
+            instance.features = [feature for feature in instance.features if feature in ids]
+
+
+def model_bytes(model, directory, vocabulary, compact):
+    path = os.path.join(directory, 'compact.npz' if compact else 'full.npz')
+    model.save(path, compact=compact, **vocabulary.to_arrays(compact=compact))
+    return os.path.getsize(path)
+
+
+def run_setting(selector, X_train, y_train, X_test, y_test, vocabulary, iterations, directory):
+    from maxent import MaxEntModel
+    start = time.time()
+    if selector is not None:
+        selector.fit(X_train, y_train, vocabulary)
+        X_train, selected = selector.transform(X_train), selector.vocabulary
+        X_test = selector.transform(X_test)
+    else:
+        selected = vocabulary
+    select_seconds = time.time() - start
+    start = time.time()
+    model = MaxEntModel(max_iterations=iterations).train(X_train, y_train)
+    train_seconds = time.time() - start
+    start = time.time()
+    predictions = model.predict(X_test)
+    test_seconds = time.time() - start
+    result = {'setting': selector.describe() if selector is not None else 'all',
+              'features': selected.n_columns, 'select_seconds': select_seconds,
+              'train_seconds': train_seconds, 'test_seconds': test_seconds,
+              'model_bytes': model_bytes(model, directory, selected, False),
+              'compact_bytes': model_bytes(model, directory, selected, True)}
+    result['precision'], result['recall'], result['f1'] = [
+        float(value) for value in score(y_test, predictions)]
+    return result
+
+
+def print_table(results):
+    print('{:<36} {:>9} {:>8} {:>8} {:>11} {:>11} {:>7}'.format(
+        'setting', 'features', 'train s', 'test s', 'model B', 'compact B', 'dev F1'))
+    for result in results:
+        print('{:<36} {:>9} {:>8.1f} {:>8.2f} {:>11} {:>11} {:>7.4f}'.format(
+            result['setting'], result['features'], result['train_seconds'],
+            result['test_seconds'], result['model_bytes'], result['compact_bytes'],
+            result['f1']))
+
+
+def comma_list(value, convert=str):
+    return [convert(item.strip()) for item in value.split(',') if item.strip()]
+
+
+if __name__ == '__main__':
+    from relation_extractor import RelExtractor
+    parser = argparse.ArgumentParser(description="Vocabulary size, time, model size and "
+                                                 "dev F1 per feature selection setting")
+    parser.add_argument('--train', default='rel-trainset.gold')
+    parser.add_argument('--test', default='rel-devset.gold')
+    parser.add_argument('--min-counts', default='2,3,5')
+    parser.add_argument('--top-k', default='', help="comma separated top_k values")
+    parser.add_argument('--family-top-k', default='', help="comma separated family_top_k values")
+    parser.add_argument('--scores', default='count',
+                        help="rankings used with --top-k and --family-top-k")
+    parser.add_argument('--iterations', type=int, default=500)
+    parser.add_argument('--json', default=None, help="also write the results here")
+    args = parser.parse_args()
+
+    start = time.time()
+    extractor = RelExtractor(backend='numpy')
+    vocabulary = FeatureVocabulary()
+    _, X_train, y_train = extractor.featurize_matrix(args.train, True, vocabulary)
+    vocabulary.freeze()
+    _, X_test, y_test = extractor.featurize_matrix(args.test, True, vocabulary)
+    print('Featurized {} x {} and {} x {} in {:.1f}s'.format(
+        X_train.shape[0], X_train.shape[1], X_test.shape[0], X_test.shape[1], time.time() - start))
+
+    selectors = [None] + [FeatureSelector(min_count) for min_count in comma_list(args.min_counts, int)]
+    for score_name in comma_list(args.scores):
+        selectors.extend(FeatureSelector(top_k=top_k, score=score_name)
+                         for top_k in comma_list(args.top_k, int))
+        selectors.extend(FeatureSelector(family_top_k=top_k, score=score_name)
+                         for top_k in comma_list(args.family_top_k, int))
+    directory = tempfile.mkdtemp(prefix='relext-selection-')
+    try:
+        results = [run_setting(selector, X_train, y_train, X_test, y_test, vocabulary,
+                               args.iterations, directory) for selector in selectors]
+    finally:
+        shutil.rmtree(directory)
+    print('')
+    print_table(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=1)
@@ -0,0 +1,148 @@
+"""Opt-in timing and feature counting for the reader, featurizers and extractor.
+
+Off unless the RELEXT_PROFILE environment variable is set or enable() is
+called (relation_extractor.py --profile):
+
+    RELEXT_PROFILE=1          record stages and feature counts and print a
+                              summary table to stderr when the process exits
+    RELEXT_PROFILE=out.prof   also run cProfile over the whole run and dump
+                              its stats to out.prof (pstats format, readable
+                              by snakeviz, gprof2dot or flameprof)
+
+Code marks a stage with
+
+    with instrumentation.stage('corpus/read_parses', instances=1):
+        ...
+
+which records calls, wall and CPU seconds and instances processed. Stage
+times are inclusive, so nested stages are also counted in their parents.
+While off, stage() hands back one shared do-nothing context manager and
+callers test the module level `enabled` flag before doing any extra work.
+"""
+
+import atexit
+import cProfile
+from collections import OrderedDict
+import os
+import sys
+import time
+
+cpu_time = getattr(time, 'process_time', None) or time.clock
+
+enabled = False
+profiler = None
+profile_path = None
+
+# stage name -> [calls, wall seconds, cpu seconds, instances]
+STAGES = OrderedDict()
+# registry feature or context name -> [pairs, features emitted, seconds]
+FEATURES = OrderedDict()
+# feature string prefix ('bigram__', 'inbetweenwords__', ...) -> features emitted
+FAMILIES = OrderedDict()
+
+
+class NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def add(self, instances):
+        pass
+
+NULL_STAGE = NullStage()
+
+
+class Stage:
+    def __init__(self, name, instances=0):
+        self.name = name
+        self.instances = instances
+
+    def __enter__(self):
+        self.start_wall = time.time()
+        self.start_cpu = cpu_time()
+        return self
+
+    def __exit__(self, *exc_info):
+        record = STAGES.setdefault(self.name, [0, 0.0, 0.0, 0])
+        record[0] += 1
+        record[1] += time.time() - self.start_wall
+        record[2] += cpu_time() - self.start_cpu
+        record[3] += self.instances
+        return False
+
+    def add(self, instances):
+        self.instances += instances
+
+
+def stage(name, instances=0):
+    if not enabled:
+        return NULL_STAGE
+    return Stage(name, instances)
+
+
+def feature_family(feature, default):
+    """Prefix up to the '__' separator, or default for unprefixed features"""
+    end = feature.find('__')
+    if end == -1:
+        return default
+    return feature[:end+2]
+
+
+def count_features(name, features, seconds):
+    """Records one pair's output of the registry feature (or context) name"""
+    record = FEATURES.setdefault(name, [0, 0, 0.0])
+    record[0] += 1
+    record[1] += len(features)
+    record[2] += seconds
+    for feature in features:
+        family = feature_family(feature, name)
+        FAMILIES[family] = FAMILIES.get(family, 0) + 1
+
+
+def enable(path=None):
+    """Turns recording on; with path, also profiles the rest of the run"""
+    global enabled, profiler, profile_path
+    if enabled:
+        return
+    enabled = True
+    if path:
+        profile_path = path
+        profiler = cProfile.Profile()
+        profiler.enable()
+    atexit.register(report)
+
+
+def reset():
+    STAGES.clear()
+    FEATURES.clear()
+    FAMILIES.clear()
+
+
+def report(out=None):
+    """Prints the summary tables and dumps the cProfile stats, if any"""
+    out = out or sys.stderr
+    if profiler is not None:
+        profiler.disable()
+        profiler.dump_stats(profile_path)
+        out.write('cProfile stats written to {}\n'.format(profile_path))
+    if STAGES:
+        out.write('\n{:<40}{:>8}{:>10}{:>10}{:>12}\n'.format(
+            'stage', 'calls', 'wall (s)', 'cpu (s)', 'instances'))
+        for name, (calls, wall, cpu, instances) in STAGES.items():
+            out.write('{:<40}{:>8}{:>10.3f}{:>10.3f}{:>12}\n'.format(
+                name, calls, wall, cpu, instances))
+    if FEATURES:
+        out.write('\n{:<40}{:>8}{:>10}{:>12}\n'.format('feature', 'pairs', 'wall (s)', 'features'))
+        for name, (pairs, emitted, seconds) in FEATURES.items():
+            out.write('{:<40}{:>8}{:>10.3f}{:>12}\n'.format(name, pairs, seconds, emitted))
+    if FAMILIES:
+        out.write('\n{:<40}{:>12}\n'.format('feature family', 'features'))
+        for family, emitted in sorted(FAMILIES.items(), key=lambda item: -item[1]):
+            out.write('{:<40}{:>12}\n'.format(family, emitted))
+
+
+if os.environ.get('RELEXT_PROFILE'):
+    setting = os.environ['RELEXT_PROFILE']
+    enable(None if setting in ('1', 'true', 'yes') else setting)
@@ -0,0 +1,136 @@
+"""Lazily loaded corpora backed by a byte-offset index of the pair file.
+
+PairFileIndex records where each document's lines sit in a rel-*.gold/.raw
+file, so one document's pairs are read with a seek instead of a scan. The
+index is saved next to a corpus cache (when one is configured) and rebuilt
+whenever the pair file's mtime or size changes.
+
+LazyCorpus is the CorpusReader.corpus of a lazy reader: documents are
+created on first lookup with only their pairs, and their parse, pos and
+dependency views are read on first access. At most max_loaded documents
+keep views in memory; the least recently used one is unloaded first.
+"""
+
+from collections import OrderedDict
+import json
+import os
+
+
+class PairFileIndex:
+    def __init__(self, filename, reading_gold_file=False, index_dir=None):
+        self.filename = filename
+        self.doc_filename_index = 1 if reading_gold_file else 0
+        # title -> list of [offset, length] runs of that document's lines
+        self.runs = OrderedDict()
+        index_path = None
+        if index_dir:
+            index_path = os.path.join(index_dir, os.path.basename(filename) + '.idx.json')
+        if not (index_path and self.load(index_path)):
+            self.build()
+            if index_path:
+                self.save(index_path)
+
+    def file_stamp(self):
+        st = os.stat(self.filename)
+        return [st.st_mtime, st.st_size, self.doc_filename_index]
+
+    def build(self):
+        self.runs = OrderedDict()
+        offset = 0
+        last_title = None
+        with open(self.filename, 'rb') as f:
+            for line in f:
+                fields = line.split()
+                if fields:
+                    title = fields[self.doc_filename_index].decode('utf-8')
+                    if title == last_title:
+                        self.runs[title][-1][1] += len(line)
+                    else:
+                        self.runs.setdefault(title, []).append([offset, len(line)])
+                        last_title = title
+                offset += len(line)
+
+    def load(self, index_path):
+        if not os.path.exists(index_path):
+            return False
+        with open(index_path) as f:
+            saved = json.load(f)
+        if saved['stamp'] != self.file_stamp():
+            return False
+        self.runs = OrderedDict((title, runs) for title, runs in saved['runs'])
+        return True
+
+    def save(self, index_path):
+        if not os.path.isdir(os.path.dirname(index_path)):
+            os.makedirs(os.path.dirname(index_path))
+        with open(index_path, 'w') as f:
+            json.dump({'stamp': self.file_stamp(), 'runs': list(self.runs.items())}, f)
+
+    def titles(self):
+        return list(self.runs)
+
+    def get_lines(self, title):
+        """The pair file lines of one document"""
+        lines = []
+        with open(self.filename, 'rb') as f:
+            for offset, length in self.runs.get(title, []):
+                f.seek(offset)
+                lines.extend(f.read(length).decode('utf-8').splitlines())
+        return lines
+
+
+class LazyCorpus(object):
+    """Read-only {title: Document} mapping over a PairFileIndex"""
+    def __init__(self, reader, index, titles, max_loaded=None):
+        self.reader = reader
+        self.index = index
+        self.titles = titles
+        self.title_set = set(titles)
+        self.max_loaded = max_loaded
+        self.documents = {}
+        # documents holding views, least recently used first
+        self.loaded = OrderedDict()
+
+    def __len__(self):
+        return len(self.titles)
+
+    def __contains__(self, title):
+        return title in self.title_set
+
+    def __iter__(self):
+        return iter(self.titles)
+
+    def keys(self):
+        return list(self.titles)
+
+    def __getitem__(self, title):
+        if title not in self:
+            raise KeyError(title)
+        doc = self.documents.get(title)
+        if doc is None:
+            doc = self.reader.create_document(title, self.reader.reading_gold_file, lazy=True)
+            for line in self.index.get_lines(title):
+                self.reader.add_two_tokens(doc, line.split(), self.reader.reading_gold_file)
+            self.documents[title] = doc
+        return doc
+
+    def get(self, title, default=None):
+        return self[title] if title in self else default
+
+    def values(self):
+        return [self[title] for title in self.titles]
+
+    def items(self):
+        return [(title, self[title]) for title in self.titles]
+
+    def document_accessed(self, doc):
+        """LRU bookkeeping, called by Document on every view access"""
+        if not doc.is_loaded():
+            return
+        if doc.title in self.loaded:
+            del self.loaded[doc.title]
+        self.loaded[doc.title] = doc
+        if self.max_loaded is not None:
+            while len(self.loaded) > self.max_loaded:
+                title, oldest = self.loaded.popitem(last=False)
+                oldest.unload()
@@ -0,0 +1,200 @@
+//a resident Mallet MaxEnt classifier driven over stdin/stdout
+//
+//Keeps one classifier, with its pipe and alphabets, loaded between
+//requests so callers pay for the JVM and the classpath once. Requests and
+//responses are utf-8 lines; the n lines of a request are read before
+//anything is answered, so a failed request never desynchronizes the stream.
+//
+//  TRAIN <n>       n lines "name label features...", as import-file reads
+//                  them; trains MaxEnt like train-classifier --trainer MaxEnt
+//  CLASSIFY <n>    n lines "name features...", as classify-file reads them
+//  LOAD <path>     a classifier written by train-classifier or SAVE
+//  SAVE <path>
+//  PING
+//  QUIT
+//
+//  -> OK <n> followed by n lines (CLASSIFY: "name\tlabel\tprob..." per line,
+//     the classify-file output), or ERROR <message>
+//
+//Anything Mallet prints goes to stderr.
+
+import cc.mallet.classify.*;
+import cc.mallet.pipe.*;
+import cc.mallet.pipe.iterator.CsvIterator;
+import cc.mallet.types.*;
+
+import java.io.*;
+import java.util.*;
+import java.util.regex.Pattern;
+
+public class MalletWorker {
+
+    //the import-file line regex RelExtractor.train_mallet passes
+    static final Pattern TRAIN_LINE = Pattern.compile("^(\\S*)[\\s]*(\\S*)[\\s]*(.*)$");
+    //the classify-file default
+    static final Pattern CLASSIFY_LINE = Pattern.compile("^(\\S*)[\\s,]*(.*)$");
+    //the import-file default
+    static final Pattern TOKEN = Pattern.compile("\\p{L}[\\p{L}\\p{P}]+\\p{L}");
+
+    protected Classifier classifier;
+    protected PrintStream out;
+
+    public MalletWorker(PrintStream out) {
+	this.out = out;
+    }
+
+    //the pipe import-file builds with its default options
+    static Pipe importPipe() {
+	ArrayList<Pipe> pipeList = new ArrayList<Pipe>();
+	pipeList.add(new Target2Label());
+	pipeList.add(new CharSequenceLowercase());
+	pipeList.add(new CharSequence2TokenSequence(TOKEN));
+	pipeList.add(new TokenSequence2FeatureSequence());
+	pipeList.add(new FeatureSequence2AugmentableFeatureVector());
+	return new SerialPipes(pipeList);
+    }
+
+    static Reader joined(List<String> lines) {
+	StringBuilder text = new StringBuilder();
+	for (String line : lines) {
+	    text.append(line).append('\n');
+	}
+	return new StringReader(text.toString());
+    }
+
+    public List<String> train(List<String> lines) {
+	InstanceList instances = new InstanceList(importPipe());
+	instances.addThruPipe(new CsvIterator(joined(lines), TRAIN_LINE, 3, 2, 1));
+	classifier = new MaxEntTrainer().train(instances);
+	return new ArrayList<String>();
+    }
+
+    public List<String> classify(List<String> lines) {
+	requireClassifier();
+	Pipe pipe = classifier.getInstancePipe();
+	//new features must not grow the alphabets past the parameters
+	pipe.getDataAlphabet().stopGrowth();
+	pipe.getTargetAlphabet().stopGrowth();
+	Iterator<Instance> iterator =
+	    pipe.newIteratorFrom(new CsvIterator(joined(lines), CLASSIFY_LINE, 2, 0, 1));
+	List<String> labeled = new ArrayList<String>();
+	while (iterator.hasNext()) {
+	    Instance instance = iterator.next();
+	    Labeling labeling = classifier.classify(instance).getLabeling();
+	    StringBuilder output = new StringBuilder();
+	    output.append(instance.getName());
+	    for (int location = 0; location < labeling.numLocations(); location++) {
+		output.append("\t" + labeling.labelAtLocation(location));
+		output.append("\t" + labeling.valueAtLocation(location));
+	    }
+	    labeled.add(output.toString());
+	}
+	return labeled;
+    }
+
+    public List<String> load(String path) throws IOException, ClassNotFoundException {
+	ObjectInputStream ois = new ObjectInputStream(new BufferedInputStream(new FileInputStream(path)));
+	try {
+	    classifier = (Classifier) ois.readObject();
+	} finally {
+	    ois.close();
+	}
+	return new ArrayList<String>();
+    }
+
+    public List<String> save(String path) throws IOException {
+	requireClassifier();
+	ObjectOutputStream oos = new ObjectOutputStream(new BufferedOutputStream(new FileOutputStream(path)));
+	try {
+	    oos.writeObject(classifier);
+	} finally {
+	    oos.close();
+	}
+	return new ArrayList<String>();
+    }
+
+    void requireClassifier() {
+	if (classifier == null) {
+	    throw new IllegalStateException("no classifier: TRAIN or LOAD first");
+	}
+    }
+
+    static List<String> readLines(BufferedReader in, int n) throws IOException {
+	List<String> lines = new ArrayList<String>(n);
+	for (int i = 0; i < n; i++) {
+	    String line = in.readLine();
+	    if (line == null) {
+		throw new EOFException("expected " + n + " lines, got " + i);
+	    }
+	    lines.add(line);
+	}
+	return lines;
+    }
+
+    List<String> handle(String command, String argument, List<String> lines) throws Exception {
+	if (command.equals("TRAIN")) {
+	    return train(lines);
+	} else if (command.equals("CLASSIFY")) {
+	    return classify(lines);
+	} else if (command.equals("LOAD")) {
+	    return load(argument);
+	} else if (command.equals("SAVE")) {
+	    return save(argument);
+	} else if (command.equals("PING")) {
+	    return new ArrayList<String>();
+	}
+	throw new IllegalArgumentException("unknown command: " + command);
+    }
+
+    void respond(List<String> lines) {
+	out.println("OK " + lines.size());
+	for (String line : lines) {
+	    out.println(line);
+	}
+	out.flush();
+    }
+
+    void fail(Throwable e) {
+	e.printStackTrace();
+	String message = e.toString().replace('\n', ' ').replace('\r', ' ');
+	out.println("ERROR " + message);
+	out.flush();
+    }
+
+    public void serve(BufferedReader in) throws IOException {
+	String request;
+	while ((request = in.readLine()) != null) {
+	    String[] parts = request.trim().split(" ", 2);
+	    String command = parts[0];
+	    String argument = parts.length > 1 ? parts[1] : "";
+	    if (command.equals("QUIT")) {
+		respond(new ArrayList<String>());
+		return;
+	    }
+	    List<String> lines = new ArrayList<String>();
+	    if (command.equals("TRAIN") || command.equals("CLASSIFY")) {
+		int n;
+		try {
+		    n = Integer.parseInt(argument);
+		} catch (NumberFormatException e) {
+		    //the line count is unknown, so the stream cannot be trusted
+		    fail(e);
+		    return;
+		}
+		lines = readLines(in, n);
+	    }
+	    try {
+		respond(handle(command, argument, lines));
+	    } catch (Throwable e) {
+		fail(e);
+	    }
+	}
+    }
+
+    public static void main(String[] args) throws IOException {
+	PrintStream protocol = new PrintStream(new FileOutputStream(FileDescriptor.out), false, "UTF-8");
+	System.setOut(System.err);
+	BufferedReader in = new BufferedReader(new InputStreamReader(System.in, "UTF-8"));
+	new MalletWorker(protocol).serve(in);
+    }
+}
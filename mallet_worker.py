@@ -0,0 +1,127 @@
+"""A resident Mallet MaxEnt classifier driven over a pipe.
+
+Every Mallet1/bin/mallet call boots a JVM, loads the classpath and reads
+its data from files, and RelExtractor's train and test take three of
+them. MalletWorker starts mallet_maxent/classifier/src/MalletWorker.java
+once and keeps the trained or loaded classifier, with its pipe and
+alphabets, inside that JVM; batches of feature lines go in on its stdin
+and the labelings come back on its stdout. Each request is a command line
+followed by its lines, each response "OK <n>" followed by n lines or
+"ERROR <message>" (see the Java source for the commands).
+
+Like bin/mallet, the worker needs Mallet compiled into Mallet1/class
+(make -C Mallet1); build() compiles MalletWorker.java itself.
+
+    with MalletWorker() as worker:
+        worker.train(training_lines)        # "name label features..."
+        worker.save('relext_model')
+        labeled = worker.classify(lines)    # "name features..." -> classify-file lines
+"""
+
+import os
+import subprocess
+
+MALLET_DIR = 'Mallet1'
+WORKER_DIR = os.path.join('mallet_maxent', 'classifier')
+WORKER_SOURCE = os.path.join(WORKER_DIR, 'src', 'MalletWorker.java')
+WORKER_CLASS = os.path.join(WORKER_DIR, 'classes', 'MalletWorker.class')
+
+
+class MalletError(Exception):
+    """A request the worker answered with ERROR, or a worker that died"""
+
+
+def classpath():
+    return os.pathsep.join([os.path.join(MALLET_DIR, 'class'),
+                            os.path.join(MALLET_DIR, 'lib', 'mallet-deps.jar'),
+                            os.path.join(WORKER_DIR, 'classes')])
+
+
+def build(javac='javac'):
+    """Compiles MalletWorker.java when its class is missing or older"""
+    if os.path.exists(WORKER_CLASS) and \
+            os.path.getmtime(WORKER_CLASS) >= os.path.getmtime(WORKER_SOURCE):
+        return
+    subprocess.check_call([javac, '-cp', classpath(), '-d', os.path.join(WORKER_DIR, 'classes'),
+                           WORKER_SOURCE])
+
+
+class MalletWorker(object):
+    def __init__(self, java='java', max_memory='1g'):
+        self.java = java
+        self.max_memory = max_memory
+        self.process = None
+        # whether the running JVM holds a trained or loaded classifier
+        self.has_classifier = False
+
+    def start(self):
+        """Starts the JVM unless it is already running; requests start it too"""
+        if self.process is not None and self.process.poll() is None:
+            return
+        build()
+        # stderr is left to the caller's terminal, for Mallet's progress and stack traces
+        self.process = subprocess.Popen([self.java, '-Xmx' + self.max_memory, '-cp', classpath(),
+                                         'MalletWorker'],
+                                        stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        self.has_classifier = False
+
+    def request(self, command, lines=()):
+        """Sends one request and returns the lines of its OK response"""
+        self.start()
+        message = [command]
+        message.extend(line.rstrip('\n') for line in lines)
+        try:
+            self.process.stdin.write(('\n'.join(message) + '\n').encode('utf-8'))
+            self.process.stdin.flush()
+            response = self.process.stdout.readline().decode('utf-8')
+        except (IOError, OSError):
+            response = ''
+        if not response:
+            # a dead worker is not reused; the next request starts a new one
+            code = self.process.wait()
+            self.process = None
+            self.has_classifier = False
+            raise MalletError('worker exited with code {} during {}'.format(code, command.split()[0]))
+        status, _, value = response.rstrip('\n').partition(' ')
+        if status == 'ERROR':
+            raise MalletError(value)
+        return [self.process.stdout.readline().decode('utf-8').rstrip('\n')
+                for _ in range(int(value))]
+
+    def train(self, lines):
+        """Trains MaxEnt on "name label features..." lines, as train-classifier"""
+        lines = list(lines)
+        self.request('TRAIN {}'.format(len(lines)), lines)
+        self.has_classifier = True
+
+    def classify(self, lines):
+        """classify-file output, "name\\tlabel\\tprob...", of "name features..." lines"""
+        lines = list(lines)
+        return self.request('CLASSIFY {}'.format(len(lines)), lines)
+
+    def load(self, path):
+        self.request('LOAD ' + os.path.abspath(path))
+        self.has_classifier = True
+
+    def save(self, path):
+        self.request('SAVE ' + os.path.abspath(path))
+
+    def close(self):
+        if self.process is None:
+            return
+        if self.process.poll() is None:
+            try:
+                self.request('QUIT')
+            except MalletError:
+                pass
+        if self.process is not None:
+            self.process.stdin.close()
+            self.process.stdout.close()
+            self.process.wait()
+            self.process = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,90 @@
+"""Multinomial logistic regression (MaxEnt) over sparse feature matrices.
+
+An in-process alternative to training and classifying with Mallet: the
+model is fit with L-BFGS on a scipy CSR matrix with a Gaussian prior on the
+weights (Mallet's MaxEnt default, variance 1.0), predicts probability
+arrays directly and saves to a compressed .npz file (half precision weights
+with compact=True). Feature matrices come from feature_index.
+"""
+
+import numpy as np
+import scipy.optimize
+import scipy.sparse
+
+
+def log_softmax(scores):
+    scores = scores - scores.max(axis=1, keepdims=True)
+    return scores - np.log(np.exp(scores).sum(axis=1, keepdims=True))
+
+
+class MaxEntModel:
+    def __init__(self, gaussian_prior_variance=1.0, max_iterations=500):
+        self.gaussian_prior_variance = gaussian_prior_variance
+        self.max_iterations = max_iterations
+        self.labels = []
+        self.weights = None # (n_features, n_labels)
+        self.bias = None # (n_labels,)
+
+    def train(self, X, y):
+        """X is an (n_instances, n_features) sparse matrix, y a list of label strings"""
+        self.labels = sorted(set(y))
+        label_ids = dict((label, i) for i, label in enumerate(self.labels))
+        y_ids = np.array([label_ids[label] for label in y])
+        X = scipy.sparse.csr_matrix(X, dtype=np.float64)
+        n_features = X.shape[1]
+        n_labels = len(self.labels)
+        Y = np.zeros((X.shape[0], n_labels))
+        Y[np.arange(X.shape[0]), y_ids] = 1.0
+        Xt = X.T.tocsr()
+        precision = 1.0 / self.gaussian_prior_variance
+
+        def objective(params):
+            W = params[:n_features * n_labels].reshape(n_features, n_labels)
+            b = params[n_features * n_labels:]
+            log_p = log_softmax(X.dot(W) + b)
+            loss = -(log_p * Y).sum() + 0.5 * precision * params.dot(params)
+            diff = np.exp(log_p) - Y
+            grad_W = Xt.dot(diff) + precision * W
+            grad_b = diff.sum(axis=0) + precision * b
+            return loss, np.concatenate([grad_W.ravel(), grad_b])
+
+        start = np.zeros(n_features * n_labels + n_labels)
+        result = scipy.optimize.minimize(objective, start, jac=True, method='L-BFGS-B',
+                                         options={'maxiter': self.max_iterations})
+        params = result.x
+        self.weights = params[:n_features * n_labels].reshape(n_features, n_labels)
+        self.bias = params[n_features * n_labels:]
+        self.iterations = result.nit
+        return self
+
+    def predict_proba(self, X):
+        """(n_instances, n_labels) probabilities, columns in self.labels order"""
+        X = scipy.sparse.csr_matrix(X, dtype=np.float64)
+        if X.shape[1] < self.weights.shape[0]:
+            X = scipy.sparse.csr_matrix((X.data, X.indices, X.indptr),
+                                        shape=(X.shape[0], self.weights.shape[0]))
+        return np.exp(log_softmax(X.dot(self.weights) + self.bias))
+
+    def predict(self, X):
+        probabilities = self.predict_proba(X)
+        return [self.labels[i] for i in probabilities.argmax(axis=1)]
+
+    def save(self, path, compact=False, **arrays):
+        """Writes weights (float32, or float16 when compact) and labels, plus
+        any extra named arrays"""
+        dtype = np.float16 if compact else np.float32
+        np.savez_compressed(path, weights=self.weights.astype(dtype),
+                            bias=self.bias.astype(dtype),
+                            labels=np.array(self.labels),
+                            gaussian_prior_variance=self.gaussian_prior_variance,
+                            **arrays)
+
+    @classmethod
+    def load(cls, path):
+        """Returns (model, npz archive) so callers can read their extra arrays"""
+        archive = np.load(path)
+        model = cls(gaussian_prior_variance=float(archive['gaussian_prior_variance']))
+        model.weights = archive['weights'].astype(np.float64)
+        model.bias = archive['bias'].astype(np.float64)
+        model.labels = [str(label) for label in archive['labels']]
+        return model, archive
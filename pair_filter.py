@@ -0,0 +1,152 @@
+"""Rejects candidate pairs from cheap signals before they are featurized.
+
+Nearly every pair in the rel-* files is no_rel. A PairFilter fit on the
+training pairs labels the ones it is confident about no_rel directly, so
+only the survivors pay for the feature set and the classifier. The signals
+all come from the pair file line, except the opt-in dependency rule:
+
+    cross_sentence  the entities are in different sentences, and no
+                    training relation ever was
+    entity_types    a combination of entity types that was never related
+                    in at least min_support training pairs
+    distance        more tokens between the entities than any training
+                    relation had
+    rate            a tiny model: the relation rate of the pair's (entity
+                    types, distance bucket) cell in training is at most
+                    max_relation_rate, over at least min_support pairs
+    dependency      (dependency=True) no dependency path joins the heads;
+                    needs the document's dparse
+
+    pair_filter = PairFilter().fit_pair_file('rel-trainset.gold')
+    fe = FeatureExtractor('rel-devset.gold', True, pair_filter=pair_filter)
+"""
+
+import json
+
+from corpus_reader import CorpusReader, TwoTokens
+from dependency_graph import NO_NODE
+
+NO_REL = 'no_rel'
+# tokens between the entities -> bucket of the rate table
+DISTANCE_BUCKETS = (0, 1, 2, 3, 4, 5, 6, 7, 8, 12, 20)
+
+
+def pair_distance(two_tokens):
+    return two_tokens.begin_token2 - two_tokens.end_token1
+
+
+def distance_bucket(distance):
+    bucket = DISTANCE_BUCKETS[0]
+    for start in DISTANCE_BUCKETS:
+        if distance < start:
+            break
+        bucket = start
+    return bucket
+
+
+class PairFilter:
+    def __init__(self, max_relation_rate=0.005, min_support=20, max_distance=None,
+                 dependency=False):
+        # max_distance: None fits it to the training relations
+        self.max_relation_rate = max_relation_rate
+        self.min_support = min_support
+        self.max_distance = max_distance
+        self.dependency = dependency
+        self.cross_sentence_relations = 0
+        # 'type1 type2' -> [pairs, relations]
+        self.type_counts = {}
+        # 'type1 type2 bucket' -> [pairs, relations]
+        self.cell_counts = {}
+
+    def fit(self, pairs):
+        """Counts the signals over gold TwoTokens"""
+        relation_distance = 0
+        for tt in pairs:
+            related = tt.tag != NO_REL
+            if tt.sent_offset1 != tt.sent_offset2:
+                self.cross_sentence_relations += related
+                continue
+            distance = pair_distance(tt)
+            if related:
+                relation_distance = max(relation_distance, distance)
+            types = tt.entity_type1 + ' ' + tt.entity_type2
+            for counts, key in ((self.type_counts, types),
+                                (self.cell_counts, '{} {}'.format(types, distance_bucket(distance)))):
+                record = counts.setdefault(key, [0, 0])
+                record[0] += 1
+                record[1] += related
+        if self.max_distance is None:
+            self.max_distance = relation_distance
+        return self
+
+    def fit_pair_file(self, pair_file):
+        """Fits on a gold pair file's lines, without reading any document"""
+        reader = CorpusReader(pair_file, True, streaming=True)
+        return self.fit(TwoTokens(line_split, True) for line_split in reader.iter_pair_lines())
+
+    def reject_reason(self, two_tokens):
+        """Name of the rule rejecting the pair, None when it survives"""
+        if two_tokens.sent_offset1 != two_tokens.sent_offset2:
+            if not self.cross_sentence_relations:
+                return 'cross_sentence'
+            return None
+        types = two_tokens.entity_type1 + ' ' + two_tokens.entity_type2
+        pairs, relations = self.type_counts.get(types, (0, 0))
+        if pairs >= self.min_support and not relations:
+            return 'entity_types'
+        distance = pair_distance(two_tokens)
+        if distance > self.max_distance:
+            return 'distance'
+        pairs, relations = self.cell_counts.get('{} {}'.format(types, distance_bucket(distance)),
+                                                (0, 0))
+        if pairs >= self.min_support and relations <= self.max_relation_rate * pairs:
+            return 'rate'
+        if self.dependency:
+            graph, node1, node2 = two_tokens.dependency_nodes()
+            if graph is not None and node1 != NO_NODE and node2 != NO_NODE \
+                    and graph.path(node1, node2) is None:
+                return 'dependency'
+        return None
+
+    def to_dict(self):
+        return {'max_relation_rate': self.max_relation_rate, 'min_support': self.min_support,
+                'max_distance': self.max_distance, 'dependency': self.dependency,
+                'cross_sentence_relations': self.cross_sentence_relations,
+                'type_counts': self.type_counts, 'cell_counts': self.cell_counts}
+
+    @classmethod
+    def from_dict(cls, values):
+        pair_filter = cls(values['max_relation_rate'], values['min_support'],
+                          values['max_distance'], values['dependency'])
+        pair_filter.cross_sentence_relations = values['cross_sentence_relations']
+        pair_filter.type_counts = values['type_counts']
+        pair_filter.cell_counts = values['cell_counts']
+        return pair_filter
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+
+def prune_summary(instances):
+    """How many RelInstances the filter pruned, by rule, and how many gold
+    relations went with them"""
+    pruned = {}
+    pairs = relations = relations_pruned = 0
+    for instance in instances:
+        related = instance.relType not in ('', NO_REL)
+        pairs += 1
+        relations += related
+        if instance.pruned is not None:
+            pruned[instance.pruned] = pruned.get(instance.pruned, 0) + 1
+            relations_pruned += related
+    text = 'Pruned {} of {} pairs ({})'.format(sum(pruned.values()), pairs, ', '.join(
+        '{} {}'.format(rule, count) for rule, count in sorted(pruned.items())))
+    if relations:
+        text += ', losing {} of {} gold relations'.format(relations_pruned, relations)
+    return text
@@ -0,0 +1,207 @@
+"""Columnar, memory-mapped store of a rel-*.gold/.raw pair file.
+
+compile_pair_store turns a pair file into a directory of .npy columns, one
+per TwoTokens field:
+
+    sent_offset1, begin_token1, ...   int32 arrays
+    doc_num, token1, entity_type1 ... int32 codes into one shared string
+                                      table (strings.json)
+    full_tag                          gold files only
+
+PairStore maps the columns back read-only (np.load(mmap_mode='r')), so
+opening a store reads no pair data. Selections are vectorized and return
+another PairStore over the chosen rows:
+
+    store = load_pair_store('rel-trainset.gold', reading_gold_file=True)
+    per_org = store.select(entity_type1='PER', entity_type2='ORG')
+    reader = CorpusReader('rel-trainset.gold', True, pair_store=per_org)
+
+load_pair_store recompiles the store when the pair file's mtime or size
+has changed since it was written.
+
+usage: python pair_store.py rel-trainset.gold [rel-devset.raw ...]
+"""
+
+from array import array
+import json
+import os
+import shutil
+import sys
+
+import numpy as np
+
+STORE_VERSION = 1
+
+INT_COLUMNS = ('sent_offset1', 'begin_token1', 'end_token1',
+               'sent_offset2', 'begin_token2', 'end_token2')
+# pair file fields after the gold tag, in line order
+LINE_COLUMNS = ('doc_num', 'sent_offset1', 'begin_token1', 'end_token1',
+                'entity_type1', 'entity_id1', 'token1', 'sent_offset2', 'begin_token2',
+                'end_token2', 'entity_type2', 'entity_id2', 'token2')
+
+
+def default_store_path(filename):
+    """filename is a path such as data/rel-trainset.gold"""
+    return filename + '.store'
+
+
+def file_stamp(filename):
+    st = os.stat(filename)
+    return [st.st_mtime, st.st_size]
+
+
+def compile_pair_store(filename, reading_gold_file=False, store_path=None):
+    """Writes the column store of a pair file; returns its path"""
+    store_path = store_path or default_store_path(filename)
+    columns = (('full_tag',) if reading_gold_file else ()) + LINE_COLUMNS
+    values = dict((name, array('i')) for name in columns)
+    string_ids = {}
+    strings = []
+    with open(filename) as f:
+        for line in f:
+            fields = line.split()
+            if not fields:
+                continue
+            for name, field in zip(columns, fields):
+                if name in INT_COLUMNS:
+                    values[name].append(int(field))
+                    continue
+                code = string_ids.get(field)
+                if code is None:
+                    code = len(strings)
+                    string_ids[field] = code
+                    strings.append(field)
+                values[name].append(code)
+    # write next to the final directory and swap it in, so readers never
+    # see a half written store
+    tmp_path = store_path + '.tmp'
+    if os.path.isdir(tmp_path):
+        shutil.rmtree(tmp_path)
+    os.makedirs(tmp_path)
+    for name in columns:
+        np.save(os.path.join(tmp_path, name + '.npy'), np.array(values[name], dtype=np.int32))
+    with open(os.path.join(tmp_path, 'strings.json'), 'w') as f:
+        json.dump(strings, f)
+    with open(os.path.join(tmp_path, 'meta.json'), 'w') as f:
+        json.dump({'version': STORE_VERSION, 'stamp': file_stamp(filename),
+                   'reading_gold_file': reading_gold_file, 'columns': list(columns),
+                   'rows': len(values['doc_num'])}, f)
+    if os.path.isdir(store_path):
+        shutil.rmtree(store_path)
+    os.rename(tmp_path, store_path)
+    return store_path
+
+
+def load_pair_store(pair_file, reading_gold_file=False, store_path=None):
+    """PairStore of data/pair_file, compiling it first when missing or stale"""
+    filename = 'data/' + pair_file
+    store_path = store_path or default_store_path(filename)
+    meta_path = os.path.join(store_path, 'meta.json')
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta['version'] == STORE_VERSION and meta['stamp'] == file_stamp(filename) \
+                and meta['reading_gold_file'] == reading_gold_file:
+            return PairStore(store_path)
+    compile_pair_store(filename, reading_gold_file, store_path)
+    return PairStore(store_path)
+
+
+class PairStore:
+    def __init__(self, store_path, rows=None, description=''):
+        # rows: selected row numbers in file order, None for all of them
+        self.store_path = store_path
+        with open(os.path.join(store_path, 'meta.json')) as f:
+            self.meta = json.load(f)
+        self.reading_gold_file = self.meta['reading_gold_file']
+        self.column_names = self.meta['columns']
+        self.rows = rows
+        # the selections that led here, e.g. for cache keys
+        self.description = description
+        self._columns = {}
+        self._strings = None
+        self._string_ids = None
+
+    def __len__(self):
+        if self.rows is None:
+            return self.meta['rows']
+        return len(self.rows)
+
+    @property
+    def strings(self):
+        if self._strings is None:
+            with open(os.path.join(self.store_path, 'strings.json')) as f:
+                self._strings = json.load(f)
+        return self._strings
+
+    def string_id(self, value):
+        """Code of a string, or -1 when it never occurs in the pair file"""
+        if self._string_ids is None:
+            self._string_ids = dict((s, i) for i, s in enumerate(self.strings))
+        return self._string_ids.get(value, -1)
+
+    def raw_column(self, name):
+        """Every row of a column as a read-only memory-mapped array"""
+        column = self._columns.get(name)
+        if column is None:
+            column = np.load(os.path.join(self.store_path, name + '.npy'), mmap_mode='r')
+            self._columns[name] = column
+        return column
+
+    def column(self, name):
+        """Values (int columns) or string codes of the selected rows"""
+        column = self.raw_column(name)
+        if self.rows is None:
+            return column
+        return column[self.rows]
+
+    def decoded(self, name):
+        """A string column as a list of strings"""
+        strings = self.strings
+        return [strings[code] for code in self.column(name).tolist()]
+
+    def select(self, **conditions):
+        """Rows whose columns equal the given values (or any of a list of
+        values), e.g. select(entity_type1='PER', entity_type2=['ORG', 'GPE'])"""
+        mask = np.ones(len(self), dtype=bool)
+        for name, wanted in sorted(conditions.items()):
+            column = self.column(name)
+            if not isinstance(wanted, (list, tuple, set)):
+                wanted = [wanted]
+            if name not in INT_COLUMNS:
+                wanted = [self.string_id(value) for value in wanted]
+            mask &= np.isin(column, np.array(list(wanted), dtype=np.int32))
+        selected = np.flatnonzero(mask)
+        rows = selected if self.rows is None else self.rows[selected]
+        description = ' '.join([self.description] + ['{}={}'.format(name, conditions[name])
+                                                     for name in sorted(conditions)]).strip()
+        store = PairStore(self.store_path, rows=rows, description=description)
+        # share the string table and mapped columns
+        store._strings = self.strings
+        store._string_ids = self._string_ids
+        store._columns = self._columns
+        return store
+
+    def doc_titles(self):
+        """Documents of the selected rows, in order of first appearance"""
+        codes = self.column('doc_num')
+        unique, first = np.unique(codes, return_index=True)
+        strings = self.strings
+        return [strings[code] for code in unique[np.argsort(first)].tolist()]
+
+    def iter_split_lines(self):
+        """Pair file fields of each selected row, as line.split() gives them"""
+        fields = []
+        for name in self.column_names:
+            if name in INT_COLUMNS:
+                fields.append([str(value) for value in self.column(name).tolist()])
+            else:
+                fields.append(self.decoded(name))
+        return (list(row) for row in zip(*fields))
+
+
+if __name__ == '__main__':
+    for pair_file in sys.argv[1:]:
+        store = load_pair_store(pair_file, reading_gold_file=pair_file.endswith('.gold'))
+        print('{}: {} pairs, {} strings -> {}'.format(
+            pair_file, len(store), len(store.strings), store.store_path))
@@ -0,0 +1,55 @@
+"""Featurizes a pair file on a pool of worker processes.
+
+Documents are independent, so the pair file's documents are cut into
+shards of whole documents; each worker reads and parses its own documents
+and featurizes their pairs. Shards come back in pair file order, so the
+RelInstance list is the same as the serial FeatureExtractor run.
+"""
+
+import itertools
+import multiprocessing
+
+from corpus_reader import get_document_titles
+import relation_feature_extractor
+
+# shards per worker; more shards balance uneven documents better
+SHARDS_PER_WORKER = 4
+
+
+def featurize_shard(args):
+    corpus_file, reading_gold_file, features, doc_filenames, feature_cache, pair_filter = args
+    fe = relation_feature_extractor.FeatureExtractor(corpus_file, reading_gold_file,
+        features=features, doc_filenames=doc_filenames, feature_cache=feature_cache,
+        pair_filter=pair_filter)
+    fe.featurize()
+    return fe.rel_inst_list
+
+
+def make_shards(titles, n_shards):
+    n_shards = max(1, min(n_shards, len(titles)))
+    size, extra = divmod(len(titles), n_shards)
+    shards = []
+    start = 0
+    for i in range(n_shards):
+        end = start + size + (1 if i < extra else 0)
+        shards.append(titles[start:end])
+        start = end
+    return shards
+
+
+def featurize_parallel(corpus_file, reading_gold_file, workers, features=None,
+                       feature_cache=None, pair_filter=None):
+    """Per-document RelInstance lists for corpus_file, like FeatureExtractor.rel_inst_list"""
+    titles = get_document_titles(corpus_file, reading_gold_file)
+    shards = make_shards(titles, workers * SHARDS_PER_WORKER)
+    print("Featurizing {} documents of data/{} on {} workers...".format(
+        len(titles), corpus_file, workers))
+    pool = multiprocessing.Pool(workers)
+    try:
+        results = pool.map(featurize_shard,
+            [(corpus_file, reading_gold_file, features, shard, feature_cache, pair_filter)
+             for shard in shards], 1)
+    finally:
+        pool.close()
+        pool.join()
+    return list(itertools.chain.from_iterable(results))
@@ -0,0 +1,180 @@
+"""Array-backed reader for the bracketed parses in data/parsed-files.
+
+Each parse becomes one FlatTree: nodes are numbered in preorder and stored
+as parallel int arrays (parent, label id, first child, next sibling and the
+[start, end) span of leaves they cover) next to a flat list of leaf words.
+Label strings live once in a LabelTable shared by all trees of a reader.
+
+FlatTreeNode gives the subset of the nltk.tree.Tree interface the
+featurizers use (label(), leaves(), iterating over children), so code
+written against nltk trees keeps working; use is_tree() instead of
+isinstance(x, nltk.tree.Tree) to accept either kind.
+"""
+
+from array import array
+import re
+
+import nltk.tree
+
+TOKEN_PATTERN = re.compile(r'\(|\)|[^\s()]+')
+
+
+class LabelTable(object):
+    def __init__(self):
+        self.ids = {}
+        self.names = []
+
+    def get_id(self, name):
+        label_id = self.ids.get(name)
+        if label_id is None:
+            label_id = len(self.names)
+            self.ids[name] = label_id
+            self.names.append(name)
+        return label_id
+
+
+class FlatTree(object):
+    __slots__ = ('label_table', 'parent', 'label_ids', 'first_child',
+                 'next_sibling', 'leaf_start', 'leaf_end', 'leaves')
+
+    def __init__(self, label_table):
+        self.label_table = label_table
+        self.parent = array('i')
+        self.label_ids = array('i')
+        self.first_child = array('i')
+        self.next_sibling = array('i')
+        self.leaf_start = array('i')
+        self.leaf_end = array('i')
+        self.leaves = []
+
+    def __len__(self):
+        return len(self.parent)
+
+    def root(self):
+        return FlatTreeNode(self, 0)
+
+    def label(self, node):
+        return self.label_table.names[self.label_ids[node]]
+
+
+class FlatTreeNode(object):
+    """nltk.tree.Tree look-alike for one node of a FlatTree"""
+    __slots__ = ('tree', 'index')
+
+    def __init__(self, tree, index):
+        self.tree = tree
+        self.index = index
+
+    def label(self):
+        return self.tree.label(self.index)
+
+    def leaves(self):
+        t = self.tree
+        return t.leaves[t.leaf_start[self.index]:t.leaf_end[self.index]]
+
+    def children(self):
+        """Child nodes and leaf words in order, like list(nltk_tree)"""
+        t = self.tree
+        children = []
+        pos = t.leaf_start[self.index]
+        child = t.first_child[self.index]
+        while child != -1:
+            children.extend(t.leaves[pos:t.leaf_start[child]])
+            children.append(FlatTreeNode(t, child))
+            pos = t.leaf_end[child]
+            child = t.next_sibling[child]
+        children.extend(t.leaves[pos:t.leaf_end[self.index]])
+        return children
+
+    def __iter__(self):
+        return iter(self.children())
+
+    def __len__(self):
+        return len(self.children())
+
+    def __getitem__(self, i):
+        return self.children()[i]
+
+    def __eq__(self, other):
+        return (isinstance(other, FlatTreeNode) and other.tree is self.tree
+                and other.index == self.index)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((id(self.tree), self.index))
+
+    def to_nltk(self):
+        return nltk.tree.Tree(self.label(), [
+            child.to_nltk() if isinstance(child, FlatTreeNode) else child
+            for child in self.children()])
+
+    def __str__(self):
+        return str(self.to_nltk())
+
+    def __repr__(self):
+        return 'FlatTreeNode({!r}, {})'.format(self.label(), self.index)
+
+
+def is_tree(node):
+    return isinstance(node, (nltk.tree.Tree, FlatTreeNode))
+
+
+def read_bracketed_parse(line, label_table):
+    """Builds a FlatTree from one bracketed parse such as (S1 (NP (NN x)))"""
+    tokens = TOKEN_PATTERN.findall(line)
+    tree = FlatTree(label_table)
+    parent = tree.parent
+    first_child = tree.first_child
+    next_sibling = tree.next_sibling
+    leaf_start = tree.leaf_start
+    leaf_end = tree.leaf_end
+    leaves = tree.leaves
+    stack = []
+    # last child seen so far for each open node, to chain siblings
+    last_child = []
+    i = 0
+    n = len(tokens)
+    while i < n:
+        token = tokens[i]
+        if token == '(':
+            if i + 1 < n and tokens[i+1] != '(' and tokens[i+1] != ')':
+                name = tokens[i+1]
+                i += 2
+            else:
+                name = ''
+                i += 1
+            node = len(parent)
+            if stack:
+                parent.append(stack[-1])
+                if last_child[-1] == -1:
+                    first_child[stack[-1]] = node
+                else:
+                    next_sibling[last_child[-1]] = node
+                last_child[-1] = node
+            else:
+                if node != 0:
+                    raise ValueError("more than one tree in parse: " + line)
+                parent.append(-1)
+            tree.label_ids.append(label_table.get_id(name))
+            first_child.append(-1)
+            next_sibling.append(-1)
+            leaf_start.append(len(leaves))
+            leaf_end.append(-1)
+            stack.append(node)
+            last_child.append(-1)
+        elif token == ')':
+            if not stack:
+                raise ValueError("unbalanced parse: " + line)
+            leaf_end[stack.pop()] = len(leaves)
+            last_child.pop()
+            i += 1
+        else:
+            if not stack:
+                raise ValueError("leaf outside of tree in parse: " + line)
+            leaves.append(token)
+            i += 1
+    if stack or not len(parent):
+        raise ValueError("unbalanced parse: " + line)
+    return tree
@@ -10,71 +10,508 @@ Workflow:
 
 
 import corpus_reader
-from relation_feature_extractor import *
-import itertools, os
+import relation_feature_extractor
+from parallel_featurize import featurize_parallel
+from feature_cache import FeatureCache
+from pair_filter import NO_REL, PairFilter, prune_summary
+import instrumentation
+import itertools, subprocess, sys, time
+
+# where RelExtractor(pair_filter=True) keeps the filter it fit on the training file
+PAIR_FILTER_FILE = 'relext_pair_filter.json'
+MALLET = 'Mallet1/bin/mallet'
 
 class RelInstance(object):
+	__slots__ = ('tokens', 'relType', 'features', 'pruned')
+
 	def __init__(self, entity1, entity2, relType):
 		self.tokens = '_'.join([entity1, entity2])
-		self.relType = relType
+		self.relType = corpus_reader.intern_string(relType)
 		self.features = [] #list of feature names to be written
+		self.pruned = None # PairFilter rule that labeled the pair no_rel unfeaturized
 	def __str__(self):
 		return (entity1, entity2)
 
 class RelExtractor(object):
 
-	def __init__(self):
+	def __init__(self, cache_dir=None, features=None, workers=1, backend='mallet',
+			hashing_dimension=None, streaming=False, max_loaded_documents=None, feature_cache_dir=None,
+			pair_filter=None, mallet_worker=None, kernel_landmarks=1000, kernel_flat_features=True,
+			gram_cache_dir=None, feature_selector=None, compact_model=False):
 		self.train_instances = [] #list of RelInstance objects
 		self.test_instances = [] #list of RelInstance objects
+		self.test_gold_labels = [] # relation type of each test pair, in order
+		self.test_pruned = [] # whether the pair filter labeled each test pair no_rel
+		# featurize and write one document at a time instead of holding the
+		# whole corpus; train_instances/test_instances then stay empty
+		self.streaming = streaming
+		# when set, documents are read lazily and at most this many keep
+		# their parses in memory at once
+		self.max_loaded_documents = max_loaded_documents
+		# directory for parsed corpus snapshots, None disables the cache
+		self.cache_dir = cache_dir
+		# feature registry names to use, None for DEFAULT_FEATURES
+		self.features = features
+		# per-document, per-feature cache under feature_cache_dir, None disables it
+		self.feature_cache = FeatureCache(feature_cache_dir) if feature_cache_dir else None
+		# a pair_filter.PairFilter, or True to fit one on the training file (saved
+		# to PAIR_FILTER_FILE for later test runs); the pairs it rejects are labeled
+		# no_rel without being featurized, trained on or classified
+		self.pair_filter = pair_filter
+		# worker processes for reading and featurizing, 1 runs serially
+		self.workers = workers
+		# 'mallet' runs Mallet1/bin/mallet, 'numpy' trains maxent.MaxEntModel in process,
+		# 'kernel' trains tree_kernel.TreeKernelModel on the parse subtree of each pair
+		if backend not in ('mallet', 'numpy', 'kernel'):
+			raise ValueError("unknown backend: " + backend)
+		self.backend = backend
+		# a mallet_worker.MalletWorker, or True to start one: the mallet backend then
+		# trains and classifies in that resident JVM instead of running bin/mallet
+		if mallet_worker is True:
+			from mallet_worker import MalletWorker
+			mallet_worker = MalletWorker()
+		self.mallet_worker = mallet_worker
+		self.model = None
+		# numpy backend features -> columns: a vocabulary fit on the training
+		# data, or the hashing trick into hashing_dimension columns
+		self.hashing_dimension = hashing_dimension
+		self.indexer = None
+		# a feature_selection.FeatureSelector fit on the training features; the
+		# model and indexer then only have the features it selected
+		self.feature_selector = feature_selector
+		if feature_selector is not None and streaming and backend == 'mallet':
+			raise ValueError("feature selection needs every training pair's features before training")
+		# save numpy models with half precision weights and packed feature names
+		self.compact_model = compact_model
+		# kernel backend: Nystrom landmark trees, whether the flat features go
+		# next to the kernel features, and the GramCache directory (None disables it)
+		self.kernel_landmarks = kernel_landmarks
+		self.kernel_flat_features = kernel_flat_features
+		self.gram_cache_dir = gram_cache_dir
+		self.kernel_table = None # tree_kernel.SubtreeTable of the kernel model's trees
+		self.test_probabilities = None # (n_test, n_labels) array from the numpy and kernel backends
+		self.test_predictions = None
 
 	def featurize(self, corpus_file, rel_inst_list, reading_gold_file):
 		"""Creates RelInstance objects and add to their features
 		reads from corpus and adds to either train or test instance list"""
-		fe = FeatureExtractor(corpus_file, reading_gold_file)
-		fe.featurize()
-		rel_inst_list = list(itertools.chain.from_iterable(fe.rel_inst_list))
+		with instrumentation.stage('extractor/featurize') as stage:
+			if self.workers > 1:
+				doc_inst_lists = featurize_parallel(corpus_file, reading_gold_file, self.workers,
+					features=self.features, feature_cache=self.feature_cache,
+					pair_filter=self.pair_filter)
+			else:
+				fe = relation_feature_extractor.FeatureExtractor(corpus_file, reading_gold_file,
+					cache_dir=self.cache_dir, features=self.features,
+					feature_cache=self.feature_cache, pair_filter=self.pair_filter,
+					lazy=self.max_loaded_documents is not None,
+					max_loaded_documents=self.max_loaded_documents)
+				fe.featurize()
+				doc_inst_lists = fe.rel_inst_list
+			rel_inst_list = list(itertools.chain.from_iterable(doc_inst_lists))
+			stage.add(len(rel_inst_list))
+		if self.pair_filter is not None:
+			print(prune_summary(rel_inst_list))
 		return rel_inst_list
 
+	def iter_featurized(self, corpus_file, reading_gold_file):
+		"""Yields featurized RelInstances a document at a time; only the
+		current document is held in memory"""
+		reader = corpus_reader.CorpusReader(corpus_file, reading_gold_file, streaming=True)
+		for doc in reader.iter_documents():
+			fe = relation_feature_extractor.FeatureExtractor(corpus_file, reading_gold_file,
+				features=self.features, docs=[doc], feature_cache=self.feature_cache,
+				pair_filter=self.pair_filter)
+			fe.featurize()
+			for instance in fe.rel_inst_list[0]:
+				yield instance
+
+	def featurize_matrix(self, corpus_file, reading_gold_file, indexer):
+		"""Featurizes into a sparse matrix instead of feature strings.
+		returns RelInstance list (features left empty), CSR matrix, labels;
+		the matrix and labels leave out the pairs the pair filter pruned"""
+		from feature_index import MatrixBuilder, feature_lists_to_matrix
+		if self.streaming:
+			rel_inst_list = []
+			builder = MatrixBuilder()
+			reader = corpus_reader.CorpusReader(corpus_file, reading_gold_file, streaming=True)
+			for doc in reader.iter_documents():
+				fe = relation_feature_extractor.FeatureExtractor(corpus_file, reading_gold_file,
+					features=self.features, docs=[doc], feature_cache=self.feature_cache,
+					pair_filter=self.pair_filter)
+				for doc_i, tt_i, features in fe.iter_pair_features():
+					builder.add_features(features, indexer)
+				rel_inst_list.extend(fe.rel_inst_list[0])
+			X = builder.to_csr(indexer.n_columns)
+			labels = [instance.relType.split('.')[0] for instance in rel_inst_list
+				if instance.pruned is None]
+			if self.pair_filter is not None:
+				print(prune_summary(rel_inst_list))
+		elif self.workers > 1:
+			rel_inst_list = self.featurize(corpus_file, [], reading_gold_file)
+			kept = [instance for instance in rel_inst_list if instance.pruned is None]
+			X = feature_lists_to_matrix([instance.features for instance in kept], indexer)
+			labels = [instance.relType.split('.')[0] for instance in kept]
+			for instance in rel_inst_list:
+				instance.features = []
+		else:
+			fe = relation_feature_extractor.FeatureExtractor(corpus_file, reading_gold_file,
+				cache_dir=self.cache_dir, features=self.features,
+				feature_cache=self.feature_cache, pair_filter=self.pair_filter,
+				lazy=self.max_loaded_documents is not None,
+				max_loaded_documents=self.max_loaded_documents)
+			X, labels = fe.featurize_matrix(indexer)
+			rel_inst_list = list(itertools.chain.from_iterable(fe.rel_inst_list))
+			if self.pair_filter is not None:
+				print(prune_summary(rel_inst_list))
+		return rel_inst_list, X, labels
+
+	def prepare_pair_filter(self, training_file=None):
+		"""Fits the pair filter on training_file, or loads the one fit by an
+		earlier training run, when pair_filter=True"""
+		if self.pair_filter is not True:
+			return
+		if training_file is not None:
+			self.pair_filter = PairFilter().fit_pair_file(training_file)
+			self.pair_filter.save(PAIR_FILTER_FILE)
+		else:
+			self.pair_filter = PairFilter.load(PAIR_FILTER_FILE)
+
 	def train(self,training_file):
-		"""writes training file and runs Mallet"""
-		self.train_instances = self.featurize(training_file,self.train_instances,True)
-		with open('featurized_training', 'w') as training_file:
-			for instance in self.train_instances:
-				feature_str = ' '.join(instance.features)
-				rel_type = instance.relType.split('.')[0]
-				#print 'rel_type=', rel_type
-				training_file.write('{} {} {}\n'.format(instance.tokens, rel_type, feature_str))
-
-		os.system("Mallet1/bin/mallet import-file --input featurized_training --line-regex '^(\S*)[\s]*(\S*)[\s]*(.*)$' --output featurized_training.mallet")
-		os.system('Mallet1/bin/mallet train-classifier --input featurized_training.mallet --output-classifier relext_model \
-			--trainer MaxEnt')
+		"""writes training file and runs Mallet, or trains the numpy model"""
+		start = time.time()
+		self.prepare_pair_filter(training_file)
+		with instrumentation.stage('extractor/train'):
+			if self.backend == 'numpy':
+				self.train_numpy(training_file)
+			elif self.backend == 'kernel':
+				self.train_kernel(training_file)
+			elif self.streaming:
+				self.train_mallet(self.iter_featurized(training_file, True))
+			else:
+				self.train_instances = self.featurize(training_file,self.train_instances,True)
+				if self.feature_selector is not None:
+					self.select_instance_features(self.train_instances)
+				self.train_mallet(self.train_instances)
+		print("Trained {} model in {:.1f}s".format(self.backend, time.time() - start))
+
+	def training_lines(self, instances):
+		"""Mallet's "name label features..." line of each pair the filter kept"""
+		for instance in instances:
+			if instance.pruned is not None:
+				continue
+			feature_str = ' '.join(instance.features)
+			rel_type = instance.relType.split('.')[0]
+			#print 'rel_type=', rel_type
+			yield '{} {} {}'.format(instance.tokens, rel_type, feature_str)
+
+	def write_training_file(self, instances):
+		with instrumentation.stage('extractor/write_training_file') as stage, \
+				open('featurized_training', 'w') as training_file:
+			for line in self.training_lines(instances):
+				training_file.write(line + '\n')
+				stage.add(1)
+
+	def train_mallet(self, instances=None):
+		"""trains relext_model in the Mallet worker, or runs bin/mallet on
+		featurized_training, written first from instances when given"""
+		if self.mallet_worker is not None:
+			with instrumentation.stage('extractor/train_mallet_worker') as stage:
+				lines = list(self.training_lines(instances))
+				stage.add(len(lines))
+				self.mallet_worker.train(lines)
+				self.mallet_worker.save('relext_model')
+			return
+		if instances is not None:
+			self.write_training_file(instances)
+		with instrumentation.stage('extractor/train_mallet'):
+			subprocess.check_call([MALLET, 'import-file', '--input', 'featurized_training',
+				'--line-regex', r'^(\S*)[\s]*(\S*)[\s]*(.*)$', '--output', 'featurized_training.mallet'])
+			subprocess.check_call([MALLET, 'train-classifier', '--input', 'featurized_training.mallet',
+				'--output-classifier', 'relext_model', '--trainer', 'MaxEnt'])
+
+	def train_numpy(self, training_file, model_file='relext_model.npz'):
+		import numpy as np
+		from feature_index import FeatureHasher, FeatureVocabulary, save_npz
+		from maxent import MaxEntModel
+		if self.hashing_dimension:
+			self.indexer = FeatureHasher(self.hashing_dimension)
+		else:
+			self.indexer = FeatureVocabulary()
+		self.train_instances, X, y = self.featurize_matrix(training_file, True, self.indexer)
+		self.indexer.freeze()
+		X = self.select_features(X, y)
+		save_npz('featurized_training.npz', X, y,
+			[instance.tokens for instance in self.train_instances if instance.pruned is None])
+		with instrumentation.stage('extractor/fit_model', instances=X.shape[0]):
+			self.model = MaxEntModel().train(X, y)
+		# the feature names go with the model so relation_service can featurize alike
+		features = self.features if self.features is not None else relation_feature_extractor.DEFAULT_FEATURES
+		feature_names = [feature.name for feature in relation_feature_extractor.get_features(features)]
+		self.model.save(model_file, compact=self.compact_model, feature_names=np.array(feature_names),
+			**self.indexer.to_arrays(compact=self.compact_model))
+
+	def select_features(self, X, y):
+		"""Fits the feature selector on the training matrix, if there is one;
+		returns its selected columns and makes its vocabulary the indexer"""
+		if self.feature_selector is None:
+			return X
+		with instrumentation.stage('extractor/select_features', instances=X.shape[1]):
+			self.feature_selector.fit(X, y, self.indexer)
+			X = self.feature_selector.transform(X)
+		print("Selected {} of {} features ({})".format(X.shape[1], self.indexer.n_columns,
+			self.feature_selector.describe()))
+		self.indexer = self.feature_selector.vocabulary.freeze()
+		return X
+
+	def select_instance_features(self, instances):
+		"""select_features for the Mallet backend's feature strings. Test pairs
+		keep theirs: Mallet drops features its trained alphabet lacks"""
+		from feature_index import FeatureVocabulary, feature_lists_to_matrix
+		kept = [instance for instance in instances if instance.pruned is None]
+		self.indexer = FeatureVocabulary()
+		X = feature_lists_to_matrix([instance.features for instance in kept], self.indexer)
+		self.select_features(X, [instance.relType.split('.')[0] for instance in kept])
+		self.feature_selector.select_instances(kept)
+
+	def load_numpy_model(self, model_file='relext_model.npz'):
+		from feature_index import indexer_from_arrays
+		from maxent import MaxEntModel
+		self.model, archive = MaxEntModel.load(model_file)
+		self.indexer = indexer_from_arrays(archive)
 
 	def test(self,test_file):
-		"""writes test file and runs Mallet
+		"""writes test file and runs Mallet, or classifies in memory with the numpy model
 		infile: featurized_test, outfile: labeled_test"""
-		self.test_instances = self.featurize(test_file,self.test_instances,True)
-		with open('featurized_test', 'w') as test_file:
-			for instance in self.test_instances:
-				feature_str = ' '.join(instance.features)
-				test_file.write('{} {}\n'.format(instance.tokens, feature_str))
-		
-		os.system('Mallet1/bin/mallet classify-file --input featurized_test --output labeled_test --classifier relext_model')
+		start = time.time()
+		self.prepare_pair_filter()
+		with instrumentation.stage('extractor/test'):
+			if self.backend == 'numpy':
+				self.test_numpy(test_file)
+			elif self.backend == 'kernel':
+				self.test_kernel(test_file)
+			elif self.streaming:
+				self.test_mallet(self.iter_featurized(test_file, True))
+			else:
+				self.test_instances = self.featurize(test_file,self.test_instances,True)
+				self.test_mallet(self.test_instances)
+		print("Classified with {} model in {:.1f}s".format(self.backend, time.time() - start))
+
+	def test_lines(self, instances):
+		"""Mallet's "name features..." line of each pair the filter kept;
+		records every pair's gold label and whether it was pruned"""
+		self.test_gold_labels = []
+		self.test_pruned = []
+		for instance in instances:
+			self.test_gold_labels.append(instance.relType.split('.')[0])
+			self.test_pruned.append(instance.pruned is not None)
+			if instance.pruned is not None:
+				continue
+			feature_str = ' '.join(instance.features)
+			yield '{} {}'.format(instance.tokens, feature_str)
+
+	def write_test_file(self, instances):
+		with instrumentation.stage('extractor/write_test_file') as stage, \
+				open('featurized_test', 'w') as test_file:
+			for line in self.test_lines(instances):
+				test_file.write(line + '\n')
+				stage.add(1)
+
+	def test_mallet(self, instances=None):
+		"""classifies in the Mallet worker into test_predictions, or runs bin/mallet
+		on featurized_test, written first from instances when given, into labeled_test"""
+		if self.mallet_worker is not None:
+			with instrumentation.stage('extractor/test_mallet_worker') as stage:
+				lines = list(self.test_lines(instances))
+				stage.add(len(lines))
+				if not self.mallet_worker.has_classifier:
+					self.mallet_worker.load('relext_model')
+				labeled = self.mallet_worker.classify(lines)
+			self.test_predictions = self.with_pruned(
+				[self.get_highest_probability_label(line) for line in labeled])
+			return
+		if instances is not None:
+			self.write_test_file(instances)
+		with instrumentation.stage('extractor/test_mallet'):
+			subprocess.check_call([MALLET, 'classify-file', '--input', 'featurized_test',
+				'--output', 'labeled_test', '--classifier', 'relext_model'])
+
+	def with_pruned(self, labels):
+		"""labels of the classified test pairs, with no_rel put back for the
+		pairs the filter pruned"""
+		if not any(self.test_pruned):
+			return labels
+		classified = iter(labels)
+		return [NO_REL if pruned else next(classified) for pruned in self.test_pruned]
+
+	def test_numpy(self, test_file):
+		from feature_index import save_npz
+		if self.model is None:
+			self.load_numpy_model()
+		self.test_instances, X, y = self.featurize_matrix(test_file, True, self.indexer)
+		self.test_gold_labels = [instance.relType.split('.')[0] for instance in self.test_instances]
+		self.test_pruned = [instance.pruned is not None for instance in self.test_instances]
+		save_npz('featurized_test.npz', X, y,
+			[instance.tokens for instance in self.test_instances if instance.pruned is None])
+		with instrumentation.stage('extractor/classify', instances=X.shape[0]):
+			probabilities = self.model.predict_proba(X)
+		self.set_test_probabilities(probabilities)
+
+	def set_test_probabilities(self, probabilities):
+		"""test_probabilities and test_predictions of every test pair from the
+		model's probabilities for the pairs the filter kept"""
+		import numpy as np
+		if any(self.test_pruned):
+			# pruned pairs are certainly no_rel
+			pruned = np.array(self.test_pruned)
+			self.test_probabilities = np.zeros((len(pruned), probabilities.shape[1]))
+			self.test_probabilities[~pruned] = probabilities
+			self.test_probabilities[pruned, self.model.labels.index(NO_REL)] = 1.0
+		else:
+			self.test_probabilities = probabilities
+		self.test_predictions = [self.model.labels[i] for i in self.test_probabilities.argmax(axis=1)]
+
+	def kernel_extractor(self, pair_file):
+		return relation_feature_extractor.FeatureExtractor(pair_file, True,
+			cache_dir=self.cache_dir, features=self.features,
+			feature_cache=self.feature_cache, pair_filter=self.pair_filter,
+			lazy=self.max_loaded_documents is not None,
+			max_loaded_documents=self.max_loaded_documents)
+
+	def train_kernel(self, training_file, model_file='relext_kernel_model.npz'):
+		from feature_index import FeatureHasher, FeatureVocabulary
+		from tree_kernel import SubtreeTable, TreeKernelModel, extractor_trees
+		fe = self.kernel_extractor(training_file)
+		X = None
+		arrays = {}
+		if self.kernel_flat_features:
+			if self.hashing_dimension:
+				self.indexer = FeatureHasher(self.hashing_dimension)
+			else:
+				self.indexer = FeatureVocabulary()
+			X, y = fe.featurize_matrix(self.indexer)
+			self.indexer.freeze()
+			X = self.select_features(X, y)
+			arrays = self.indexer.to_arrays()
+		else:
+			y = [instance.relType.split('.')[0] for doc_list in fe.rel_inst_list
+				for instance in doc_list if instance.pruned is None]
+		self.train_instances = list(itertools.chain.from_iterable(fe.rel_inst_list))
+		if self.pair_filter is not None:
+			print(prune_summary(self.train_instances))
+		self.kernel_table = SubtreeTable()
+		trees = extractor_trees(self.kernel_table, fe)
+		with instrumentation.stage('extractor/fit_kernel_model', instances=len(trees)):
+			self.model = TreeKernelModel(self.kernel_landmarks, workers=self.workers,
+				cache_dir=self.gram_cache_dir).fit(self.kernel_table, trees, y, X)
+		self.model.save(model_file, self.kernel_table, **arrays)
+
+	def test_kernel(self, test_file, model_file='relext_kernel_model.npz'):
+		from feature_index import indexer_from_arrays
+		from tree_kernel import TreeKernelModel, extractor_trees
+		if self.model is None:
+			self.model, self.kernel_table, archive = TreeKernelModel.load(model_file,
+				workers=self.workers, cache_dir=self.gram_cache_dir)
+			if self.model.n_flat:
+				self.indexer = indexer_from_arrays(archive)
+		fe = self.kernel_extractor(test_file)
+		X = fe.featurize_matrix(self.indexer)[0] if self.model.n_flat else None
+		self.test_instances = list(itertools.chain.from_iterable(fe.rel_inst_list))
+		if self.pair_filter is not None:
+			print(prune_summary(self.test_instances))
+		self.test_gold_labels = [instance.relType.split('.')[0] for instance in self.test_instances]
+		self.test_pruned = [instance.pruned is not None for instance in self.test_instances]
+		trees = extractor_trees(self.kernel_table, fe)
+		with instrumentation.stage('extractor/classify', instances=len(trees)):
+			probabilities = self.model.predict_proba(self.kernel_table, trees, X)
+		self.set_test_probabilities(probabilities)
 
 	def evaluate(self):
-		"""creates gold file and compares to labled test"""
+		"""creates gold file and compares to labled test, returning evaluation.evaluate's
+		scores, per relation type and confusion matrix"""
 
 		with open('gold_test', 'w') as gold_file:
-			for instance in self.test_instances:
-				rel_type = instance.relType.split('.')[0]
+			for rel_type in self.test_gold_labels:
 				gold_file.write('{}\n'.format(rel_type))
 
-		with open('labeled_test') as labeled_file:
-			with open('output_test', 'w') as output_file:
-				for line in labeled_file.readlines():
-					label = self.get_highest_probability_label(line)
-					output_file.write('{}\n'.format(label))
+		if self.test_predictions is not None:
+			labels = self.test_predictions
+		else:
+			with open('labeled_test') as labeled_file:
+				# labeled_test only has the pairs the filter kept
+				labels = self.with_pruned(
+					[self.get_highest_probability_label(line) for line in labeled_file.readlines()])
+		with open('output_test', 'w') as output_file:
+			for label in labels:
+				output_file.write('{}\n'.format(label))
 		
-		os.system('python relation-evaluator.py gold_test output_test')
+		import evaluation
+		with instrumentation.stage('extractor/score'):
+			result = evaluation.evaluate(self.test_gold_labels, labels)
+			evaluation.print_scores(result)
+			evaluation.write_reports(result)
+		return result
+
+	def cross_validate(self, pair_files, folds=5, stratify=True, workers=None, seed=0,
+			variance=1.0, iterations=500):
+		"""Document-level k-fold cross-validation over the pairs of all pair_files,
+		featurized once into one matrix; folds train maxent models in parallel
+		(see cross_validation). Returns per-fold, mean, std and pooled P/R/F1."""
+		import multiprocessing
+		import scipy.sparse
+		from feature_index import FeatureHasher, FeatureVocabulary
+		import cross_validation
+		if self.hashing_dimension:
+			indexer = FeatureHasher(self.hashing_dimension)
+		else:
+			indexer = FeatureVocabulary()
+		matrices = []
+		labels = []
+		doc_sizes = []
+		doc_label_counts = []
+		with instrumentation.stage('extractor/cross_validate') as stage:
+			for pair_file in pair_files:
+				fe = relation_feature_extractor.FeatureExtractor(pair_file, True,
+					cache_dir=self.cache_dir, features=self.features,
+					feature_cache=self.feature_cache)
+				X, y = fe.featurize_matrix(indexer)
+				matrices.append(X)
+				labels.extend(y)
+				for doc_list in fe.rel_inst_list:
+					counts = {}
+					for instance in doc_list:
+						label = instance.relType.split('.')[0]
+						counts[label] = counts.get(label, 0) + 1
+					doc_sizes.append(len(doc_list))
+					doc_label_counts.append(counts)
+			# the vocabulary grew while later files were featurized
+			X = scipy.sparse.vstack([scipy.sparse.csr_matrix((M.data, M.indices, M.indptr),
+				shape=(M.shape[0], indexer.n_columns)) for M in matrices], format='csr')
+			stage.add(X.shape[0])
+			if workers is None:
+				workers = multiprocessing.cpu_count()
+			return cross_validation.cross_validate(X, labels, doc_sizes, doc_label_counts,
+				k=folds, stratify=stratify, workers=workers, seed=seed, variance=variance,
+				iterations=iterations)
+
+	def label(self, pair_file, output_dir='labels', model_file='relext_model.npz',
+			chunk_pairs=5000):
+		"""Labels an unlabeled .raw pair file with the model train_numpy saved,
+		chunk by chunk on self.workers processes, into resumable shards under
+		output_dir (see batch_label). Returns the job summary."""
+		import batch_label
+		if self.backend != 'numpy':
+			raise ValueError("batch labeling needs the numpy backend")
+		# pruned pairs are labeled no_rel, as test() labels them
+		pair_filter = self.pair_filter
+		if pair_filter is True:
+			pair_filter = PAIR_FILTER_FILE
+		elif pair_filter is None:
+			pair_filter = False
+		with instrumentation.stage('extractor/label'):
+			return batch_label.label_pair_file(pair_file, output_dir, model_file,
+				features=self.features, chunk_pairs=chunk_pairs, workers=self.workers,
+				pair_filter=pair_filter)
 
 	def get_highest_probability_label(self,line):
 		line = line.split()
@@ -90,7 +527,12 @@ class RelExtractor(object):
 		return max_label
 
 if __name__ == "__main__":
-	rel_ext = RelExtractor()
+	# usage: python relation_extractor.py [mallet|numpy] [--profile[=stats.prof]]
+	args = [arg for arg in sys.argv[1:] if not arg.startswith('--profile')]
+	for arg in sys.argv[1:]:
+		if arg.startswith('--profile'):
+			instrumentation.enable(arg.partition('=')[2] or None)
+	rel_ext = RelExtractor(backend=args[0] if args else 'mallet')
 	rel_ext.train('rel-trainset.gold')
 	#print len(rel_ext.train_instances)
 	rel_ext.test('rel-devset.gold')
@@ -11,29 +11,208 @@
 """
 
 from corpus_reader import *
-from relation_extractor import *
+from parse_reader import is_tree
+from tree_index import SentenceTreeIndex
+from dependency_graph import NO_NODE
+from feature_cache import FeatureCache
+from feature_registry import (CONTEXT_BUILDERS, get_features, needed_contexts,
+	register_context, register_feature)
+import relation_extractor
+import instrumentation
 import re
+import time
+
+# features used when none are selected, in the order they are written out
+DEFAULT_FEATURES = [
+	'in_between_words',
+	'nearest_common_ancestor',
+	'tokens_v1',
+	'tokens_v2',
+	'entity_types',
+	'minimal_tree_nodes',
+	'bigrams',
+	'in_dependency_relation',
+	'dependency_path',
+	'target_pos',
+	'border_words',
+]
 
 class FeatureExtractor:
 
-	def __init__(self, corpus_file, reading_gold_file):
-		c = CorpusReader(corpus_file, reading_gold_file)
+	def __init__(self, corpus_file, reading_gold_file, cache_dir=None, features=None,
+			doc_filenames=None, docs=None, lazy=False, max_loaded_documents=None, pair_store=None,
+			feature_cache=None, pair_filter=None):
+		# features: names from the feature registry (list or comma separated),
+		# DEFAULT_FEATURES when None
+		# feature_cache: a feature_cache.FeatureCache, or its directory, holding
+		# each document's features of every family whose featurizer and inputs
+		# are unchanged; None disables it
+		# pair_filter: a pair_filter.PairFilter; the pairs it rejects are marked
+		# pruned (RelInstance.pruned) and left out of featurization
+		# doc_filenames: only featurize these documents of corpus_file
+		# docs: already loaded Documents to featurize instead of reading corpus_file
+		# lazy/max_loaded_documents/pair_store: see CorpusReader
+		if docs is None:
+			c = CorpusReader(corpus_file, reading_gold_file, cache_dir=cache_dir,
+				doc_filenames=doc_filenames, lazy=lazy, max_loaded_documents=max_loaded_documents,
+				pair_store=pair_store)
+			docs = c.corpus.values()
 		self.reading_gold_file = reading_gold_file
-		self.docs = c.corpus.values()
+		self.feature_names = features if features is not None else DEFAULT_FEATURES
+		self.docs = docs
 		self.rel_inst_list = self.create_rel_inst_list()
-
-	def featurize(self):
-		"""Call all featurizing functions here"""
-		self.featurize_get_in_between_words()
-		self.featurize_get_nearest_common_ancestor()
-		self.featurize_get_tokens_v1()
-		self.featurize_get_tokens_v2()
-		self.featurize_get_entity_types()
-		self.featurize_add_minimal_tree_nodes()
-		self.featurize_get_bigrams()
-		self.featurize_in_dependency_relation()
-		self.featurize_target_pos()
-		self.featurize_border_words()
+		if pair_filter is not None:
+			self.mark_pruned(pair_filter)
+		# sentence -> SentenceTreeIndex, for the document of tree_index_document
+		# only, so lazy corpora keep no trees of unloaded documents
+		self.tree_index_document = None
+		self.tree_indexes = {}
+		# SentenceContext of the sentence whose pairs are being featurized
+		self.sentence_key = None
+		self.sentence = None
+		if feature_cache is not None and not isinstance(feature_cache, FeatureCache):
+			feature_cache = FeatureCache(feature_cache)
+		self.feature_cache = feature_cache
+
+	def featurize(self, feature_names=None):
+		"""Runs the selected features over every pair in a single pass,
+		building the context each feature needs once per pair"""
+		with instrumentation.stage('features/featurize') as stage:
+			for doc_i, tt_i, features in self.iter_pair_features(feature_names):
+				self.rel_inst_list[doc_i][tt_i].features.extend(features)
+				stage.add(1)
+
+	def featurize_matrix(self, indexer, feature_names=None):
+		"""Like featurize, but sends features straight to indexer columns
+		instead of storing strings; returns (CSR matrix, label list)"""
+		from feature_index import MatrixBuilder
+		builder = MatrixBuilder()
+		with instrumentation.stage('features/featurize_matrix') as stage:
+			for doc_i, tt_i, features in self.iter_pair_features(feature_names):
+				builder.add_features(features, indexer)
+				stage.add(1)
+		labels = [inst.relType.split('.')[0] for doc_list in self.rel_inst_list for inst in doc_list
+			if inst.pruned is None]
+		return builder.to_csr(indexer.n_columns), labels
+
+	def mark_pruned(self, pair_filter):
+		for doc, doc_list in zip(self.docs, self.rel_inst_list):
+			for tt, instance in zip(doc.two_tokens, doc_list):
+				instance.pruned = pair_filter.reject_reason(tt)
+
+	def iter_pair_features(self, feature_names=None):
+		"""(doc index, pair index, feature strings) for every pair the pair
+		filter kept, in order"""
+		if feature_names is None:
+			feature_names = self.feature_names
+		features = get_features(feature_names)
+		if self.feature_cache is not None:
+			for item in self.iter_pair_features_cached(features):
+				yield item
+			return
+		needs = needed_contexts(features)
+		if instrumentation.enabled:
+			for item in self.iter_pair_features_instrumented(features, needs):
+				yield item
+			return
+		for doc_i, doc in enumerate(self.docs):
+			doc_list = self.rel_inst_list[doc_i]
+			for tt_i, tt in enumerate(doc.two_tokens):
+				if doc_list[tt_i].pruned is not None:
+					continue
+				context = {}
+				for name in needs:
+					context[name] = CONTEXT_BUILDERS[name](self, doc, tt)
+				pair_features = []
+				for feature in features:
+					pair_features.extend(feature.func(tt, context))
+				yield doc_i, tt_i, pair_features
+
+	def iter_pair_features_instrumented(self, features, needs):
+		"""iter_pair_features, timing every context and feature and counting
+		what each feature emits"""
+		for doc_i, doc in enumerate(self.docs):
+			doc_list = self.rel_inst_list[doc_i]
+			for tt_i, tt in enumerate(doc.two_tokens):
+				if doc_list[tt_i].pruned is not None:
+					continue
+				context = {}
+				for name in needs:
+					start = time.time()
+					context[name] = CONTEXT_BUILDERS[name](self, doc, tt)
+					instrumentation.count_features('context/'+name, [], time.time() - start)
+				pair_features = []
+				for feature in features:
+					start = time.time()
+					emitted = feature.func(tt, context)
+					instrumentation.count_features(feature.name, emitted, time.time() - start)
+					pair_features.extend(emitted)
+				yield doc_i, tt_i, pair_features
+
+	def iter_pair_features_cached(self, features):
+		"""iter_pair_features, reading each document's output of a feature from
+		the feature cache and computing only what it does not have. An entry
+		holds a list per pair of the document, None for the pairs no run has
+		needed yet (pruned ones), so entries do not depend on the pair filter:
+		pruned pairs are never computed, and a later run that keeps them
+		computes just those and stores the entry again."""
+		cache = self.feature_cache
+		with instrumentation.stage('features/feature_cache') as stage:
+			for doc_i, doc in enumerate(self.docs):
+				document_key = cache.document_key(doc)
+				families = [None] * len(features)
+				paths = [None] * len(features)
+				if document_key is not None:
+					for i, feature in enumerate(features):
+						paths[i] = cache.entry_path(document_key, feature, FeatureExtractor)
+						families[i] = cache.load(paths[i])
+				for i, pair_lists in enumerate(families):
+					if pair_lists is None:
+						families[i] = [None] * len(doc.two_tokens)
+				doc_list = self.rel_inst_list[doc_i]
+				updated = set()
+				for tt_i, tt in enumerate(doc.two_tokens):
+					if doc_list[tt_i].pruned is not None:
+						continue
+					missing = [i for i, pair_lists in enumerate(families) if pair_lists[tt_i] is None]
+					if missing:
+						computed = self.compute_pair_features(doc, tt, [features[i] for i in missing])
+						for i, emitted in zip(missing, computed):
+							families[i][tt_i] = emitted
+						updated.update(missing)
+				for i in updated:
+					if paths[i] is not None:
+						cache.store(paths[i], families[i])
+				stage.add(len(features) - len(updated))
+				for tt_i, instance in enumerate(doc_list):
+					if instance.pruned is not None:
+						continue
+					pair_features = []
+					for pair_lists in families:
+						pair_features.extend(pair_lists[tt_i])
+					yield doc_i, tt_i, pair_features
+		cache.evict()
+
+	def compute_pair_features(self, document, two_tokens, features):
+		"""The list each feature emits for one pair, timed like
+		iter_pair_features_instrumented when instrumentation is on"""
+		needs = needed_contexts(features)
+		context = {}
+		if not instrumentation.enabled:
+			for name in needs:
+				context[name] = CONTEXT_BUILDERS[name](self, document, two_tokens)
+			return [feature.func(two_tokens, context) for feature in features]
+		for name in needs:
+			start = time.time()
+			context[name] = CONTEXT_BUILDERS[name](self, document, two_tokens)
+			instrumentation.count_features('context/'+name, [], time.time() - start)
+		emitted_lists = []
+		for feature in features:
+			start = time.time()
+			emitted = feature.func(two_tokens, context)
+			instrumentation.count_features(feature.name, emitted, time.time() - start)
+			emitted_lists.append(emitted)
+		return emitted_lists
 
 	def get_relations_list_from_gold_files(self):
 		# Create pairs where the key is the word pair and the value is the relation
@@ -51,79 +230,30 @@ class FeatureExtractor:
 			doc_list = []
 			for tt in doc.two_tokens:
 				if self.reading_gold_file:
-					doc_list.append(RelInstance(tt.token1,tt.token2,tt.tag))
+					doc_list.append(relation_extractor.RelInstance(tt.token1,tt.token2,tt.tag))
 				else:
-					doc_list.append(RelInstance(tt.token1,tt.token2,""))
+					doc_list.append(relation_extractor.RelInstance(tt.token1,tt.token2,""))
 			rel_inst_list.append(doc_list)
 		return rel_inst_list
 
 	def featurize_in_dependency_relation(self):
-		for doc_i, doc in enumerate(self.docs):
-			for tt_i, tt in enumerate(doc.two_tokens):
-				self.rel_inst_list[doc_i][tt_i].features.append("d_relation__"+tt.in_dependency_relation)
-				if tt.in_dependency_relation == "":
-					self.rel_inst_list[doc_i][tt_i].features.append("in_d_relation__False")
-				else:
-					self.rel_inst_list[doc_i][tt_i].features.append("in_d_relation__True")
-
+		self.featurize(['in_dependency_relation'])
 
 	def featurize_get_entity_types(self):
-		for doc_i, doc in enumerate(self.docs):
-			for tt_i, tt in enumerate(doc.two_tokens):
-				types = tt.entity_type1+'_'+tt.entity_type2
-				self.rel_inst_list[doc_i][tt_i].features.append(types)
-	
-	def featurize_get_in_between_words(self):
-		"""Gets words in between related words"""
-		for doc_i, doc in enumerate(self.docs):
-			pos_tagged_sents = doc.pos_tagged_sents
-			for tt_i, tt in enumerate(doc.two_tokens):
-				words, pos = self.get_in_between_words_and_pos(doc, tt)
-				words = ["inbetweenwords__"+word for word in words]
-				pos = ["inbetweenpos__"+p for p in pos]
-				self.rel_inst_list[doc_i][tt_i].features.extend(pos)
-				self.rel_inst_list[doc_i][tt_i].features.extend(words)
-		return
+		self.featurize(['entity_types'])
 
 	def featurize_get_in_between_words(self):
 		"""Gets words in between related words"""
-		for doc_i, doc in enumerate(self.docs):
-			pos_tagged_sents = doc.pos_tagged_sents
-			for tt_i, tt in enumerate(doc.two_tokens):
-				words, pos = self.get_in_between_words_and_pos(doc, tt)
-				words = ["inbetweenwords__"+word for word in words]
-				pos = ["inbetweenpos__"+p for p in pos]
-				self.rel_inst_list[doc_i][tt_i].features.extend(pos)
-				self.rel_inst_list[doc_i][tt_i].features.extend(words)
-		return
-
+		self.featurize(['in_between_words'])
 
 	def featurize_get_tokens_v1(self):
-		for doc_i, doc in enumerate(self.docs):
-			for tt_i, tt in enumerate(doc.two_tokens):
-				# split clears up instances like Arizona_Rattlers, which 
-				# are tow words in the parsed sentences
-				self.rel_inst_list[doc_i][tt_i].features.append('token__'+tt.token1)
-				self.rel_inst_list[doc_i][tt_i].features.append('token__'+tt.token2)
-
+		self.featurize(['tokens_v1'])
 
 	def featurize_get_tokens_v2(self):
-		for doc_i, doc in enumerate(self.docs):
-			for tt_i, tt in enumerate(doc.two_tokens):
-				# split clears up instances like Arizona_Rattlers, which 
-				# are tow words in the parsed sentences
-				self.rel_inst_list[doc_i][tt_i].features.append('both_token__'+tt.token1+'_'+tt.token2)
-
+		self.featurize(['tokens_v2'])
 
 	def featurize_get_bigrams(self):
-		for doc_i, doc in enumerate(self.docs):
-			for tt_i, tt in enumerate(doc.two_tokens):
-				# split clears up instances like Arizona_Rattlers, which 
-				# are tow words in the parsed sentences
-				bigrams = self.get_bigrams(doc, tt)
-				for bg in bigrams:
-					self.rel_inst_list[doc_i][tt_i].features.append('bigram__'+bg)
-
+		self.featurize(['bigrams'])
 
 	def get_in_between_words_and_pos(self, document, two_tokens):
 		sent = document.pos_tagged_sents[two_tokens.sent_offset1]
@@ -148,42 +278,52 @@ class FeatureExtractor:
 		return bigrams
 
 	def featurize_get_nearest_common_ancestor(self):
-		for doc_i, doc in enumerate(self.docs):
-			for tt_i, tt in enumerate(doc.two_tokens):
-				# split clears up instances like Arizona_Rattlers, which 
-				# are tow words in the parsed sentences
-				token1 = tt.token1.split("_")
-				token2 = tt.token2.split("_")
-				in_between_words = self.get_in_between_words_and_pos(doc, tt)[0]
-				subtree_string = token1 + in_between_words + token2
-				tt_sent_tree = doc.parses[tt.sent_offset1]
-				tt_subtree = self.get_subtree_between_words(tt_sent_tree, subtree_string)
-				if isinstance(tt_subtree, nltk.tree.Tree):
-					label = tt_subtree.label()
-				else:
-					label = 'no_comm_subtree'
-				self.rel_inst_list[doc_i][tt_i].features.append('comm._ancestor__'+label)
-
+		self.featurize(['nearest_common_ancestor'])
 
 	def featurize_add_minimal_tree_nodes(self):
 		""" adds nodes (not leaves) that are between the target words"""
-		for doc_i, doc in enumerate(self.docs):
-			for tt_i, tt in enumerate(doc.two_tokens):
-				# split clears up instances like Arizona_Rattlers, which 
-				# are tow words in the parsed sentences
-				token1 = tt.token1.split("_")
-				token2 = tt.token2.split("_")
-				in_between_words = self.get_in_between_words_and_pos(doc, tt)[0]
-				subtree_string = token1 + in_between_words + token2
-				tt_sent_tree = doc.parses[tt.sent_offset1]
-				tt_subtree = self.get_subtree_between_words(tt_sent_tree, subtree_string)
-
-				if isinstance(tt_subtree, nltk.tree.Tree):
-					tt_subtree_labels = self.get_tree_labels(tt_subtree)
-					tt_subtree_labels = '_'.join(tt_subtree_labels)
-				else:
-					tt_subtree_labels = 'no_comm_subtree'
-				self.rel_inst_list[doc_i][tt_i].features.append('subtree_node_labels__'+tt_subtree_labels)
+		self.featurize(['minimal_tree_nodes'])
+
+	def get_pair_subtree(self, document, two_tokens):
+		"""(label, '_'-joined node labels) of the smallest parse subtree
+		spanning the pair, found from its token offsets and built once per
+		subtree of the sentence"""
+		index = self.get_tree_index(document, two_tokens.sent_offset1)
+		node = None
+		if index is not None:
+			node = index.covering_node(two_tokens.begin_token1, two_tokens.end_token2)
+		if node is None:
+			return ('no_comm_subtree', 'no_comm_subtree')
+		subtrees = self.get_sentence_context(document, two_tokens.sent_offset1).subtrees
+		subtree = subtrees.get(node)
+		if subtree is None:
+			subtree = (index.label(node), '_'.join(index.subtree_labels(node)))
+			subtrees[node] = subtree
+		return subtree
+
+	def get_sentence_context(self, document, sent_offset):
+		"""SentenceContext of a pos sentence. Pair files keep the pairs of a
+		sentence together, so it is built once for all of them."""
+		key = (document.title, sent_offset)
+		if key != self.sentence_key:
+			self.sentence = SentenceContext(document.pos_tagged_sents[sent_offset])
+			self.sentence_key = key
+		return self.sentence
+
+
+	def get_tree_index(self, document, sent_offset):
+		"""SentenceTreeIndex of a parse. Pairs are featurized a document at a
+		time, so the indexes of the previous document are dropped."""
+		if document.title != self.tree_index_document:
+			self.tree_indexes = {}
+			self.tree_index_document = document.title
+		if sent_offset not in self.tree_indexes:
+			if sent_offset < len(document.parses) and sent_offset < len(document.pos_tagged_sents):
+				self.tree_indexes[sent_offset] = SentenceTreeIndex(document.parses[sent_offset],
+					document.pos_tagged_sents[sent_offset])
+			else:
+				self.tree_indexes[sent_offset] = None
+		return self.tree_indexes[sent_offset]
 
 
 	def get_subtree_between_words(self, tree, token_sequence, smallest=[]):
@@ -194,7 +334,7 @@ class FeatureExtractor:
 		if self.words_in_tree(tree, token_sequence):
 			smallest = tree
 			for child in tree:
-				if isinstance(child, nltk.tree.Tree):
+				if is_tree(child):
 					smallest = self.get_subtree_between_words(child, token_sequence, smallest)
 		else: 
 			return smallest
@@ -213,20 +353,26 @@ class FeatureExtractor:
 	def get_tree_labels(self, tree):
 		labels = [tree.label()]
 		for child in tree:
-			if isinstance(child, nltk.tree.Tree):
+			if is_tree(child):
 				labels.extend(self.get_tree_labels(child))
 		return labels
 
+	def featurize_dependency_path(self):
+		self.featurize(['dependency_path'])
+
+	def get_dependency_path(self, document, two_tokens):
+		"""Labels on the shortest dependency path between the entities' heads,
+		None when the sentence has no dependency parse or they are not connected"""
+		graph, node1, node2 = two_tokens.dependency_nodes()
+		if graph is None or node1 == NO_NODE or node2 == NO_NODE:
+			return None
+		return graph.path(node1, node2)
+
 	def featurize_target_pos(self):
 		"""add POS tag for second token 
 
 		note: for some reason this works better than including both pos tags"""
-		for doc_i, doc in enumerate(self.docs):
-			pos_tagged_sents = doc.pos_tagged_sents
-			for tt_i, tt in enumerate(doc.two_tokens):
-				pos1, pos2 = self.get_target_pos(doc, tt)
-				self.rel_inst_list[doc_i][tt_i].features.append('targetpos_{}'.format(pos1))
-				self.rel_inst_list[doc_i][tt_i].features.append('targetpos_{}'.format(pos2))
+		self.featurize(['target_pos'])
 
 	def get_target_pos(self, document, two_tokens):
 		sent = document.pos_tagged_sents[two_tokens.sent_offset1]
@@ -238,14 +384,7 @@ class FeatureExtractor:
 		"""word before token1, word after token2
 
 		using bigrams hurt performance"""
-		for doc_i, doc in enumerate(self.docs):
-			for tt_i, tt in enumerate(doc.two_tokens):
-				before_word, after_word, before_bigram, after_bigram = self.get_border_words(doc, tt)
-				self.rel_inst_list[doc_i][tt_i].features.append('BEFOREWORD__{}'.format(before_word))
-				self.rel_inst_list[doc_i][tt_i].features.append('AFTERWORD__{}'.format(after_word))
-				#self.rel_inst_list[doc_i][tt_i].features.append('BEFOREBIGRAM__{}'.format(before_bigram))
-				#self.rel_inst_list[doc_i][tt_i].features.append('AFTERBIGRAM__{}'.format(after_bigram))
-
+		self.featurize(['border_words'])
 
 	def get_border_words(self, document, two_tokens):
 		sent = document.pos_tagged_sents[two_tokens.sent_offset1]
@@ -267,6 +406,123 @@ class FeatureExtractor:
 
 		return before_word, after_word, before_bigram, after_bigram
 
+
+class SentenceContext(object):
+	"""Feature strings of every token of one pos tagged sentence. A sentence
+	with k mentions has O(k^2) pairs, and each pair's in-between words,
+	bigrams, border words and target tags are slices of these lists."""
+	__slots__ = ('words', 'in_between_words', 'in_between_pos', 'bigrams', 'before_words',
+		'after_words', 'target_pos', 'subtrees')
+
+	def __init__(self, pos_tagged_sent):
+		words = [token[0] for token in pos_tagged_sent]
+		pos = [token[1] for token in pos_tagged_sent]
+		self.words = words
+		self.in_between_words = ['inbetweenwords__'+word for word in words]
+		self.in_between_pos = ['inbetweenpos__'+p for p in pos]
+		# bigrams[k] joins words k and k+1
+		self.bigrams = ['bigram__'+words[k]+'_'+words[k+1] for k in range(len(words)-1)]
+		# indexed by an entity's begin_token and end_token respectively
+		self.before_words = ['BEFOREWORD__<start>'] + ['BEFOREWORD__'+word for word in words]
+		self.after_words = ['AFTERWORD__'+word for word in words] + ['AFTERWORD__<end>']
+		self.target_pos = ['targetpos_'+p for p in pos]
+		self.subtrees = {} # covering parse node -> FeatureExtractor.get_pair_subtree value
+
+
+# Shared per-pair context, built once per pair by FeatureExtractor.featurize
+
+@register_context('in_between')
+def in_between_context(extractor, document, two_tokens):
+	return extractor.get_in_between_words_and_pos(document, two_tokens)
+
+@register_context('subtree')
+def subtree_context(extractor, document, two_tokens):
+	return extractor.get_pair_subtree(document, two_tokens)
+
+@register_context('target_pos')
+def target_pos_context(extractor, document, two_tokens):
+	return extractor.get_target_pos(document, two_tokens)
+
+@register_context('border_words')
+def border_words_context(extractor, document, two_tokens):
+	return extractor.get_border_words(document, two_tokens)
+
+@register_context('sentence')
+def sentence_context(extractor, document, two_tokens):
+	return extractor.get_sentence_context(document, two_tokens.sent_offset1)
+
+@register_context('dependency')
+def dependency_context(extractor, document, two_tokens):
+	return two_tokens.in_dependency_relation
+
+@register_context('dependency_path')
+def dependency_path_context(extractor, document, two_tokens):
+	return extractor.get_dependency_path(document, two_tokens)
+
+
+# Feature functions: (two_tokens, context) -> list of feature strings
+
+@register_feature('in_between_words', needs=('sentence',))
+def in_between_words_feature(tt, context):
+	sentence = context['sentence']
+	start, end = tt.end_token1, tt.begin_token2
+	return sentence.in_between_pos[start:end] + sentence.in_between_words[start:end]
+
+@register_feature('nearest_common_ancestor', needs=('subtree',))
+def nearest_common_ancestor_feature(tt, context):
+	return ['comm._ancestor__'+context['subtree'][0]]
+
+@register_feature('tokens_v1')
+def tokens_v1_feature(tt, context):
+	return ['token__'+tt.token1, 'token__'+tt.token2]
+
+@register_feature('tokens_v2')
+def tokens_v2_feature(tt, context):
+	return ['both_token__'+tt.token1+'_'+tt.token2]
+
+@register_feature('entity_types')
+def entity_types_feature(tt, context):
+	return [tt.entity_type1+'_'+tt.entity_type2]
+
+@register_feature('minimal_tree_nodes', needs=('subtree',))
+def minimal_tree_nodes_feature(tt, context):
+	return ['subtree_node_labels__'+context['subtree'][1]]
+
+@register_feature('bigrams', needs=('sentence',))
+def bigrams_feature(tt, context):
+	# token1, the words in between, token2
+	start, end = tt.end_token1, tt.begin_token2
+	if end <= start:
+		return ['bigram__'+tt.token1+'_'+tt.token2]
+	sentence = context['sentence']
+	return ['bigram__'+tt.token1+'_'+sentence.words[start]] + sentence.bigrams[start:end-1] + \
+		['bigram__'+sentence.words[end-1]+'_'+tt.token2]
+
+@register_feature('in_dependency_relation', needs=('dependency',))
+def in_dependency_relation_feature(tt, context):
+	relation = context['dependency']
+	if relation == "":
+		return ["d_relation__"+relation, "in_d_relation__False"]
+	return ["d_relation__"+relation, "in_d_relation__True"]
+
+@register_feature('dependency_path', needs=('dependency_path',))
+def dependency_path_feature(tt, context):
+	path = context['dependency_path']
+	if path is None:
+		return ['dep_path__none']
+	return ['dep_path__'+'_'.join(path), 'dep_path_length__{}'.format(len(path))]
+
+@register_feature('target_pos', needs=('sentence',))
+def target_pos_feature(tt, context):
+	target_pos = context['sentence'].target_pos
+	return [target_pos[tt.begin_token1], target_pos[tt.begin_token2]]
+
+@register_feature('border_words', needs=('sentence',))
+def border_words_feature(tt, context):
+	sentence = context['sentence']
+	return [sentence.before_words[tt.begin_token1], sentence.after_words[tt.end_token2]]
+
+
 if __name__ == "__main__":
 	fe = FeatureExtractor('rel-trainset.gold',True)
 	rl = fe.get_relations_list_from_gold_files()
@@ -0,0 +1,236 @@
+"""Resident relation classifier for labeling pairs one document at a time.
+
+RelationService loads a numpy backend model (relext_model.npz, written by
+RelExtractor.train_numpy) and its feature indexer once, then classifies the
+pairs of a document in memory:
+
+    service = RelationService('relext_model.npz')
+    results = service.predict(document, pairs)
+
+document is a corpus_reader.Document or a dict holding the contents of the
+document's .parse, .tag and .dparse files (a string or a list of lines each):
+
+    {"title": "NYT20001017.1908.0279", "parse": "...", "pos": "...", "dparse": "..."}
+
+pairs are lines of a .raw pair file, as a tab separated string or a list of
+fields. Each result is {"pair", "label", "probabilities"}.
+
+When RelExtractor(pair_filter=True) saved its filter (PAIR_FILTER_FILE),
+the service applies it too: the pairs it rejects are labeled no_rel with
+probability 1, as RelExtractor.test labels them, without being featurized.
+
+Front ends, run from the project directory:
+
+    python relation_service.py [--model relext_model.npz] [--pair-filter FILE | --no-pair-filter]
+        reads {"document": ..., "pairs": [...]} JSON lines on stdin and
+        writes one {"results": [...]} line per request
+    python relation_service.py --http 8137
+        the same requests as POST /predict bodies
+"""
+
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+from corpus_reader import CorpusReader, Document
+from feature_index import MatrixBuilder, indexer_from_arrays
+from maxent import MaxEntModel
+from pair_filter import NO_REL, PairFilter
+from relation_extractor import PAIR_FILTER_FILE
+import relation_feature_extractor
+
+
+# fields of a .raw pair line
+PAIR_FIELDS = 13
+
+
+def as_lines(value):
+    if isinstance(value, (list, tuple)):
+        return [line if line.endswith('\n') else line + '\n' for line in value]
+    return value.splitlines(True)
+
+
+def load_pair_filter(pair_filter=None):
+    """pair_filter if it is a PairFilter, the one saved at a path, or for
+    None the one a RelExtractor(pair_filter=True) training run saved, if
+    there is one; False (or no saved filter) gives None"""
+    if pair_filter is None:
+        pair_filter = PAIR_FILTER_FILE if os.path.exists(PAIR_FILTER_FILE) else False
+    if pair_filter is False:
+        return None
+    if isinstance(pair_filter, PairFilter):
+        return pair_filter
+    return PairFilter.load(pair_filter)
+
+
+class RelationService:
+    def __init__(self, model_file='relext_model.npz', features=None, pair_filter=None):
+        # features defaults to the names saved with the model, then DEFAULT_FEATURES
+        # pair_filter: see load_pair_filter
+        self.model, archive = MaxEntModel.load(model_file)
+        self.indexer = indexer_from_arrays(archive).freeze()
+        if features is None and 'feature_names' in archive:
+            features = [str(name) for name in archive['feature_names']]
+        self.features = features if features is not None else relation_feature_extractor.DEFAULT_FEATURES
+        self.pair_filter = load_pair_filter(pair_filter)
+        # no pair file: only used to turn request lines into Documents,
+        # its label table is shared by every request's parses
+        self.reader = CorpusReader(None)
+
+    def make_document(self, document):
+        if isinstance(document, Document):
+            return Document(document.title, parses=document.parses,
+                            pos_tagged_sents=document.pos_tagged_sents,
+                            dparses=document.dparses)
+        return self.reader.document_from_lines(document.get('title', ''),
+                                               as_lines(document['parse']),
+                                               as_lines(document['pos']),
+                                               as_lines(document['dparse']))
+
+    def predict(self, document, pairs):
+        """Label and probability per label for each pair of document"""
+        doc = self.make_document(document)
+        for pair in pairs:
+            line_split = pair.split() if hasattr(pair, 'split') else list(pair)
+            self.reader.add_two_tokens(doc, line_split)
+        if not doc.two_tokens:
+            return []
+        fe, probabilities = self.classify([doc])
+        results = []
+        for instance, row in zip(fe.rel_inst_list[0], probabilities):
+            results.append({
+                'pair': instance.tokens,
+                'label': self.model.labels[row.argmax()],
+                'probabilities': dict(zip(self.model.labels, row.tolist())),
+            })
+        return results
+
+    def classify(self, docs):
+        """Featurizes the pairs of docs the pair filter kept into one matrix
+        and classifies it; returns the FeatureExtractor and a row of
+        probabilities per pair, in document and pair order, certain no_rel
+        for the pairs the filter pruned"""
+        fe = relation_feature_extractor.FeatureExtractor(None, False, features=self.features,
+                                                         docs=docs, pair_filter=self.pair_filter)
+        builder = MatrixBuilder()
+        for doc_i, tt_i, features in fe.iter_pair_features():
+            builder.add_features(features, self.indexer)
+        probabilities = self.model.predict_proba(builder.to_csr(self.indexer.n_columns))
+        pruned = np.array([instance.pruned is not None for doc_list in fe.rel_inst_list
+                           for instance in doc_list], dtype=bool)
+        if pruned.any():
+            kept = probabilities
+            probabilities = np.zeros((len(pruned), len(self.model.labels)))
+            probabilities[~pruned] = kept
+            probabilities[pruned, self.model.labels.index(NO_REL)] = 1.0
+        return fe, probabilities
+
+    def handle_request(self, request):
+        """{"document": ..., "pairs": [...]} -> {"results": [...]} or {"error": ...}.
+        Any failure becomes an error response, so one bad request never stops
+        the service."""
+        try:
+            check_request(request)
+            return {'results': self.predict(request['document'], request['pairs'])}
+        except Exception as e:
+            return {'error': '{}: {}'.format(type(e).__name__, e)}
+
+
+def is_text(value):
+    return isinstance(value, (type(u''), str))
+
+
+def check_request(request):
+    """Raises ValueError unless request has the shape handle_request takes"""
+    if not isinstance(request, dict):
+        raise ValueError("a request is a JSON object")
+    document = request.get('document')
+    if not isinstance(document, dict):
+        raise ValueError("document must be an object with parse, pos and dparse")
+    for key in ('parse', 'pos', 'dparse'):
+        value = document.get(key)
+        if not (is_text(value) or isinstance(value, list) and all(is_text(v) for v in value)):
+            raise ValueError("document {} must be a string or a list of lines".format(key))
+    if not is_text(document.get('title', '')):
+        raise ValueError("document title must be a string")
+    pairs = request.get('pairs')
+    if not isinstance(pairs, list):
+        raise ValueError("pairs must be a list")
+    for pair in pairs:
+        fields = pair.split() if is_text(pair) else pair
+        if not (isinstance(fields, list) and len(fields) == PAIR_FIELDS
+                and all(is_text(field) for field in fields)):
+            raise ValueError("each pair must be a .raw line or a list of its {} fields: {}".format(
+                PAIR_FIELDS, json.dumps(pair)))
+
+
+def serve_stdin(service, infile=sys.stdin, outfile=sys.stdout):
+    for line in infile:
+        if not line.strip():
+            continue
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            response = {'error': 'bad JSON: {}'.format(e)}
+        else:
+            response = service.handle_request(request)
+        outfile.write(json.dumps(response) + '\n')
+        outfile.flush()
+
+
+def make_handler(service):
+    class PredictHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if self.path != '/predict':
+                self.send_error(404)
+                return
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            try:
+                response = service.handle_request(json.loads(body.decode('utf-8')))
+            except ValueError as e:
+                response = {'error': 'bad JSON: {}'.format(e)}
+            payload = json.dumps(response).encode('utf-8')
+            self.send_response(400 if 'error' in response else 200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    return PredictHandler
+
+
+def serve_http(service, port, host='127.0.0.1'):
+    server = HTTPServer((host, port), make_handler(service))
+    print("Serving POST /predict on http://{}:{}".format(host, port))
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Label relation pairs with a resident numpy model")
+    parser.add_argument('--model', default='relext_model.npz')
+    parser.add_argument('--features', default=None,
+                        help="comma separated feature names (default: those saved with the model)")
+    parser.add_argument('--pair-filter', default=None,
+                        help="pair filter file (default: {} when it exists)".format(PAIR_FILTER_FILE))
+    parser.add_argument('--no-pair-filter', action='store_true',
+                        help="classify every pair, even with a saved pair filter")
+    parser.add_argument('--http', type=int, default=None, metavar='PORT',
+                        help="serve HTTP on PORT instead of reading stdin")
+    args = parser.parse_args()
+    service = RelationService(args.model, features=args.features,
+                              pair_filter=False if args.no_pair_filter else args.pair_filter)
+    if args.http is not None:
+        serve_http(service, args.http)
+    else:
+        serve_stdin(service)
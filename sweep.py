@@ -0,0 +1,253 @@
+"""Parallel feature ablation and trainer setting sweeps.
+
+usage: python sweep.py [--train rel-trainset.gold] [--test rel-devset.gold]
+                       [--features in_between_words,bigrams,...] [--ablate]
+                       [--subsets 'tokens_v1,entity_types;bigrams,target_pos']
+                       [--variances 0.5,1,2] [--iterations 100,500]
+                       [--trainers numpy,mallet:MaxEnt,mallet:NaiveBayes]
+                       [--workers N] [--feature-cache .feature_cache] [--json out.json]
+                       [--randomization 1000]
+
+The grid is every feature subset (--features, each leave-one-out subset of
+it with --ablate, and any --subsets) crossed with every trainer setting.
+Both pair files are featurized once, one registered feature at a time, into
+a matrix whose columns are grouped in one block per feature; a run trains
+and classifies on the column blocks of its subset only. Runs go to a pool of
+worker processes that each get the matrices once, and the results are
+ranked by F1, scored as relation-evaluator.py does. Each run's labels are
+compared with the best run's by approximate randomization (evaluation.py),
+so the p column tells which runs the best one does not really beat.
+
+Trainers: numpy (maxent.MaxEntModel, uses --variances and --iterations) or
+mallet:<Mallet trainer name>, run through Mallet1/bin/mallet in a scratch
+directory (MaxEnt takes the variances and iterations too).
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+import numpy as np
+import scipy.sparse
+
+import evaluation
+from evaluation import score
+from feature_index import FeatureVocabulary, MatrixBuilder, export_mallet_text
+from feature_registry import get_features
+import relation_extractor
+import relation_feature_extractor
+
+MALLET = 'Mallet1/bin/mallet'
+
+# set in each worker by init_worker: the featurized train and test corpora
+SHARED = {}
+
+
+def featurize_blocks(pair_file, feature_names, vocabularies=None, feature_cache=None):
+    """Featurizes pair_file one feature at a time into column blocks.
+    Returns (CSR matrix, labels, pair names, vocabularies, feature name ->
+    (first column, end column)). Pass the training vocabularies to map a
+    test corpus onto the same columns."""
+    fe = relation_feature_extractor.FeatureExtractor(pair_file, True,
+        features=feature_names, feature_cache=feature_cache)
+    blocks = []
+    ranges = {}
+    start = 0
+    if vocabularies is None:
+        vocabularies = dict((name, FeatureVocabulary()) for name in feature_names)
+    for name in feature_names:
+        vocabulary = vocabularies[name]
+        builder = MatrixBuilder()
+        for doc_i, tt_i, features in fe.iter_pair_features([name]):
+            builder.add_features(features, vocabulary)
+        vocabulary.freeze()
+        blocks.append(builder.to_csr(vocabulary.n_columns))
+        ranges[name] = (start, start + vocabulary.n_columns)
+        start += vocabulary.n_columns
+    instances = [instance for doc_list in fe.rel_inst_list for instance in doc_list]
+    labels = [instance.relType.split('.')[0] for instance in instances]
+    names = [instance.tokens for instance in instances]
+    return scipy.sparse.hstack(blocks, format='csr'), labels, names, vocabularies, ranges
+
+
+def make_grid(features, ablate, subsets, trainers, variances, iterations):
+    """Run settings: every subset with every trainer setting"""
+    feature_sets = [('all', list(features))]
+    if ablate:
+        feature_sets.extend(('-' + name, [f for f in features if f != name]) for name in features)
+    for subset in subsets:
+        feature_sets.append((','.join(subset), list(subset)))
+    grid = []
+    seen = set()
+    for label, subset in feature_sets:
+        for trainer in trainers:
+            tunable = trainer in ('numpy', 'mallet:MaxEnt')
+            for variance in variances if tunable else [None]:
+                for max_iterations in iterations if tunable else [None]:
+                    key = (tuple(subset), trainer, variance, max_iterations)
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    grid.append({'label': label, 'features': subset, 'trainer': trainer,
+                                 'variance': variance, 'iterations': max_iterations})
+    return grid
+
+
+def init_worker(shared):
+    SHARED.update(shared)
+
+
+def run_setting(setting):
+    start = time.time()
+    columns = np.concatenate([np.arange(*SHARED['ranges'][name]) for name in setting['features']])
+    X_train = SHARED['X_train'][:, columns]
+    X_test = SHARED['X_test'][:, columns]
+    if setting['trainer'] == 'numpy':
+        from maxent import MaxEntModel
+        model = MaxEntModel(gaussian_prior_variance=setting['variance'],
+                            max_iterations=setting['iterations'])
+        model.train(X_train, SHARED['y_train'])
+        predictions = model.predict(X_test)
+    else:
+        names = [SHARED['column_names'][column] for column in columns]
+        predictions = classify_with_mallet(X_train, X_test, FeatureVocabulary(names), setting)
+    result = dict(setting)
+    result['precision'], result['recall'], result['f1'] = score(SHARED['y_test'], predictions)
+    result['predictions'] = list(predictions)
+    result['seconds'] = time.time() - start
+    return result
+
+
+def mallet_trainer(setting):
+    trainer = setting['trainer'].partition(':')[2]
+    if setting['variance'] is not None:
+        trainer += ',gaussianPriorVariance={},numIterations={}'.format(
+            setting['variance'], setting['iterations'])
+    return trainer
+
+
+def classify_with_mallet(X_train, X_test, indexer, setting):
+    """Trains and classifies in a scratch directory; returns the test labels"""
+    workspace = tempfile.mkdtemp(prefix='relext-sweep-')
+    mallet = os.path.abspath(MALLET)
+    try:
+        path = lambda name: os.path.join(workspace, name)
+        export_mallet_text(path('train'), X_train, indexer, SHARED['train_names'], SHARED['y_train'])
+        export_mallet_text(path('test'), X_test, indexer, SHARED['test_names'])
+        with open(os.devnull, 'w') as devnull:
+            subprocess.check_call([mallet, 'import-file', '--input', path('train'),
+                                   '--line-regex', r'^(\S*)[\s]*(\S*)[\s]*(.*)$',
+                                   '--output', path('train.mallet')], stdout=devnull)
+            subprocess.check_call([mallet, 'train-classifier', '--input', path('train.mallet'),
+                                   '--output-classifier', path('model'),
+                                   '--trainer', mallet_trainer(setting)], stdout=devnull)
+            subprocess.check_call([mallet, 'classify-file', '--input', path('test'),
+                                   '--output', path('labeled'), '--classifier', path('model')],
+                                  stdout=devnull)
+        extractor = relation_extractor.RelExtractor()
+        with open(path('labeled')) as labeled_file:
+            return [extractor.get_highest_probability_label(line) for line in labeled_file
+                    if line.strip()]
+    finally:
+        shutil.rmtree(workspace)
+
+
+def run_sweep(grid, shared, workers):
+    """Results of every setting, best F1 first"""
+    if workers > 1:
+        pool = multiprocessing.Pool(workers, initializer=init_worker, initargs=(shared,))
+        try:
+            results = pool.map(run_setting, grid, 1)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        init_worker(shared)
+        results = [run_setting(setting) for setting in grid]
+    return sorted(results, key=lambda result: -result['f1'])
+
+
+def compare_with_best(results, gold_labels, resamples, workers):
+    """Sets each run's p_value: approximate randomization of the best run
+    against it, moving its labels out of the results"""
+    best = results[0]['predictions']
+    for result in results:
+        predictions = result.pop('predictions')
+        if resamples and result is not results[0]:
+            result['p_value'] = evaluation.approximate_randomization(
+                gold_labels, best, predictions, resamples, workers=workers)['p_value']
+        else:
+            result['p_value'] = None
+
+
+def print_table(results):
+    print('{:>4} {:>7} {:>7} {:>7} {:>6}  {:<30} {:<18} {:>8} {:>6} {:>8}'.format(
+        'rank', 'F1', 'P', 'R', 'p', 'features', 'trainer', 'variance', 'iters', 'time (s)'))
+    for rank, result in enumerate(results, 1):
+        p_value = result.get('p_value')
+        print('{:>4} {:>7.4f} {:>7.4f} {:>7.4f} {:>6}  {:<30} {:<18} {:>8} {:>6} {:>8.1f}'.format(
+            rank, result['f1'], result['precision'], result['recall'],
+            '-' if p_value is None else '{:.3f}'.format(p_value), result['label'],
+            result['trainer'], '-' if result['variance'] is None else result['variance'],
+            '-' if result['iterations'] is None else result['iterations'], result['seconds']))
+
+
+def comma_list(value, convert=str):
+    return [convert(item.strip()) for item in value.split(',') if item.strip()]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Rank feature subsets and trainer settings by F1")
+    parser.add_argument('--train', default='rel-trainset.gold')
+    parser.add_argument('--test', default='rel-devset.gold')
+    parser.add_argument('--features', default=','.join(relation_feature_extractor.DEFAULT_FEATURES))
+    parser.add_argument('--ablate', action='store_true',
+                        help="also run every subset with one feature left out")
+    parser.add_argument('--subsets', default='',
+                        help="semicolon separated extra subsets of comma separated features")
+    parser.add_argument('--trainers', default='numpy')
+    parser.add_argument('--variances', default='1.0')
+    parser.add_argument('--iterations', default='500')
+    parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count())
+    parser.add_argument('--feature-cache', default=None,
+                        help="feature cache directory (see feature_cache.py)")
+    parser.add_argument('--json', default=None, help="also write the ranked results here")
+    parser.add_argument('--randomization', type=int, default=1000,
+                        help="shuffles per comparison with the best run (0 to skip)")
+    args = parser.parse_args()
+
+    features = comma_list(args.features)
+    subsets = [comma_list(subset) for subset in args.subsets.split(';') if subset.strip()]
+    grid = make_grid(features, args.ablate, subsets, comma_list(args.trainers),
+                     comma_list(args.variances, float), comma_list(args.iterations, int))
+    # every feature any run uses, each featurized once
+    feature_names = []
+    for setting in grid:
+        feature_names.extend(name for name in setting['features'] if name not in feature_names)
+    get_features(feature_names)
+
+    start = time.time()
+    X_train, y_train, train_names, vocabularies, ranges = featurize_blocks(
+        args.train, feature_names, feature_cache=args.feature_cache)
+    X_test, y_test, test_names, _, _ = featurize_blocks(
+        args.test, feature_names, vocabularies, feature_cache=args.feature_cache)
+    print('Featurized {} x {} and {} x {} in {:.1f}s'.format(
+        X_train.shape[0], X_train.shape[1], X_test.shape[0], X_test.shape[1], time.time() - start))
+    shared = {'X_train': X_train, 'y_train': y_train, 'train_names': train_names,
+              'X_test': X_test, 'y_test': y_test, 'test_names': test_names, 'ranges': ranges,
+              'column_names': [name for feature in feature_names
+                               for name in vocabularies[feature].names]}
+
+    start = time.time()
+    results = run_sweep(grid, shared, args.workers)
+    print('{} runs on {} workers in {:.1f}s\n'.format(len(grid), args.workers, time.time() - start))
+    compare_with_best(results, y_test, args.randomization, args.workers)
+    print_table(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=1)
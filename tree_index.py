@@ -0,0 +1,203 @@
+"""Offset-driven lowest common ancestor queries over sentence parses.
+
+SentenceTreeIndex aligns the tokens of a pos tagged sentence (the offsets
+used by TwoTokens) with the leaves of its parse, then answers "smallest
+subtree covering tokens i..j" with an Euler tour and a sparse table of
+minimum depths, so every query after the O(n log n) build is O(1).
+
+The parser and the tagger tokenize slightly differently (-LRB- vs "(",
+"will n't" vs "won't"), so tokens are aligned to leaves on characters
+rather than by position.
+"""
+
+import difflib
+
+from parse_reader import FlatTree, FlatTreeNode, LabelTable
+
+# parser escapes that stand for a different surface string in the tagged text
+LEAF_SURFACE = {
+    '-LRB-': '(', '-RRB-': ')',
+    '-LSB-': '[', '-RSB-': ']',
+    '-LCB-': '{', '-RCB-': '}',
+    '``': '"', "''": '"',
+}
+
+
+def token_surface(pos_token):
+    """Word of a pos_tagged_sents entry ("__," splits into ['', '', ','])"""
+    if len(pos_token) > 1:
+        word = '_'.join(pos_token[:-1])
+    else:
+        word = pos_token[0]
+    return word.replace('``', '"').replace("''", '"')
+
+
+def flat_tree_from_nltk(tree, label_table=None):
+    """Copies an nltk.tree.Tree into a FlatTree"""
+    flat = FlatTree(label_table or LabelTable())
+
+    def add(node, parent, prev_sibling):
+        index = len(flat.parent)
+        flat.parent.append(parent)
+        flat.label_ids.append(flat.label_table.get_id(node.label()))
+        flat.first_child.append(-1)
+        flat.next_sibling.append(-1)
+        flat.leaf_start.append(len(flat.leaves))
+        flat.leaf_end.append(-1)
+        if prev_sibling != -1:
+            flat.next_sibling[prev_sibling] = index
+        elif parent != -1:
+            flat.first_child[parent] = index
+        last = -1
+        for child in node:
+            if not hasattr(child, 'label'):
+                flat.leaves.append(child)
+            else:
+                last = add(child, index, last)
+        flat.leaf_end[index] = len(flat.leaves)
+        return index
+
+    add(tree, -1, -1)
+    return flat
+
+
+def align_tokens_to_leaves(tokens, leaves):
+    """[first_leaf, last_leaf] for each token, matched on characters"""
+    token_chars = []
+    token_owner = []
+    for i, token in enumerate(tokens):
+        token_chars.append(token)
+        token_owner.extend([i] * len(token))
+    leaf_chars = []
+    leaf_owner = []
+    for i, leaf in enumerate(leaves):
+        leaf = LEAF_SURFACE.get(leaf, leaf)
+        leaf_chars.append(leaf)
+        leaf_owner.extend([i] * len(leaf))
+    token_chars = ''.join(token_chars)
+    leaf_chars = ''.join(leaf_chars)
+
+    spans = [None] * len(tokens)
+
+    def cover(token, leaf):
+        span = spans[token]
+        if span is None:
+            spans[token] = [leaf, leaf]
+        elif leaf > span[1]:
+            span[1] = leaf
+
+    if token_chars == leaf_chars:
+        for c in range(len(token_chars)):
+            cover(token_owner[c], leaf_owner[c])
+    else:
+        matcher = difflib.SequenceMatcher(None, token_chars, leaf_chars, autojunk=False)
+        for t_start, l_start, size in matcher.get_matching_blocks():
+            for c in range(size):
+                cover(token_owner[t_start+c], leaf_owner[l_start+c])
+
+    # tokens with no matched characters borrow their neighbour's leaf
+    last_leaf = 0
+    for i, span in enumerate(spans):
+        if span is None:
+            spans[i] = [last_leaf, last_leaf]
+        else:
+            last_leaf = span[1]
+    if leaves:
+        for span in spans:
+            span[0] = min(span[0], len(leaves) - 1)
+            span[1] = min(span[1], len(leaves) - 1)
+    return spans
+
+
+class SentenceTreeIndex:
+    def __init__(self, tree, pos_tagged_sent):
+        """tree is a FlatTreeNode root or an nltk.tree.Tree"""
+        if isinstance(tree, FlatTreeNode):
+            tree = tree.tree
+        elif not isinstance(tree, FlatTree):
+            tree = flat_tree_from_nltk(tree)
+        self.tree = tree
+        self.token_leaves = align_tokens_to_leaves(
+            [token_surface(tok) for tok in pos_tagged_sent], tree.leaves)
+        self.build_leaf_nodes()
+        self.build_euler_tour()
+
+    def build_leaf_nodes(self):
+        """lowest node above each leaf, and where each preorder subtree ends"""
+        t = self.tree
+        n = len(t)
+        self.leaf_node = [0] * len(t.leaves)
+        # preorder visits deeper nodes later, so they overwrite their ancestors
+        for node in range(n):
+            for leaf in range(t.leaf_start[node], t.leaf_end[node]):
+                self.leaf_node[leaf] = node
+        self.subtree_end = [n] * n
+        for node in range(1, n):
+            sibling = t.next_sibling[node]
+            if sibling != -1:
+                self.subtree_end[node] = sibling
+            else:
+                self.subtree_end[node] = self.subtree_end[t.parent[node]]
+
+    def build_euler_tour(self):
+        t = self.tree
+        euler = []
+        depths = []
+        self.first_visit = [0] * len(t)
+        stack = [(0, 0)]
+        # (node, depth) entries; a negative node means "back at ~node" after a child
+        while stack:
+            node, depth = stack.pop()
+            if node < 0:
+                euler.append(~node)
+                depths.append(depth)
+                continue
+            self.first_visit[node] = len(euler)
+            euler.append(node)
+            depths.append(depth)
+            children = []
+            child = t.first_child[node]
+            while child != -1:
+                children.append(child)
+                child = t.next_sibling[child]
+            for child in reversed(children):
+                stack.append((~node, depth))
+                stack.append((child, depth + 1))
+        self.euler = euler
+        # sparse[k][i] is the tour position of the shallowest node in euler[i:i+2**k]
+        sparse = [list(range(len(euler)))]
+        half = 1
+        while 2 * half <= len(euler):
+            prev = sparse[-1]
+            sparse.append([a if depths[a] <= depths[b] else b
+                           for a, b in zip(prev, prev[half:])])
+            half *= 2
+        self.sparse = sparse
+        self.depths = depths
+
+    def lca(self, node1, node2):
+        i = self.first_visit[node1]
+        j = self.first_visit[node2]
+        if i > j:
+            i, j = j, i
+        k = (j - i + 1).bit_length() - 1
+        a = self.sparse[k][i]
+        b = self.sparse[k][j - (1 << k) + 1]
+        return self.euler[a if self.depths[a] <= self.depths[b] else b]
+
+    def covering_node(self, begin_token, end_token):
+        """Smallest node spanning tokens begin_token..end_token-1, or None"""
+        if not self.tree.leaves or begin_token < 0 or end_token > len(self.token_leaves) \
+                or begin_token >= end_token:
+            return None
+        first_leaf = self.token_leaves[begin_token][0]
+        last_leaf = self.token_leaves[end_token - 1][1]
+        return self.lca(self.leaf_node[first_leaf], self.leaf_node[last_leaf])
+
+    def label(self, node):
+        return self.tree.label(node)
+
+    def subtree_labels(self, node):
+        """Labels of node and its descendants in preorder, like get_tree_labels"""
+        names = self.tree.label_table.names
+        return [names[i] for i in self.tree.label_ids[node:self.subtree_end[node]]]
@@ -0,0 +1,506 @@
+"""Subset tree kernel over the parse subtree enclosing each pair.
+
+Each pair becomes its path-enclosed tree: the smallest parse subtree
+covering both entities (SentenceTreeIndex.covering_node), keeping only the
+children that overlap the span from the first entity to the second, with
+the preterminals of the entities relabeled NN-E1-PER, NNP-E2-GPE and so on.
+Cross-sentence pairs, and sentences without a parse, get an empty tree.
+
+The kernel is Collins and Duffy's subset tree (SST) kernel with decay
+lam, normalized to K(a, b) / sqrt(K(a, a) K(b, b)):
+
+    K(a, b) = sum over node pairs of delta(n1, n2)
+    delta(n1, n2) = 0 if their productions differ, lam for matching
+                    preterminals, else lam * prod(1 + delta(child1, child2))
+
+and is evaluated without visiting non-matching node pairs:
+
+    every distinct subtree is interned once in a SubtreeTable (hash
+    consing), so delta depends on two subtree ids only and is memoized
+    across all tree pairs; a subtree's delta with itself is kept with it
+    each KernelTree indexes its subtrees by production, with counts, so a
+    kernel evaluation only pairs up nodes whose productions match
+
+Gram blocks (rows x columns of normalized kernel values) are computed on a
+pool of worker processes and kept in a GramCache on disk. TreeKernelModel
+turns them into features with the Nystrom method: the kernel against m
+landmark trees, whitened by the landmark Gram matrix, so that maxent's
+MaxEntModel trains on them alone or next to the flat feature columns.
+"""
+
+from array import array
+import hashlib
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import time
+
+import numpy as np
+
+KERNEL_VERSION = 1
+DEFAULT_LAMBDA = 0.4
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+# delta memo entries kept before the memo is cleared
+MAX_MEMO = 4000000
+# Gram rows per block
+BLOCK_ROWS = 512
+
+# set in each worker by init_worker: the subtree table and the row and column trees
+SHARED = {}
+
+
+class SubtreeTable:
+    def __init__(self, lam=DEFAULT_LAMBDA):
+        self.lam = lam
+        self.ids = {} # (production id, child subtree ids) -> subtree id
+        self.production_ids = {} # (label, child labels or words) -> production id
+        self.production_keys = [] # production id -> (label, child labels or words)
+        self.labels = [] # subtree id -> label
+        self.productions = array('i') # subtree id -> production id
+        self.children = [] # subtree id -> tuple of child subtree ids
+        self.self_delta = array('d') # subtree id -> delta(s, s)
+        self.memo = {}
+
+    def __len__(self):
+        return len(self.labels)
+
+    def intern(self, label, child_ids=(), words=()):
+        """Subtree id of a node with these children, or, for a preterminal, words"""
+        if child_ids:
+            key = (label, tuple(self.labels[child] for child in child_ids))
+        else:
+            key = (label, tuple(words))
+        production = self.production_ids.get(key)
+        if production is None:
+            production = len(self.production_keys)
+            self.production_ids[key] = production
+            self.production_keys.append(key)
+        child_ids = tuple(child_ids)
+        subtree = self.ids.get((production, child_ids))
+        if subtree is None:
+            subtree = len(self.labels)
+            self.ids[(production, child_ids)] = subtree
+            self.labels.append(label)
+            self.productions.append(production)
+            self.children.append(child_ids)
+            value = self.lam
+            for child in child_ids:
+                value *= 1.0 + self.self_delta[child]
+            self.self_delta.append(value)
+        return subtree
+
+    def delta(self, s1, s2):
+        """delta of two subtrees with the same production"""
+        if s1 == s2:
+            return self.self_delta[s1]
+        if s1 > s2:
+            s1, s2 = s2, s1
+        key = (s1, s2)
+        value = self.memo.get(key)
+        if value is None:
+            value = self.lam
+            productions = self.productions
+            for c1, c2 in zip(self.children[s1], self.children[s2]):
+                if productions[c1] == productions[c2]:
+                    value *= 1.0 + self.delta(c1, c2)
+            if len(self.memo) >= MAX_MEMO:
+                self.memo.clear()
+            self.memo[key] = value
+        return value
+
+    def text(self, subtree):
+        """Bracketed form of a subtree"""
+        children = self.children[subtree]
+        if not children:
+            label, words = self.production_keys[self.productions[subtree]]
+            return '({} {})'.format(label, ' '.join(words))
+        return '({} {})'.format(self.labels[subtree],
+                                ' '.join(self.text(child) for child in children))
+
+
+class KernelTree(object):
+    __slots__ = ('root', 'fragments', 'norm', 'digest')
+
+    def __init__(self, table, root):
+        """root: subtree id in table, or None for an empty tree"""
+        self.root = root
+        counts = {}
+        if root is not None:
+            stack = [root]
+            while stack:
+                subtree = stack.pop()
+                counts[subtree] = counts.get(subtree, 0) + 1
+                stack.extend(table.children[subtree])
+        # production id -> ((subtree id, count), ...)
+        fragments = {}
+        for subtree, count in counts.items():
+            fragments.setdefault(table.productions[subtree], []).append((subtree, count))
+        self.fragments = dict((production, tuple(nodes)) for production, nodes in fragments.items())
+        self.norm = kernel(table, self, self) ** 0.5
+        # identifies the tree in GramCache keys
+        text = table.text(root) if root is not None else '()'
+        self.digest = hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def kernel(table, tree1, tree2):
+    """Unnormalized SST kernel; only nodes of a shared production are paired"""
+    fragments1 = tree1.fragments
+    fragments2 = tree2.fragments
+    if len(fragments1) > len(fragments2):
+        fragments1, fragments2 = fragments2, fragments1
+    delta = table.delta
+    total = 0.0
+    for production, nodes1 in fragments1.items():
+        nodes2 = fragments2.get(production)
+        if nodes2 is None:
+            continue
+        for s1, c1 in nodes1:
+            for s2, c2 in nodes2:
+                total += c1 * c2 * delta(s1, s2)
+    return total
+
+
+def normalized_kernel(table, tree1, tree2):
+    if not tree1.norm or not tree2.norm:
+        return 0.0
+    return kernel(table, tree1, tree2) / (tree1.norm * tree2.norm)
+
+
+def pair_tree(table, index, two_tokens):
+    """KernelTree of the pair's path-enclosed tree; index is the sentence's
+    SentenceTreeIndex (FeatureExtractor.get_tree_index)"""
+    if index is None or two_tokens.sent_offset1 != two_tokens.sent_offset2:
+        return KernelTree(table, None)
+    node = index.covering_node(two_tokens.begin_token1, two_tokens.end_token2)
+    if node is None:
+        return KernelTree(table, None)
+    t = index.tree
+    names = t.label_table.names
+    spans = index.token_leaves
+
+    def leaves(begin, end):
+        return spans[begin][0], spans[end - 1][1]
+
+    entities = [(leaves(two_tokens.begin_token1, two_tokens.end_token1),
+                 '-E1-' + two_tokens.entity_type1),
+                (leaves(two_tokens.begin_token2, two_tokens.end_token2),
+                 '-E2-' + two_tokens.entity_type2)]
+    first_leaf = entities[0][0][0]
+    last_leaf = entities[1][0][1]
+
+    def build(node):
+        child_ids = []
+        child = t.first_child[node]
+        while child != -1:
+            if t.leaf_start[child] <= last_leaf and t.leaf_end[child] > first_leaf:
+                child_ids.append(build(child))
+            child = t.next_sibling[child]
+        label = names[t.label_ids[node]]
+        if child_ids:
+            return table.intern(label, child_ids)
+        start, end = t.leaf_start[node], t.leaf_end[node]
+        for (begin, last), mark in entities:
+            if begin <= start and end - 1 <= last:
+                label += mark
+                break
+        return table.intern(label, words=t.leaves[start:end])
+
+    return KernelTree(table, build(node))
+
+
+def extractor_trees(table, extractor):
+    """KernelTree of every pair a FeatureExtractor's pair filter kept, in
+    the order of its featurize_matrix rows"""
+    trees = []
+    for doc, doc_list in zip(extractor.docs, extractor.rel_inst_list):
+        for tt, instance in zip(doc.two_tokens, doc_list):
+            if instance.pruned is None:
+                trees.append(pair_tree(table, extractor.get_tree_index(doc, tt.sent_offset1), tt))
+    return trees
+
+
+def tree_from_text(table, text):
+    """KernelTree of a bracketed tree written by SubtreeTable.text"""
+    from parse_reader import LabelTable, read_bracketed_parse
+    if text == '()':
+        return KernelTree(table, None)
+    t = read_bracketed_parse(text, LabelTable())
+
+    def build(node):
+        child_ids = []
+        child = t.first_child[node]
+        while child != -1:
+            child_ids.append(build(child))
+            child = t.next_sibling[child]
+        if child_ids:
+            return table.intern(t.label(node), child_ids)
+        return table.intern(t.label(node), words=t.leaves[t.leaf_start[node]:t.leaf_end[node]])
+
+    return KernelTree(table, build(0))
+
+
+class GramCache:
+    """Gram blocks on disk under cache_dir, one .npy per block, keyed by the
+    sha1 of the row and column trees and the decay. A hit touches its file,
+    and evict() deletes the least recently used once the cache is larger
+    than max_bytes."""
+
+    def __init__(self, cache_dir='.gram_cache', max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.stored = 0
+
+    def block_path(self, row_trees, col_trees, lam):
+        h = hashlib.sha1('{} {!r}'.format(KERNEL_VERSION, lam).encode('utf-8'))
+        for tree in row_trees:
+            h.update(tree.digest.encode('ascii'))
+        h.update(b'|')
+        for tree in col_trees:
+            h.update(tree.digest.encode('ascii'))
+        return os.path.join(self.cache_dir, h.hexdigest() + '.npy')
+
+    def load(self, path):
+        if not os.path.exists(path):
+            self.misses += 1
+            return None
+        try:
+            block = np.load(path)
+        except (IOError, OSError, ValueError):
+            # evicted meanwhile or truncated; recompute it
+            self.misses += 1
+            return None
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        self.hits += 1
+        return block
+
+    def store(self, path, block):
+        if not os.path.isdir(self.cache_dir):
+            try:
+                os.makedirs(self.cache_dir)
+            except OSError:
+                pass # made by another process
+        tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tmp_path, 'wb') as f:
+            np.save(f, block)
+        os.rename(tmp_path, path)
+        self.stored += 1
+
+    def entries(self):
+        """(mtime, size, path) of every block"""
+        entries = []
+        if not os.path.isdir(self.cache_dir):
+            return entries
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.npy'):
+                path = os.path.join(self.cache_dir, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def evict(self):
+        """Deletes least recently used blocks until the cache fits max_bytes;
+        returns how many were deleted. Only looks when blocks were stored."""
+        if not self.stored:
+            return 0
+        self.stored = 0
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for mtime, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+            removed += 1
+        return removed
+
+
+def init_worker(table, row_trees, col_trees):
+    SHARED['table'] = table
+    SHARED['row_trees'] = row_trees
+    SHARED['col_trees'] = col_trees
+
+
+def kernel_block(rows):
+    """Normalized kernel of SHARED row trees start..end against every column tree"""
+    start, end = rows
+    table = SHARED['table']
+    col_trees = SHARED['col_trees']
+    block = np.zeros((end - start, len(col_trees)))
+    for i, tree in enumerate(SHARED['row_trees'][start:end]):
+        if not tree.norm:
+            continue
+        row = block[i]
+        for j, other in enumerate(col_trees):
+            if other.norm:
+                row[j] = kernel(table, tree, other) / (tree.norm * other.norm)
+    return block
+
+
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+    """Peak resident memory of this process, or of its largest finished child"""
+    scale = 1024.0 * 1024 if sys.platform == 'darwin' else 1024.0
+    return resource.getrusage(who).ru_maxrss / scale
+
+
+def gram_matrix(table, row_trees, col_trees, workers=1, cache=None, block_rows=BLOCK_ROWS):
+    """(len(row_trees), len(col_trees)) normalized kernel matrix, computed in
+    blocks of block_rows rows on workers processes, through cache when given.
+    Prints kernel evaluations per second and peak memory."""
+    start_time = time.time()
+    blocks = [(start, min(start + block_rows, len(row_trees)))
+              for start in range(0, len(row_trees), block_rows)]
+    gram = np.zeros((len(row_trees), len(col_trees)))
+    paths = {}
+    todo = []
+    for rows in blocks:
+        block = None
+        if cache is not None:
+            paths[rows] = cache.block_path(row_trees[rows[0]:rows[1]], col_trees, table.lam)
+            block = cache.load(paths[rows])
+        if block is None:
+            todo.append(rows)
+        else:
+            gram[rows[0]:rows[1]] = block
+    if workers > 1 and len(todo) > 1:
+        pool = multiprocessing.Pool(min(workers, len(todo)), initializer=init_worker,
+                                    initargs=(table, row_trees, col_trees))
+        try:
+            computed = pool.imap(kernel_block, todo)
+            for rows, block in zip(todo, computed):
+                gram[rows[0]:rows[1]] = block
+                if cache is not None:
+                    cache.store(paths[rows], block)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        init_worker(table, row_trees, col_trees)
+        for rows in todo:
+            block = kernel_block(rows)
+            gram[rows[0]:rows[1]] = block
+            if cache is not None:
+                cache.store(paths[rows], block)
+    if cache is not None:
+        cache.evict()
+    seconds = time.time() - start_time
+    evaluations = sum(end - start for start, end in todo) * len(col_trees)
+    memory = 'peak RSS {:.0f} MB'.format(peak_rss_mb())
+    if workers > 1:
+        memory += ', {:.0f} MB per worker'.format(peak_rss_mb(resource.RUSAGE_CHILDREN))
+    print("Gram {}x{}: {} of {} blocks cached, {} kernel evaluations in {:.1f}s "
+          "({:.0f}/s), {}".format(
+              len(row_trees), len(col_trees), len(blocks) - len(todo), len(blocks), evaluations,
+              seconds, evaluations / seconds if seconds else 0.0, memory))
+    return gram
+
+
+def choose_landmarks(trees, labels, n_landmarks, seed=0):
+    """Indexes of up to n_landmarks distinct non-empty trees: relations
+    first, up to half of them, then no_rel pairs, each drawn at random"""
+    rng = random.Random(seed)
+    seen = set()
+    related = []
+    unrelated = []
+    for i, (tree, label) in enumerate(zip(trees, labels)):
+        if tree.root is None or tree.digest in seen:
+            continue
+        seen.add(tree.digest)
+        (unrelated if label == 'no_rel' else related).append(i)
+    rng.shuffle(related)
+    rng.shuffle(unrelated)
+    n_related = min(len(related), max(n_landmarks // 2, n_landmarks - len(unrelated)))
+    return sorted(related[:n_related] + unrelated[:n_landmarks - n_related])
+
+
+class TreeKernelModel:
+    def __init__(self, n_landmarks=1000, lam=DEFAULT_LAMBDA, gaussian_prior_variance=1.0,
+                 max_iterations=500, workers=1, cache_dir=None, seed=0):
+        # cache_dir: directory of the GramCache, None disables it
+        self.n_landmarks = n_landmarks
+        self.lam = lam
+        self.gaussian_prior_variance = gaussian_prior_variance
+        self.max_iterations = max_iterations
+        self.workers = workers
+        self.cache = GramCache(cache_dir) if cache_dir else None
+        self.seed = seed
+        self.landmarks = [] # KernelTrees
+        self.projection = None # (n_landmarks, rank) Nystrom map
+        self.n_flat = 0 # flat feature columns before the kernel features
+        self.model = None
+
+    @property
+    def labels(self):
+        return self.model.labels
+
+    def new_table(self):
+        return SubtreeTable(self.lam)
+
+    def fit(self, table, trees, labels, X_flat=None):
+        """Trains on KernelTrees of table with their labels, next to the flat
+        feature rows X_flat when given"""
+        from maxent import MaxEntModel
+        self.landmarks = [trees[i] for i in choose_landmarks(trees, labels, self.n_landmarks,
+                                                             self.seed)]
+        landmark_gram = gram_matrix(table, self.landmarks, self.landmarks, self.workers,
+                                    self.cache)
+        eigenvalues, eigenvectors = np.linalg.eigh(landmark_gram)
+        keep = eigenvalues > 1e-8 * eigenvalues.max()
+        self.projection = eigenvectors[:, keep] / np.sqrt(eigenvalues[keep])
+        self.n_flat = X_flat.shape[1] if X_flat is not None else 0
+        X = self.features(table, trees, X_flat)
+        self.model = MaxEntModel(self.gaussian_prior_variance, self.max_iterations).train(X, labels)
+        return self
+
+    def features(self, table, trees, X_flat=None):
+        """Nystrom features of trees, after the flat feature columns when given"""
+        import scipy.sparse
+        kernel_features = gram_matrix(table, trees, self.landmarks, self.workers,
+                                      self.cache).dot(self.projection)
+        if X_flat is None:
+            return kernel_features
+        if X_flat.shape[1] != self.n_flat:
+            X_flat = scipy.sparse.csr_matrix((X_flat.data, X_flat.indices, X_flat.indptr),
+                                             shape=(X_flat.shape[0], self.n_flat))
+        return scipy.sparse.hstack([X_flat, scipy.sparse.csr_matrix(kernel_features)],
+                                   format='csr')
+
+    def predict_proba(self, table, trees, X_flat=None):
+        """trees must come from the table the landmarks are in (fit's table, or
+        new_table() after load)"""
+        return self.model.predict_proba(self.features(table, trees, X_flat))
+
+    def save(self, path, table, **arrays):
+        self.model.save(path, kernel_landmarks=np.array([table.text(tree.root)
+                                                         for tree in self.landmarks]),
+                        kernel_projection=self.projection, kernel_lambda=self.lam,
+                        kernel_flat_columns=self.n_flat, **arrays)
+
+    @classmethod
+    def load(cls, path, workers=1, cache_dir=None):
+        """Returns (model, table of its landmarks, npz archive)"""
+        from maxent import MaxEntModel
+        model, archive = MaxEntModel.load(path)
+        kernel_model = cls(n_landmarks=len(archive['kernel_landmarks']),
+                           lam=float(archive['kernel_lambda']), workers=workers,
+                           cache_dir=cache_dir)
+        table = kernel_model.new_table()
+        kernel_model.landmarks = [tree_from_text(table, str(text))
+                                  for text in archive['kernel_landmarks']]
+        kernel_model.projection = archive['kernel_projection']
+        kernel_model.n_flat = int(archive['kernel_flat_columns'])
+        kernel_model.model = model
+        return kernel_model, table, archive